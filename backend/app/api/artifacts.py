@@ -0,0 +1,28 @@
+import time
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+router = APIRouter(prefix="/artifacts")
+
+@router.api_route("/{key}", methods=["GET", "HEAD"])
+def read_artifact(request: Request, key: str, expires: int, sig: str):
+    """
+    Serves a generated artifact (TTS audio) from a signed URL (see ArtifactStore.url).
+    No bearer token: <audio> elements can't send one, the signature is the credential.
+    Supports Range (seeking, progressive playback) and conditional requests.
+    """
+    store = request.app.state.processor.artifacts
+    if not store.verify(key, expires, sig):
+        raise HTTPException(status_code=403, detail="Invalid or expired link")
+    path = store.path(key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Artifact not found")
+
+    # Content-addressed: the key is a strong ETag and the bytes never change
+    headers = {
+        "ETag": f'"{key}"',
+        "Cache-Control": f"private, max-age={max(0, expires - int(time.time()))}, immutable"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=store.media_type(key), headers=headers)
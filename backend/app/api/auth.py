@@ -1,59 +1,111 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlmodel import Session, select
-from datetime import datetime, timezone
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from jose import JWTError, jwt
 
-from app.core.database import get_session
-from app.models.user import User, UserCreate, UserRead, Token
-from app.core.security import get_password_hash, verify_password, create_access_token, SECRET_KEY, ALGORITHM
+from app.core.cache import LRUCache
+from app.core.database import async_engine, get_async_session
+from app.core.governor import bind_user
+from app.core.metrics import stage
+from app.models.user import User, UserCreate, UserPrincipal, UserRead, Token
+from app.core.security import get_password_hash_async, verify_password_async, create_access_token, SECRET_KEY, ALGORITHM
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
-    credentials_exception = HTTPException(
+# Token subject -> UserPrincipal. The JWT signature proves identity; the cache only saves
+# the username -> id lookup. The TTL bounds how long a deleted/renamed user stays valid.
+principal_cache = LRUCache(
+    maxsize=int(os.getenv("AUTH_CACHE_MAX_USERS", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "60"))
+)
+
+def invalidate_principal(username: str):
+    """
+    Call whenever a user's row changes in a way that affects identity (deletion, rename, re-registration).
+    """
+    principal_cache.delete(username)
+
+def credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> UserPrincipal:
+    """
+    Fast path for endpoints that only need the user's id: JWT check plus an in-process
+    cache; the DB is only queried on a cache miss.
+    """
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise credentials_exception()
     except JWTError:
-        raise credentials_exception
-    user = session.exec(select(User).where(User.username == username)).first()
+        raise credentials_exception()
+
+    principal = principal_cache.get(username)
+    if principal is None:
+        with stage("db", op="principal"):
+            async with AsyncSession(async_engine) as session:
+                user_id = (await session.exec(select(User.id).where(User.username == username))).first()
+        if user_id is None:
+            raise credentials_exception()
+        principal = UserPrincipal(id=user_id, username=username)
+        principal_cache.set(username, principal)
+    # Upstream calls made for this request are queued fairly per user
+    bind_user(principal.id)
+    return principal
+
+async def get_current_user(
+    principal: UserPrincipal = Depends(get_current_principal),
+    session: AsyncSession = Depends(get_async_session)
+) -> User:
+    """
+    The full User row, for endpoints that read user columns.
+    """
+    user = await session.get(User, principal.id)
     if user is None:
-        raise credentials_exception
+        invalidate_principal(principal.username)
+        raise credentials_exception()
     return user
 
 @router.post("/register", response_model=UserRead)
-def register(user_in: UserCreate, session: Session = Depends(get_session)):
-    existing_user = session.exec(select(User).where(User.username == user_in.username)).first()
+async def register(user_in: UserCreate, session: AsyncSession = Depends(get_async_session)):
+    existing_user = (await session.exec(select(User).where(User.username == user_in.username))).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already registered")
-    
-    hashed_password = get_password_hash(user_in.password)
+
+    hashed_password = await get_password_hash_async(user_in.password)
     user = User(username=user_in.username, hashed_password=hashed_password)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    invalidate_principal(user.username)
     return user
 
 @router.post("/token", response_model=Token)
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
-    user = session.exec(select(User).where(User.username == form_data.username)).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    session: AsyncSession = Depends(get_async_session)
+):
+    user = (await session.exec(select(User).where(User.username == form_data.username))).first()
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Warm the cache: the client's next request uses this token
+    principal_cache.set(user.username, UserPrincipal(id=user.id, username=user.username))
     access_token = create_access_token(data={"sub": user.username})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/me", response_model=UserRead)
-def read_users_me(current_user: User = Depends(get_current_user)):
-    return current_user
+def read_users_me(request: Request, current_user: User = Depends(get_current_user)):
+    # Include streak activity that hasn't been flushed to the DB yet
+    return request.app.state.streaks.view(current_user)
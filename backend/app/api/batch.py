@@ -0,0 +1,92 @@
+import json
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+
+from app.api.auth import get_current_principal
+from app.core.audio import read_multipart_files
+from app.core.models import BatchRequest
+from app.models.user import UserPrincipal
+
+router = APIRouter(prefix="/batch")
+
+# All files of one /batch/upload together (each file is also capped by MAX_UPLOAD_MB)
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("BATCH_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+async def submit(request: Request, current_user: UserPrincipal, items: list) -> dict:
+    processor = request.app.state.processor
+    try:
+        job = request.app.state.batch_manager.submit(
+            current_user.id,
+            items,
+            voice_id=await processor.voice_registry.get_voice_id(current_user.id)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job.progress()
+
+@router.post("", status_code=status.HTTP_202_ACCEPTED)
+async def create_batch(request: Request, body: BatchRequest, current_user: UserPrincipal = Depends(get_current_principal)):
+    """
+    Queues N utterances (same fields as /process) and returns a job id.
+    Follow progress with GET /batch/{job_id} or GET /batch/{job_id}/events.
+    """
+    items = [
+        {"audio": item.audio_data, **item.model_dump(exclude={"audio_data"})}
+        for item in body.items
+    ]
+    return await submit(request, current_user, items)
+
+@router.post("/upload", status_code=status.HTTP_202_ACCEPTED)
+async def create_batch_upload(request: Request, current_user: UserPrincipal = Depends(get_current_principal)):
+    """
+    Binary variant: multipart with one or more "audio" files sharing the form fields
+    mode, context_text, pitch_format and score.
+    """
+    # Streamed with the caps enforced as the body arrives (nothing spooled first)
+    files, params = await read_multipart_files(request, "audio", max_total_bytes=MAX_BATCH_UPLOAD_BYTES)
+    if "mode" not in params:
+        raise HTTPException(status_code=422, detail="mode is required")
+
+    items = []
+    for filename, audio in files:
+        if not audio:
+            raise HTTPException(status_code=422, detail=f"Empty audio {filename}")
+        items.append({
+            "audio": audio,
+            "mode": params["mode"],
+            "context_text": params.get("context_text", ""),
+            "pitch_format": params.get("pitch_format", "points"),
+            "score": params.get("score", "false").lower() == "true"
+        })
+    return await submit(request, current_user, items)
+
+@router.get("/{job_id}")
+def read_batch(request: Request, job_id: str, results: bool = True, current_user: UserPrincipal = Depends(get_current_principal)):
+    """
+    Progress of a batch job; `results` lists per-item results (null while pending).
+    """
+    job = request.app.state.batch_manager.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No such batch job")
+    return job.progress(include_results=results)
+
+@router.get("/{job_id}/events")
+async def stream_batch(request: Request, job_id: str, current_user: UserPrincipal = Depends(get_current_principal)):
+    """
+    Server-Sent Events: one "item" event per finished utterance (in completion order,
+    replaying those already done), then "done" with the final progress.
+    """
+    job = request.app.state.batch_manager.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No such batch job")
+
+    async def event_stream():
+        async for event in job.events():
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
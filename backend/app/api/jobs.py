@@ -0,0 +1,66 @@
+import asyncio
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+
+from app.api.auth import get_current_principal
+from app.core.models import MagicClipJobRequest
+from app.models.user import UserPrincipal
+
+router = APIRouter()
+
+MAX_WAIT_SECONDS = 30.0
+WAIT_POLL_SECONDS = 0.25
+
+def job_view(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "attempts": job["attempts"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"]
+    }
+
+@router.post("/magic-clip/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_magic_clip_job(
+    request: Request,
+    body: MagicClipJobRequest,
+    current_user: UserPrincipal = Depends(get_current_principal)
+):
+    """
+    Queues a Magic Clip render and returns immediately with a job id.
+    Poll GET /jobs/{job_id} (optionally with ?wait=seconds) for the video_url.
+    """
+    processor = request.app.state.processor
+    if body.clip_filename not in {clip['filename'] for clip in processor.video_service.get_clips()}:
+        raise HTTPException(status_code=404, detail="Unknown clip")
+
+    payload = {
+        "clip_text": body.clip_text,
+        "clip_filename": body.clip_filename,
+        "voice_id": await processor.voice_registry.get_voice_id(current_user.id)
+    }
+    job = await asyncio.to_thread(
+        request.app.state.job_queue.enqueue, "magic_clip", payload, current_user.id, body.priority
+    )
+    request.app.state.job_workers.notify("magic_clip")
+    return job_view(job)
+
+@router.get("/jobs/{job_id}")
+async def read_job(request: Request, job_id: str, wait: float = 0.0, current_user: UserPrincipal = Depends(get_current_principal)):
+    """
+    Job status. With wait > 0 (max 30 s) the request is held until the job finishes
+    or the wait expires (long polling).
+    """
+    queue = request.app.state.job_queue
+    deadline = time.monotonic() + min(max(wait, 0.0), MAX_WAIT_SECONDS)
+    while True:
+        job = await asyncio.to_thread(queue.get, job_id)
+        if job is None or job["user_id"] != current_user.id:
+            raise HTTPException(status_code=404, detail="No such job")
+        if job["status"] in ("done", "failed") or time.monotonic() >= deadline:
+            return job_view(job)
+        await asyncio.sleep(WAIT_POLL_SECONDS)
@@ -0,0 +1,90 @@
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect, status
+
+from app.api.auth import get_current_principal
+from app.core.models import ScoreRequest
+from app.models.user import UserPrincipal
+from app.services.pitch import StreamingPitchTracker
+
+router = APIRouter()
+
+# PCM encodings accepted on /ws/pitch -> numpy dtype and scale to [-1, 1]
+PCM_ENCODINGS = {
+    "s16le": (np.dtype("<i2"), 1 / 32768),
+    "f32le": (np.dtype("<f4"), 1.0)
+}
+MAX_MESSAGE_SECONDS = 1.0
+MAX_SCORE_ATTEMPTS = 20
+
+@router.post("/score")
+def score_attempts(request: Request, body: ScoreRequest, current_user: UserPrincipal = Depends(get_current_principal)):
+    """
+    Scores one or more pitch contours (e.g. collected from /ws/pitch) against a reference:
+    a precomputed contour (reference_id / reference_text, see /reference) or an explicit one.
+    Returns one {"status", "data" | "message"} per attempt, in order.
+    """
+    if not body.attempts or len(body.attempts) > MAX_SCORE_ATTEMPTS:
+        raise HTTPException(status_code=422, detail=f"Between 1 and {MAX_SCORE_ATTEMPTS} attempts")
+
+    processor = request.app.state.processor
+    if body.reference is not None:
+        reference = body.reference
+    else:
+        store = processor.reference_store
+        if body.reference_id:
+            found = store.get(body.reference_id)
+        elif body.reference_text:
+            found = store.find_text(body.reference_text)
+        else:
+            raise HTTPException(status_code=422, detail="reference, reference_id or reference_text is required")
+        if found is None:
+            raise HTTPException(status_code=404, detail="No reference contour")
+        reference = (found[1][0], found[1][1])
+
+    return {"results": processor.scoring_service.score_batch(reference, body.attempts)}
+
+@router.websocket("/ws/pitch")
+async def pitch_stream(websocket: WebSocket, token: str, sample_rate: int = 16000, encoding: str = "s16le"):
+    """
+    Live pitch tracking for the Guitar Hero user track.
+    Client sends binary frames of mono PCM (s16le by default) at `sample_rate`;
+    the server answers each frame with {"points": [{"t", "f"}, ...]} for the voiced
+    10 ms windows it completed (t in seconds from the start of the stream).
+    Sending the text message "reset" restarts the clock.
+    """
+    try:
+        await get_current_principal(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if encoding not in PCM_ENCODINGS or not 8000 <= sample_rate <= 48000:
+        await websocket.close(code=status.WS_1003_UNSUPPORTED_DATA)
+        return
+
+    dtype, scale = PCM_ENCODINGS[encoding]
+    max_bytes = int(sample_rate * MAX_MESSAGE_SECONDS) * dtype.itemsize
+
+    await websocket.accept()
+    tracker = StreamingPitchTracker(sample_rate=sample_rate)
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("bytes")
+            if data is None:
+                if message.get("text") == "reset":
+                    tracker = StreamingPitchTracker(sample_rate=sample_rate)
+                continue
+            if len(data) > max_bytes:
+                await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG)
+                break
+            if len(data) % dtype.itemsize:
+                await websocket.close(code=status.WS_1007_INVALID_FRAME_PAYLOAD_DATA)
+                break
+
+            # Analysis of <= 1 s of audio takes ~1 ms: run inline to keep frame order and latency
+            points = tracker.push(np.frombuffer(data, dtype=dtype) * scale)
+            await websocket.send_json({"points": points})
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,59 @@
+import os
+from typing import Optional
+import numpy as np
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+from app.services.pitch import PITCH_FORMATS, PitchService
+
+router = APIRouter(prefix="/reference")
+
+# Contours only change when re-ingested, which also changes the ETag
+CACHE_MAX_AGE = int(os.getenv("REFERENCE_CACHE_MAX_AGE", "86400"))
+
+@router.get("")
+def read_reference_by_text(request: Request, text: str, format: str = "points"):
+    """
+    Returns the reference contour for a known target sentence (matched on normalized text).
+    """
+    store = request.app.state.processor.reference_store
+    return reference_response(request, store.item_id_for_text(text), format)
+
+@router.get("/{item_id}")
+def read_reference(request: Request, item_id: str, format: str = "points"):
+    """
+    Returns the precomputed native pitch contour of a clip or sentence.
+    format: 'points' | 'arrays' | 'f32' (same shapes as pitch_data).
+    """
+    return reference_response(request, item_id, format)
+
+def reference_response(request: Request, item_id: str, output_format: Optional[str]) -> Response:
+    if output_format not in PITCH_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {', '.join(PITCH_FORMATS)}")
+
+    found = request.app.state.processor.reference_store.get(item_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="No reference contour")
+    meta, contour = found
+
+    headers = {
+        "ETag": f'"{meta["etag"]}-{output_format}"',
+        "Cache-Control": f"public, max-age={CACHE_MAX_AGE}"
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    # Stored as float32; round back so JSON doesn't carry float32 noise
+    times = np.round(contour[0].astype(np.float64), 3)
+    frequencies = np.round(contour[1].astype(np.float64), 2)
+
+    return JSONResponse(
+        content={
+            "id": meta["id"],
+            "kind": meta["kind"],
+            "text": meta["text"],
+            "duration": meta["duration"],
+            "data": PitchService.format_contour(times, frequencies, output_format)
+        },
+        headers=headers
+    )
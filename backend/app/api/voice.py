@@ -0,0 +1,51 @@
+import asyncio
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Request, UploadFile, status
+from sqlmodel import Session, select
+from typing import List
+
+from app.api.auth import get_current_principal
+from app.core.audio import MAX_UPLOAD_BYTES
+from app.core.database import get_session
+from app.models.user import UserPrincipal
+from app.models.voice import VoiceProfile, VoiceProfileRead
+
+router = APIRouter(prefix="/voice")
+
+MAX_SAMPLES = 25
+
+@router.post("/enroll", response_model=VoiceProfileRead, status_code=status.HTTP_202_ACCEPTED)
+async def enroll_voice(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    samples: List[UploadFile] = File(...),
+    current_user: UserPrincipal = Depends(get_current_principal),
+    session: Session = Depends(get_session)
+):
+    """
+    Uploads reference samples and registers the user's voice clone in the background.
+    Poll GET /voice/profile until status is 'ready'.
+    """
+    if len(samples) > MAX_SAMPLES:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_SAMPLES} samples")
+
+    audio_samples = []
+    for sample in samples:
+        audio = await sample.read()
+        if not audio:
+            raise HTTPException(status_code=422, detail=f"Empty sample {sample.filename}")
+        if len(audio) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Sample {sample.filename} too large")
+        audio_samples.append((sample.filename or "sample.wav", audio))
+
+    registry = request.app.state.processor.voice_registry
+    # Sync DB commit plus decoding every sample: kept off the event loop
+    profile = await asyncio.to_thread(registry.start_enrollment, session, current_user.id, audio_samples)
+    background_tasks.add_task(registry.enroll, current_user.id, f"echonative-{current_user.username}", audio_samples)
+    return profile
+
+@router.get("/profile", response_model=VoiceProfileRead)
+def read_voice_profile(current_user: UserPrincipal = Depends(get_current_principal), session: Session = Depends(get_session)):
+    profile = session.exec(select(VoiceProfile).where(VoiceProfile.user_id == current_user.id)).first()
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No voice profile")
+    return profile
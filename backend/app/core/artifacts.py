@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+from app.core.audio import media_type_of
+from app.core.security import SECRET_KEY
+
+EXTENSIONS = {"audio/mpeg": ".mp3", "audio/wav": ".wav"}
+MEDIA_TYPES = {ext: media_type for media_type, ext in EXTENSIONS.items()}
+# Keys are generated, never user-chosen: anything else is rejected before touching the filesystem
+KEY_PATTERN = re.compile(r"^[0-9a-f]{32}\.(mp3|wav)$")
+
+
+class ArtifactStore(ABC):
+    """
+    Generated outputs (TTS audio), addressed by content hash and handed to clients as
+    short-lived signed URLs (GET /artifacts/{key}?expires=...&sig=...) instead of inline
+    data URIs. Signing and GC scheduling live here; subclasses store the bytes.
+    An object-storage backend would implement put/path/gc (and could return presigned
+    URLs from url()).
+    """
+    def __init__(self, secret: Optional[str] = None, url_ttl: int = 3600, base_url: str = "", gc_interval: float = 600):
+        self.secret = (secret or os.getenv("ARTIFACT_URL_SECRET") or SECRET_KEY).encode("utf-8")
+        self.url_ttl = max(int(url_ttl), 1)
+        self.base_url = base_url.rstrip("/")
+        self.gc_interval = gc_interval
+
+    @abstractmethod
+    def put(self, data: bytes, media_type: Optional[str] = None) -> str:
+        """
+        Stores data (once per content) and returns its key.
+        """
+
+    @abstractmethod
+    def path(self, key: str) -> Optional[str]:
+        """
+        Local file for a key, or None if it is unknown or was collected.
+        """
+
+    @abstractmethod
+    def gc(self):
+        """
+        Deletes expired artifacts (run by run_gc).
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters for /stats.
+        """
+
+    @staticmethod
+    def make_key(data: bytes, media_type: Optional[str] = None) -> str:
+        media_type = media_type or media_type_of(data)
+        return hashlib.sha256(data).hexdigest()[:32] + EXTENSIONS.get(media_type, ".mp3")
+
+    @staticmethod
+    def valid_key(key: str) -> bool:
+        return bool(KEY_PATTERN.match(key))
+
+    @staticmethod
+    def media_type(key: str) -> str:
+        return MEDIA_TYPES[os.path.splitext(key)[1]]
+
+    def sign(self, key: str, expires: int) -> str:
+        return hmac.new(self.secret, f"{key}:{expires}".encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def url(self, key: str) -> str:
+        """
+        Signed URL valid for url_ttl to 2 * url_ttl. The expiry is rounded up to a
+        url_ttl window, so repeat plays of the same audio get the same URL (and hit
+        the client's cache).
+        """
+        expires = (int(time.time()) // self.url_ttl + 2) * self.url_ttl
+        return f"{self.base_url}/artifacts/{key}?expires={expires}&sig={self.sign(key, expires)}"
+
+    def verify(self, key: str, expires: int, sig: str) -> bool:
+        if not self.valid_key(key) or expires < time.time():
+            return False
+        return hmac.compare_digest(self.sign(key, expires), sig)
+
+    async def run_gc(self):
+        """
+        Collects expired artifacts every gc_interval seconds (started by the FastAPI lifespan).
+        """
+        while True:
+            try:
+                await asyncio.to_thread(self.gc)
+            except Exception as e:
+                print(f"Artifact GC Error: {e}")
+            await asyncio.sleep(self.gc_interval)
+
+
+class LocalArtifactStore(ArtifactStore):
+    """
+    Artifacts as files in a local directory (sharded by the first two hex digits).
+    Writing the same content again only refreshes its TTL. gc() deletes files not
+    written for max_age, then the least recently written until the directory fits
+    in max_bytes.
+    """
+    def __init__(self, directory: str, max_age: float = 86400, max_bytes: int = 1024 * 1024 * 1024, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        # A URL must not outlive its file
+        self.max_age = max(max_age, 2 * self.url_ttl)
+        self.max_bytes = max_bytes
+        self.writes = 0
+        self.dedup_hits = 0
+        self.collected = 0
+
+    @classmethod
+    def from_env(cls) -> "LocalArtifactStore":
+        return cls(
+            directory=os.getenv("ARTIFACT_DIR", "backend/cache/artifacts"),
+            max_age=float(os.getenv("ARTIFACT_TTL_HOURS", "24")) * 3600,
+            max_bytes=int(os.getenv("ARTIFACT_MAX_MB", "1024")) * 1024 * 1024,
+            url_ttl=int(os.getenv("ARTIFACT_URL_TTL", "3600")),
+            base_url=os.getenv("ARTIFACT_BASE_URL", ""),
+            gc_interval=float(os.getenv("ARTIFACT_GC_INTERVAL", "600"))
+        )
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def put(self, data: bytes, media_type: Optional[str] = None) -> str:
+        data = bytes(data)
+        key = self.make_key(data, media_type)
+        path = self._path(key)
+        try:
+            os.utime(path)
+            self.dedup_hits += 1
+            return key
+        except FileNotFoundError:
+            pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write-then-rename: a concurrent reader never sees a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self.writes += 1
+        return key
+
+    def path(self, key: str) -> Optional[str]:
+        if not self.valid_key(key):
+            return None
+        path = self._path(key)
+        return path if os.path.isfile(path) else None
+
+    def gc(self):
+        if not os.path.isdir(self.directory):
+            return
+        now = time.time()
+        files = []
+        for shard in os.listdir(self.directory):
+            shard_dir = os.path.join(self.directory, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for name in os.listdir(shard_dir):
+                path = os.path.join(shard_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Leftover temp files (crashed writes) are collected by age like the rest
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(path)
+                elif self.valid_key(name):
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+            self.collected += 1
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "writes": self.writes,
+            "dedup_hits": self.dedup_hits,
+            "collected": self.collected,
+            "url_ttl": self.url_ttl
+        }
@@ -0,0 +1,185 @@
+import base64
+import os
+import struct
+from typing import Dict, List, Optional, Tuple, Union
+from fastapi import HTTPException, Request
+from python_multipart import MultipartParser
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import parse_options_header
+
+# Audio can arrive base64-encoded (JSON endpoints) or as raw bytes (upload endpoints)
+AudioInput = Union[str, bytes, bytearray, memoryview]
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024
+# Multipart bodies may exceed the audio cap by this much (boundaries, part headers, form fields)
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+def as_audio_bytes(audio: AudioInput) -> Union[bytes, bytearray, memoryview]:
+    """
+    Returns raw audio bytes. Base64 strings are decoded; binary buffers are passed through untouched.
+    """
+    if isinstance(audio, str):
+        return base64.b64decode(audio)
+    return audio
+
+
+def media_type_of(audio_bytes: bytes) -> str:
+    """
+    Generated speech is MP3 (ElevenLabs) or WAV (local TTS).
+    """
+    return "audio/wav" if bytes(audio_bytes[:4]) == b"RIFF" else "audio/mpeg"
+
+
+def to_data_url(audio_bytes: bytes, media_type: str = None) -> str:
+    media_type = media_type or media_type_of(audio_bytes)
+    return f"data:{media_type};base64,{base64.b64encode(audio_bytes).decode('utf-8')}"
+
+
+def wav_header(sample_rate: int, data_size: int = 0xFFFFFFFF - 36, channels: int = 1, bits: int = 16) -> bytes:
+    """
+    44-byte PCM WAV header. The default sizes mean "unknown length" so the header
+    can go out before the audio is synthesized; finalize_wav fills them in.
+    """
+    block_align = channels * bits // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", data_size + 36, b"WAVE", b"fmt ", 16, 1, channels,
+        sample_rate, sample_rate * block_align, block_align, bits, b"data", data_size
+    )
+
+
+def finalize_wav(audio: bytes) -> bytes:
+    """
+    Fixes the sizes of a streamed WAV (see wav_header). Other formats are returned as-is.
+    """
+    if audio[:4] != b"RIFF" or len(audio) < 44:
+        return audio
+    data_size = len(audio) - 44
+    return audio[:4] + struct.pack("<I", data_size + 36) + audio[8:40] + struct.pack("<I", data_size) + audio[44:]
+
+
+async def read_audio_upload(request: Request) -> Tuple[memoryview, Dict[str, str]]:
+    """
+    Reads an audio upload into a single buffer shared by all services.
+    - multipart/form-data: file field "audio", other form fields as parameters.
+    - anything else: the raw body is the audio, parameters come from the query string.
+    The body is streamed with MAX_UPLOAD_BYTES enforced as it arrives (413), and an
+    oversize Content-Length is rejected before reading anything.
+    Returns (audio buffer, parameters).
+    """
+    params = dict(request.query_params)
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        files, fields = await read_multipart_files(request, "audio")
+        if not files:
+            raise HTTPException(status_code=422, detail="Missing 'audio' file field")
+        params.update(fields)
+        buffer = files[0][1]
+    else:
+        check_content_length(request, MAX_UPLOAD_BYTES)
+        buffer = bytearray()
+        async for chunk in request.stream():
+            if len(buffer) + len(chunk) > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Audio upload too large")
+            buffer.extend(chunk)
+
+    if not buffer:
+        raise HTTPException(status_code=422, detail="Empty audio upload")
+    return memoryview(buffer), params
+
+
+def check_content_length(request: Request, limit: int):
+    """
+    Rejects a body announced as larger than `limit` before reading any of it.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > limit:
+        raise HTTPException(status_code=413, detail="Upload too large")
+
+
+async def read_multipart_files(
+    request: Request,
+    file_field: str,
+    max_file_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None
+) -> Tuple[List[Tuple[str, bytearray]], Dict[str, str]]:
+    """
+    Streams a multipart body through the parser: every `file_field` file part goes
+    straight into its own buffer (no spooling, no second copy), capped at max_file_bytes
+    each and max_total_bytes together (both default to MAX_UPLOAD_BYTES). The other
+    parts are small text fields, returned as parameters.
+    Returns ([(filename, buffer), ...], fields).
+    """
+    max_file_bytes = max_file_bytes or MAX_UPLOAD_BYTES
+    max_total_bytes = max_total_bytes or MAX_UPLOAD_BYTES
+    body_limit = max_total_bytes + FORM_OVERHEAD_BYTES
+    check_content_length(request, body_limit)
+
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    boundary = options.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=422, detail="Missing multipart boundary")
+
+    files: List[Tuple[str, bytearray]] = []
+    fields: Dict[str, str] = {}
+    part = {"header": b"", "value": b"", "name": None, "filename": None, "data": bytearray()}
+    total = 0
+
+    def on_part_begin():
+        part.update(name=None, filename=None, data=bytearray())
+
+    def on_header_field(data: bytes, start: int, end: int):
+        part["header"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        if part["header"].lower() == b"content-disposition":
+            _, disposition = parse_options_header(part["value"])
+            part["name"] = disposition.get(b"name", b"").decode("utf-8", errors="replace")
+            if b"filename" in disposition:
+                part["filename"] = disposition[b"filename"].decode("utf-8", errors="replace")
+        part.update(header=b"", value=b"")
+
+    def on_headers_finished():
+        if part["name"] == file_field and part["filename"] is not None:
+            files.append((part["filename"], part["data"]))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        nonlocal total
+        if part["filename"] is None:
+            part["data"] += data[start:end]
+        elif part["name"] == file_field:
+            if len(part["data"]) + end - start > max_file_bytes:
+                raise HTTPException(status_code=413, detail=f"Audio {part['filename']} too large")
+            total += end - start
+            if total > max_total_bytes:
+                raise HTTPException(status_code=413, detail="Upload too large")
+            part["data"] += data[start:end]
+
+    def on_part_end():
+        if part["name"] and part["filename"] is None:
+            fields[part["name"]] = part["data"].decode("utf-8", errors="replace")
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end
+    })
+    received = 0
+    try:
+        async for chunk in request.stream():
+            # Caps everything else (other files, huge fields, a missing Content-Length)
+            received += len(chunk)
+            if received > body_limit:
+                raise HTTPException(status_code=413, detail="Upload too large")
+            parser.write(chunk)
+        parser.finalize()
+    except FormParserError as e:
+        raise HTTPException(status_code=422, detail=f"Malformed multipart body: {e}")
+    return files, fields
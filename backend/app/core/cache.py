@@ -0,0 +1,337 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+from app.core.database import connect_sqlite
+
+
+class LRUCache:
+    """
+    In-memory LRU cache with optional TTL and hit/miss counters.
+    Not thread-safe: meant to be used from the event loop.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class DiskCache:
+    """
+    Size-bounded directory of binary blobs, one file per key.
+    Least recently used files are evicted once max_bytes is exceeded.
+    Worker processes can share one directory; each sees the others' files.
+    Methods do blocking file I/O; call them via asyncio.to_thread from async code.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, suffix: str = ""):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+
+        os.makedirs(directory, exist_ok=True)
+        # Rebuild the index from what survived the last run
+        self._scan()
+
+    def _scan(self):
+        """
+        (Re)builds the index from the directory, oldest first.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix) or name.startswith(".") or name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+        self._index = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._total = sum(self._index.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def get(self, key: str) -> Optional[bytes]:
+        name = f"{key}{self.suffix}"
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            if self._index.pop(name, None) is not None:
+                self._total = sum(self._index.values())
+            self.misses += 1
+            return None
+        # Touch so recency survives restarts (another worker may have evicted it since the read)
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            pass
+        if name in self._index:
+            self._index.move_to_end(name)
+        self.hits += 1
+        return data
+
+    def set(self, key: str, value: bytes):
+        name = f"{key}{self.suffix}"
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        self._total -= self._index.pop(name, 0)
+        self._index[name] = len(value)
+        self._total += len(value)
+        self._evict()
+
+    def _evict(self):
+        if self._total <= self.max_bytes:
+            return
+        # Other worker processes write to the same directory: count their files too
+        self._scan()
+        while self._total > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "files": len(self._index),
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class SQLiteCache:
+    """
+    Persistent key/value cache in a SQLite table, with TTL and LRU eviction.
+    Values must be JSON-serializable. Shared by every process that opens the same file.
+    Methods do blocking I/O (`blocking = True`); call them via asyncio.to_thread from async code.
+    """
+    blocking = True
+
+    def __init__(self, path: str, table: str = "cache", maxsize: int = 10000, ttl: Optional[float] = None):
+        self.table = table
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self.path = path
+        self._pid = None
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{table}_accessed_at ON {table} (accessed_at)")
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # (Re)opened in each process: a connection inherited through fork (gunicorn --preload) is unusable
+        if self._pid != os.getpid():
+            self._db = connect_sqlite(self.path)
+            self._pid = os.getpid()
+        return self._db
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at, now)
+            )
+            self._writes += 1
+            # Evict in batches rather than on every write
+            if self._writes % 100 == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        (count,) = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.maxsize:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (count - self.maxsize,)
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one in-flight coroutine.
+    Callers that arrive while a call is running await the same result.
+    The call is cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, list] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.shared += 1
+        else:
+            # [future, number of waiting callers]
+            entry = [asyncio.ensure_future(fn()), 0]
+            self._inflight[key] = entry
+            entry[0].add_done_callback(lambda _: self._forget(key, entry))
+
+        future = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not future.done():
+                # Nobody is left to use the result (e.g. a discarded speculative call)
+                self._forget(key, entry)
+                future.cancel()
+
+    def _forget(self, key: Hashable, entry: list):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+
+class ResultCache:
+    """
+    Async front for a result cache backend (LRUCache, or SQLiteCache to share results
+    across worker processes and restarts): get_or_fetch with single-flight misses.
+    Blocking backends are called in a thread.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.flight = SingleFlight()
+        self.upstream_calls = 0
+
+    async def _call(self, fn, *args):
+        if getattr(self.backend, "blocking", False):
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self._call(self.backend.get, key)
+
+    async def set(self, key: str, value: Any):
+        await self._call(self.backend.set, key, value)
+
+    async def get_or_fetch(self, key: str, fetch) -> Any:
+        """
+        Returns the cached value or calls fetch() once (concurrent misses share the call).
+        Exceptions from fetch are not cached.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value
+        return await self.flight.do(key, lambda: self._load(key, fetch))
+
+    async def _load(self, key: str, fetch) -> Any:
+        self.upstream_calls += 1
+        value = await fetch()
+        await self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        return {
+            **self.backend.stats(),
+            "backend": "sqlite" if isinstance(self.backend, SQLiteCache) else "memory",
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.flight.shared
+        }
@@ -1,13 +1,102 @@
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.workers import file_lock_sync
 
 sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
+database_url = os.getenv("DATABASE_URL") or sqlite_url
 
-engine = create_engine(sqlite_url, connect_args={"check_same_thread": False})
+# How long a writer waits for SQLite's write lock (other workers) before failing
+busy_timeout_ms = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Async drivers for the sync URLs we accept in DATABASE_URL
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+def async_url(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.drivername in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[parsed.drivername])
+    return parsed.render_as_string(hide_password=False)
+
+def engine_options(url: str) -> dict:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        return {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+            "pool_pre_ping": True
+        }
+    if parsed.database in (None, "", ":memory:"):
+        return {"connect_args": {"check_same_thread": False}}
+    # SQLite allows one writer at a time: a small pool is enough, more connections only queue on the lock
+    return {
+        "connect_args": {"check_same_thread": False},
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    }
+
+def enable_sqlite_wal(sync_engine):
+    """
+    WAL lets readers run while a write is in progress; synchronous=NORMAL is safe with WAL
+    and avoids an fsync per commit. busy_timeout waits for the write lock instead of failing.
+    """
+    if sync_engine.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout_ms}")
+        cursor.close()
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Raw connection for the SQLite-backed caches and the job queue, with the same WAL
+    settings as the engines. Autocommit; callers use BEGIN IMMEDIATE where they read-modify-write.
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=busy_timeout_ms / 1000)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+async def begin_write(session: AsyncSession):
+    """
+    Makes a read-modify-write transaction safe across worker processes: the rows read
+    can't change before the commit. SQLite takes the write lock up front (BEGIN IMMEDIATE,
+    waits up to DB_BUSY_TIMEOUT_MS); other databases lock rows with SELECT ... FOR UPDATE.
+    """
+    if session.bind.dialect.name == "sqlite":
+        await session.exec(text("BEGIN IMMEDIATE"))
+
+engine = create_engine(database_url, **engine_options(database_url))
+enable_sqlite_wal(engine)
+
+# Used on hot paths (auth lookups, streak flushes) so they don't block the event loop
+async_engine = create_async_engine(async_url(database_url), **engine_options(database_url))
+enable_sqlite_wal(async_engine.sync_engine)
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    # Every worker runs this at startup: one at a time, or two may both try to create a table
+    database = make_url(database_url).database
+    if engine.dialect.name == "sqlite" and database not in (None, "", ":memory:"):
+        lock_path = f"{database}.init.lock"
+    else:
+        lock_path = os.path.join(tempfile.gettempdir(), "echonative-db-init.lock")
+    with file_lock_sync(lock_path):
+        SQLModel.metadata.create_all(engine)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
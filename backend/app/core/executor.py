@@ -0,0 +1,223 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.metrics import stage
+from app.core.workers import per_worker
+
+
+class ExecutorBusy(Exception):
+    """
+    Raised when a pool's queue is full. Mapped to 503 + Retry-After by the API.
+    """
+    def __init__(self, pool: str, retry_after: int = 1):
+        super().__init__(f"{pool} workers are saturated")
+        self.pool = pool
+        self.retry_after = retry_after
+
+
+def _timed_call(fn: Callable, args: tuple) -> Tuple[float, bool, Any]:
+    """
+    Runs in the worker: returns when the task actually started (wall clock, comparable
+    across processes), whether it succeeded, and its result or exception.
+    """
+    started = time.time()
+    try:
+        return started, True, fn(*args)
+    except Exception as e:
+        return started, False, e
+
+
+class TaskMetrics:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.rejected = 0
+        self.run_ms_total = 0.0
+        self.run_ms_max = 0.0
+        self.wait_ms_total = 0.0
+
+    def record(self, wait_ms: float, run_ms: float, ok: bool):
+        self.count += 1
+        if not ok:
+            self.errors += 1
+        self.wait_ms_total += wait_ms
+        self.run_ms_total += run_ms
+        self.run_ms_max = max(self.run_ms_max, run_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "run_ms_avg": round(self.run_ms_total / self.count, 3) if self.count else 0.0,
+            "run_ms_max": round(self.run_ms_max, 3),
+            "wait_ms_avg": round(self.wait_ms_total / self.count, 3) if self.count else 0.0
+        }
+
+
+class TaskExecutor:
+    """
+    Keeps blocking work off the event loop.
+    - CPU-bound analysis (Praat) runs in a process pool.
+    - ffmpeg runs as asyncio subprocesses behind a concurrency semaphore.
+    Both pools have a queue-depth limit and reject work with ExecutorBusy when full.
+
+    The process pool is started by the FastAPI lifespan. Until then (e.g. in unit
+    tests) CPU tasks run in the default thread pool.
+    """
+    def __init__(self):
+        # Defaults split the box between worker processes (see workers.per_worker)
+        self.cpu_workers = int(os.getenv("CPU_WORKERS", str(min(4, per_worker(os.cpu_count() or 1)))))
+        self.cpu_queue_limit = int(os.getenv("CPU_QUEUE_LIMIT", "32"))
+        self.ffmpeg_concurrency = int(os.getenv("FFMPEG_CONCURRENCY", str(per_worker(2))))
+        self.ffmpeg_queue_limit = int(os.getenv("FFMPEG_QUEUE_LIMIT", "8"))
+        self.ffmpeg_timeout = float(os.getenv("FFMPEG_TIMEOUT", "60"))
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cpu_pending = 0
+        self._ffmpeg_pending = 0
+        self._ffmpeg_slots = asyncio.Semaphore(self.ffmpeg_concurrency)
+        self.metrics: Dict[str, TaskMetrics] = {}
+
+    def start(self):
+        if self._pool is None and self.cpu_workers > 0:
+            # spawn: forking a process that already runs an event loop and threads is unsafe
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.cpu_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    async def shutdown(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+    def _metrics(self, name: str) -> TaskMetrics:
+        if name not in self.metrics:
+            self.metrics[name] = TaskMetrics()
+        return self.metrics[name]
+
+    async def run_cpu(self, name: str, fn: Callable, *args) -> Any:
+        """
+        Runs fn(*args) in the process pool. fn and args must be picklable.
+        """
+        metrics = self._metrics(name)
+        if self._cpu_pending >= self.cpu_queue_limit:
+            metrics.rejected += 1
+            raise ExecutorBusy("cpu")
+
+        self._cpu_pending += 1
+        # Wall clock: the task starts in another process
+        queued = started = time.time()
+        ok = False
+        try:
+            if self._pool is not None:
+                try:
+                    started, ok, result = await asyncio.get_running_loop().run_in_executor(
+                        self._pool, _timed_call, fn, args
+                    )
+                except BrokenProcessPool:
+                    # A worker died (OOM, segfault in native code): replace the pool for the next task
+                    self._pool = None
+                    self.start()
+                    raise
+            else:
+                started, ok, result = await asyncio.to_thread(_timed_call, fn, args)
+            if not ok:
+                raise result
+            return result
+        finally:
+            self._cpu_pending -= 1
+            finished = time.time()
+            metrics.record(max(started - queued, 0.0) * 1000, max(finished - started, 0.0) * 1000, ok)
+
+    async def run_subprocess(
+        self,
+        name: str,
+        cmd: List[str],
+        input: Optional[bytes] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[int, bytes]:
+        """
+        Runs cmd without blocking the event loop. Returns (returncode, stderr).
+        At most ffmpeg_concurrency processes run at once; up to ffmpeg_queue_limit more may wait.
+        """
+        returncode, _, stderr = await self._run_subprocess(name, cmd, input, timeout, capture_stdout=False)
+        return returncode, stderr
+
+    async def run_subprocess_output(
+        self,
+        name: str,
+        cmd: List[str],
+        input: Optional[bytes] = None,
+        timeout: Optional[float] = None
+    ) -> Tuple[int, bytes, bytes]:
+        """
+        Like run_subprocess, but also captures stdout (e.g. ffmpeg writing to pipe:1).
+        Returns (returncode, stdout, stderr).
+        """
+        return await self._run_subprocess(name, cmd, input, timeout, capture_stdout=True)
+
+    async def _run_subprocess(
+        self,
+        name: str,
+        cmd: List[str],
+        input: Optional[bytes],
+        timeout: Optional[float],
+        capture_stdout: bool
+    ) -> Tuple[int, bytes, bytes]:
+        metrics = self._metrics(name)
+        if self._ffmpeg_pending >= self.ffmpeg_concurrency + self.ffmpeg_queue_limit:
+            metrics.rejected += 1
+            raise ExecutorBusy("ffmpeg", retry_after=5)
+
+        self._ffmpeg_pending += 1
+        queued = started = time.perf_counter()
+        ok = False
+        # Includes the wait for a slot: that is part of what a render costs the request
+        with stage("ffmpeg", task=name):
+            try:
+                async with self._ffmpeg_slots:
+                    started = time.perf_counter()
+                    proc = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+                        stdout=asyncio.subprocess.PIPE if capture_stdout else asyncio.subprocess.DEVNULL,
+                        stderr=asyncio.subprocess.PIPE
+                    )
+                    try:
+                        stdout, stderr = await asyncio.wait_for(
+                            proc.communicate(input),
+                            timeout=timeout or self.ffmpeg_timeout
+                        )
+                    except (asyncio.TimeoutError, asyncio.CancelledError):
+                        proc.kill()
+                        await proc.wait()
+                        raise
+                    ok = proc.returncode == 0
+                    return proc.returncode, stdout or b"", stderr
+            finally:
+                self._ffmpeg_pending -= 1
+                metrics.record((started - queued) * 1000, (time.perf_counter() - started) * 1000, ok)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cpu": {
+                "workers": self.cpu_workers if self._pool is not None else 0,
+                "pending": self._cpu_pending,
+                "queue_limit": self.cpu_queue_limit
+            },
+            "ffmpeg": {
+                "concurrency": self.ffmpeg_concurrency,
+                "pending": self._ffmpeg_pending,
+                "queue_limit": self.ffmpeg_queue_limit
+            },
+            "tasks": {name: m.snapshot() for name, m in self.metrics.items()}
+        }
+
+
+executor = TaskExecutor()
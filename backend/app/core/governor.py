@@ -0,0 +1,309 @@
+import asyncio
+import contextvars
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from app.core.executor import ExecutorBusy
+from app.core.metrics import registry
+from app.core.workers import per_worker, worker_count
+
+# Request-scoped, like metrics.mode_var: tasks started by a request inherit them
+user_var: contextvars.ContextVar[str] = contextvars.ContextVar("governor_user", default="")
+deadline_var: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+upstream_queue_seconds = registry.histogram(
+    "echonative_upstream_queue_seconds", "Time a call waited for an upstream slot", ["service"]
+)
+
+# service: (requests per second (0 = unlimited), burst, max concurrent calls)
+DEFAULT_LIMITS = {
+    "openai_stt": (40.0, 40, 50),
+    "openai_llm": (80.0, 80, 100),
+    "elevenlabs": (0.0, 0, 10)
+}
+
+
+class UpstreamBusy(ExecutorBusy):
+    """
+    The wait for an upstream slot would exceed the request's deadline (or the queue is full).
+    Answered with 503 + Retry-After like other saturated pools.
+    """
+    def __init__(self, service: str, retry_after: int = 1, reason: str = "over capacity"):
+        super().__init__(service, retry_after)
+        self.args = (f"{service} is {reason}",)
+        self.reason = reason
+
+
+def bind_user(user_id: Any):
+    """
+    Sets the user that upstream calls of the current request are queued under.
+    """
+    user_var.set(str(user_id))
+
+
+def set_deadline(seconds: Optional[float]):
+    """
+    Latency budget for the current request (and tasks it starts). None: no deadline.
+    """
+    deadline_var.set(time.monotonic() + seconds if seconds else None)
+
+
+def remaining() -> Optional[float]:
+    deadline = deadline_var.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def call_timeout(default: float) -> float:
+    """
+    Timeout for an upstream call: its usual timeout, capped by what is left of the deadline.
+    """
+    left = remaining()
+    return default if left is None else max(0.001, min(default, left))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Takes a token and returns 0, or returns the seconds until one is available.
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class Governor:
+    """
+    Admission control for one upstream service.
+    A call needs a concurrency slot and a rate token. Waiting calls are queued per user
+    and served round-robin, so one user's burst can't starve everyone else. A call whose
+    expected wait exceeds its request's remaining deadline is rejected up front
+    (UpstreamBusy) instead of timing out later; so is one that hits the deadline in the queue.
+    """
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int, queue_limit: int = 256):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = max(concurrency, 1)
+        self.queue_limit = queue_limit
+        self.active = 0
+        self.queued = 0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Moving average of how long a call holds its slot, for wait estimates
+        self.hold_seconds = 0.0
+        self.granted = 0
+        self.shed = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "Governor":
+        """
+        Limits are the account's, so each of WEB_CONCURRENCY worker processes gets its share.
+        """
+        rate, burst, concurrency = DEFAULT_LIMITS.get(name, (0.0, 0, 32))
+        prefix = name.upper()
+        rate = float(os.getenv(f"{prefix}_RPS", str(rate)))
+        burst = int(os.getenv(f"{prefix}_BURST", str(burst or math.ceil(rate))))
+        return cls(
+            name,
+            rate=rate / worker_count(),
+            burst=per_worker(burst),
+            concurrency=per_worker(int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency)))),
+            queue_limit=int(os.getenv(f"{prefix}_QUEUE_LIMIT", "256"))
+        )
+
+    def estimate_wait(self, ahead: int) -> float:
+        """
+        Expected queueing time for a call with `ahead` calls in front of it.
+        """
+        by_rate = ahead / self.bucket.rate if self.bucket.rate > 0 else 0.0
+        waves = (self.active + ahead) // self.concurrency
+        return max(by_rate, waves * self.hold_seconds)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - started)
+
+    async def acquire(self):
+        queued_at = time.monotonic()
+        budget = remaining()
+        if budget is not None and budget <= 0:
+            self._shed(1, "past its deadline")
+        if not self.queued and self.active < self.concurrency and self.bucket.take() == 0:
+            self._grant()
+            upstream_queue_seconds.observe(0.0, service=self.name)
+            return
+        if self.queued >= self.queue_limit:
+            self._shed(math.ceil(self.estimate_wait(self.queued)) or 1)
+        wait = self.estimate_wait(self.queued)
+        if budget is not None and wait > budget:
+            self._shed(math.ceil(wait))
+
+        future = asyncio.get_running_loop().create_future()
+        user = user_var.get()
+        self._queues.setdefault(user, deque()).append(future)
+        self.queued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, budget)
+        except asyncio.TimeoutError:
+            self._forget(user, future)
+            self._shed(math.ceil(self.estimate_wait(self.queued)) or 1, "past its deadline")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the caller left: hand the slot on
+                self.release(0.0)
+            else:
+                self._forget(user, future)
+            raise
+        upstream_queue_seconds.observe(time.monotonic() - queued_at, service=self.name)
+
+    def release(self, held: float):
+        self.active -= 1
+        if held:
+            self.hold_seconds = held if not self.hold_seconds else 0.9 * self.hold_seconds + 0.1 * held
+        self._dispatch()
+
+    def _grant(self):
+        self.active += 1
+        self.granted += 1
+
+    def _shed(self, retry_after: int, reason: str = "over capacity"):
+        self.shed += 1
+        raise UpstreamBusy(self.name, retry_after, reason)
+
+    def _forget(self, user: str, future: asyncio.Future):
+        waiters = self._queues.get(user)
+        if waiters is not None and future in waiters:
+            waiters.remove(future)
+            self.queued -= 1
+            if not waiters:
+                del self._queues[user]
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.queued and self.active < self.concurrency:
+            delay = self.bucket.take()
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            # Round-robin over users: take the oldest call of the next user, then move them to the back
+            user, waiters = next(iter(self._queues.items()))
+            future = waiters.popleft()
+            self.queued -= 1
+            if waiters:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            self._grant()
+            future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "users_waiting": len(self._queues),
+            "granted": self.granted,
+            "shed": self.shed,
+            "hold_ms_avg": round(self.hold_seconds * 1000, 1),
+            "limits": {"rps": self.bucket.rate, "burst": self.bucket.burst, "concurrency": self.concurrency}
+        }
+
+
+class Governors:
+    """
+    One Governor per upstream service (openai_stt, openai_llm, elevenlabs), configured
+    from <SERVICE>_RPS / _BURST / _CONCURRENCY / _QUEUE_LIMIT.
+    """
+    def __init__(self):
+        self._governors: Dict[str, Governor] = {}
+
+    def get(self, name: str) -> Governor:
+        governor = self._governors.get(name)
+        if governor is None:
+            governor = self._governors[name] = Governor.from_env(name)
+        return governor
+
+    def slot(self, name: str):
+        """
+        `async with governors.slot("openai_llm"): ...` around one upstream call (or stream).
+        """
+        return self.get(name).slot()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: governor.stats() for name, governor in self._governors.items()}
+
+
+governors = Governors()
+
+
+class DeadlineMiddleware:
+    """
+    ASGI middleware: gives every request a latency budget (REQUEST_DEADLINE_MS, or the
+    client's X-Request-Deadline-Ms if smaller). Upstream calls queue at most that long
+    and their timeouts are capped by what is left.
+    The clock restarts once the request body has been received, so a slow upload or a
+    large base64 JSON body doesn't eat into the budget for the work.
+    Routes under REQUEST_DEADLINE_EXEMPT (batches, enrollment) get no default budget:
+    their work continues in the background after the response. A client header still
+    applies there.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.default_ms = float(os.getenv("REQUEST_DEADLINE_MS", "15000"))
+        self.exempt = tuple(
+            prefix.strip().rstrip("/")
+            for prefix in os.getenv(
+                "REQUEST_DEADLINE_EXEMPT", "/batch,/voice/enroll"
+            ).split(",")
+            if prefix.strip()
+        )
+
+    def _is_exempt(self, path: str) -> bool:
+        return any(path == prefix or path.startswith(prefix + "/") for prefix in self.exempt)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget_ms = 0.0 if self._is_exempt(scope.get("path", "")) else self.default_ms
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-deadline-ms":
+                try:
+                    budget_ms = min(budget_ms, float(value)) if budget_ms else float(value)
+                except ValueError:
+                    pass
+        budget = budget_ms / 1000 if budget_ms > 0 else None
+        set_deadline(budget)
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def receive_body():
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                # Runs in the task that reads the body, i.e. the endpoint's
+                set_deadline(budget)
+            return message
+
+        await self.app(scope, receive_body, send)
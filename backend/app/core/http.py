@@ -0,0 +1,184 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import httpx
+from openai import AsyncOpenAI
+
+# Status codes worth retrying: rate limited or transient upstream failure
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class PoolMetrics:
+    """
+    Counters for one connection pool.
+    """
+    def __init__(self):
+        self.requests = 0
+        self.new_connections = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        reused = max(self.requests - self.new_connections, 0)
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "wait_ms_avg": round(self.wait_ms_total / self.requests, 3) if self.requests else 0.0,
+            "wait_ms_max": round(self.wait_ms_max, 3)
+        }
+
+
+class MeteredTransport(httpx.AsyncHTTPTransport):
+    """
+    HTTP transport that records pool wait time and connection reuse.
+    Uses the httpcore `trace` extension: a request that opens a TCP connection
+    is a new connection, everything else reused a pooled one.
+    """
+    def __init__(self, metrics: PoolMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        state = {"connected": False, "dispatched": None}
+        outer_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.started":
+                state["connected"] = True
+            if state["dispatched"] is None and (
+                event_name == "connection.connect_tcp.started"
+                or event_name.endswith("send_request_headers.started")
+            ):
+                # Time until we either got a pooled connection or started opening one
+                state["dispatched"] = time.perf_counter()
+            if outer_trace is not None:
+                await outer_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+
+        metrics = self.metrics
+        metrics.requests += 1
+        metrics.in_flight += 1
+        try:
+            return await super().handle_async_request(request)
+        except Exception:
+            metrics.errors += 1
+            raise
+        finally:
+            metrics.in_flight -= 1
+            if state["connected"]:
+                metrics.new_connections += 1
+            if state["dispatched"] is not None:
+                wait_ms = (state["dispatched"] - started) * 1000
+                metrics.wait_ms_total += wait_ms
+                metrics.wait_ms_max = max(metrics.wait_ms_max, wait_ms)
+
+    def pool_state(self) -> Dict[str, int]:
+        connections = getattr(self._pool, "connections", [])
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"connections": len(connections), "in_use": len(connections) - idle, "idle": idle}
+
+
+async def retry_async(
+    fn: Callable[[], Awaitable[httpx.Response]],
+    attempts: int = 3,
+    base_delay: float = 0.2,
+    max_delay: float = 2.0
+) -> httpx.Response:
+    """
+    Calls fn until it returns a non-retryable response or attempts run out.
+    Backoff is exponential with full jitter so synchronized clients spread out.
+    """
+    for attempt in range(attempts):
+        last_attempt = attempt == attempts - 1
+        try:
+            response = await fn()
+            if response.status_code not in RETRYABLE_STATUS or last_attempt:
+                return response
+        except httpx.TransportError:
+            if last_attempt:
+                raise
+        await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+
+class UpstreamClients:
+    """
+    App-scoped HTTP clients shared by all services.
+    One keep-alive pool per upstream (OpenAI, ElevenLabs), created lazily and
+    closed by the FastAPI lifespan.
+    """
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+        )
+        self.http2 = os.getenv("HTTP2", "true").lower() == "true"
+        self.max_retries = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+        self.timeouts = {
+            "stt": float(os.getenv("STT_TIMEOUT", "30")),
+            "llm": float(os.getenv("LLM_TIMEOUT", "20")),
+            "tts": float(os.getenv("TTS_TIMEOUT", "20"))
+        }
+        self.metrics: Dict[str, PoolMetrics] = {}
+        self._transports: Dict[str, MeteredTransport] = {}
+        self._http: Dict[str, httpx.AsyncClient] = {}
+        self._openai: Dict[Tuple[str, Optional[str]], AsyncOpenAI] = {}
+
+    def http(self, pool: str, timeout: Optional[float] = None) -> httpx.AsyncClient:
+        """
+        Returns the pooled httpx client for an upstream, e.g. "elevenlabs".
+        """
+        client = self._http.get(pool)
+        if client is None:
+            self.metrics[pool] = PoolMetrics()
+            transport = MeteredTransport(self.metrics[pool], http2=self.http2, limits=self.limits)
+            self._transports[pool] = transport
+            client = httpx.AsyncClient(transport=transport, timeout=timeout or 30.0)
+            self._http[pool] = client
+        return client
+
+    def openai(self, service: str, api_key: Optional[str] = None) -> AsyncOpenAI:
+        """
+        Returns an OpenAI client for a service ("stt" / "llm").
+        All services share one connection pool; timeouts differ per service.
+        Retries use the SDK's own jittered exponential backoff.
+        """
+        key = (service, api_key)
+        client = self._openai.get(key)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=api_key or os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_BASE_URL") or None,
+                http_client=self.http("openai"),
+                timeout=self.timeouts[service],
+                max_retries=self.max_retries
+            )
+            self._openai[key] = client
+        return client
+
+    async def aclose(self):
+        for client in self._http.values():
+            await client.aclose()
+        self._http.clear()
+        self._transports.clear()
+        self._openai.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {}
+        for pool, metrics in self.metrics.items():
+            stats[pool] = metrics.snapshot()
+            if pool in self._transports:
+                stats[pool].update(self._transports[pool].pool_state())
+        return stats
+
+
+clients = UpstreamClients()
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from app.core.database import connect_sqlite, sqlite_file_name
+from app.core.executor import ExecutorBusy
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite table. Survives restarts and can be shared by the
+    API process and separate worker processes opening the same file.
+    - claim() hands out the highest-priority due job and leases it; a job whose
+      lease expires (worker crashed) becomes claimable again.
+    - fail() re-queues with exponential backoff until max_attempts is reached.
+    Methods do blocking I/O; call them via asyncio.to_thread from async code.
+    """
+
+    def __init__(self, path: Optional[str] = None, table: str = "jobs", lease_seconds: Optional[float] = None):
+        self.path = path or os.getenv("JOBS_DB") or sqlite_file_name
+        self.table = table
+        self.lease_seconds = lease_seconds or float(os.getenv("JOB_LEASE_SECONDS", "600"))
+        self._lock = threading.Lock()
+        self._pid = None
+        with self._lock:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, user_id INTEGER, priority INTEGER NOT NULL, "
+                "status TEXT NOT NULL, payload TEXT NOT NULL, result TEXT, error TEXT, "
+                "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                "run_after REAL NOT NULL, lease_until REAL, created_at REAL NOT NULL, "
+                "updated_at REAL NOT NULL, finished_at REAL)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS ix_{table}_claim ON {table} (kind, status, priority, run_after)"
+            )
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # WAL (see connect_sqlite): workers claiming jobs don't block API reads.
+        # Reopened after a fork (gunicorn --preload): a connection must not cross processes.
+        if self._pid != os.getpid():
+            self._db = connect_sqlite(self.path)
+            self._pid = os.getpid()
+        return self._db
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: Dict[str, Any],
+        user_id: Optional[int] = None,
+        priority: int = 0,
+        max_attempts: int = 3
+    ) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO {self.table} (id, kind, user_id, priority, status, payload, max_attempts, "
+                "run_after, created_at, updated_at) VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, kind, user_id, priority, json.dumps(payload, ensure_ascii=False), max_attempts, now, now, now)
+            )
+        return self.get(job_id)
+
+    def claim(self, kind: str) -> Optional[Dict[str, Any]]:
+        """
+        Leases the next due job of `kind` (highest priority, then oldest), or returns None.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    f"SELECT id FROM {self.table} WHERE kind = ? AND ("
+                    "(status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?)"
+                    ") ORDER BY priority DESC, created_at LIMIT 1",
+                    (kind, now, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    f"UPDATE {self.table} SET status = 'running', attempts = attempts + 1, "
+                    "lease_until = ?, updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, row[0])
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0])
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE {self.table} SET status = 'done', result = ?, error = NULL, lease_until = NULL, "
+                "updated_at = ?, finished_at = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), now, now, job_id)
+            )
+
+    def fail(self, job_id: str, error: str, base_delay: float = 2.0, max_delay: float = 60.0) -> str:
+        """
+        Records a failed attempt. Re-queues with backoff while attempts remain.
+        Returns the new status ('queued' or 'failed').
+        """
+        job = self.get(job_id)
+        now = time.time()
+        if job is not None and job["attempts"] < job["max_attempts"]:
+            delay = min(max_delay, base_delay * 2 ** (job["attempts"] - 1)) * random.uniform(0.5, 1.0)
+            status, run_after, finished_at = "queued", now + delay, None
+        else:
+            status, run_after, finished_at = "failed", now, now
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE {self.table} SET status = ?, error = ?, run_after = ?, lease_until = NULL, "
+                "updated_at = ?, finished_at = ? WHERE id = ?",
+                (status, error, run_after, now, finished_at, job_id)
+            )
+        return status
+
+    def release(self, job_id: str, delay: float = 0.0):
+        """
+        Puts a claimed job back without counting the attempt (worker busy or shutting down).
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE {self.table} SET status = 'queued', attempts = MAX(attempts - 1, 0), run_after = ?, "
+                "lease_until = NULL, updated_at = ? WHERE id = ? AND status = 'running'",
+                (now + delay, now, job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(f"SELECT * FROM {self.table} WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            job = dict(zip([c[0] for c in cursor.description], row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def purge(self, older_than: float):
+        """
+        Deletes finished jobs that finished more than `older_than` seconds ago.
+        """
+        with self._lock:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - older_than,)
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status").fetchall()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(dict(rows))
+        return counts
+
+
+class JobWorkers:
+    """
+    Local worker pool for a JobQueue: `concurrency[kind]` asyncio workers per job kind,
+    each running `handlers[kind](payload) -> result`. A handler that raises is retried
+    by the queue; ExecutorBusy puts the job back without using up an attempt.
+    Workers poll every `poll_interval` seconds and are woken early by notify()
+    when a job is enqueued in the same process.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]],
+        concurrency: Dict[str, int],
+        poll_interval: Optional[float] = None,
+        retention: Optional[float] = None
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval or float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+        self.retention = retention if retention is not None else float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Dict[str, asyncio.Event] = {}
+        self.active: Dict[str, int] = dict.fromkeys(handlers, 0)
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        for kind in self.handlers:
+            self._wakeup[kind] = asyncio.Event()
+            for _ in range(self.concurrency.get(kind, 1)):
+                self._tasks.append(asyncio.create_task(self._worker(kind)))
+        self._tasks.append(asyncio.create_task(self._purge_loop()))
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def notify(self, kind: str):
+        event = self._wakeup.get(kind)
+        if event is not None:
+            event.set()
+
+    async def _worker(self, kind: str):
+        wakeup = self._wakeup[kind]
+        while True:
+            job = await asyncio.to_thread(self.queue.claim, kind)
+            if job is None:
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._execute(kind, job)
+
+    async def _execute(self, kind: str, job: Dict[str, Any]):
+        self.active[kind] += 1
+        try:
+            # The lease is the hard limit: past it another worker may pick the job up
+            result = await asyncio.wait_for(self.handlers[kind](job["payload"]), timeout=self.queue.lease_seconds)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job to the next worker instead of waiting for the lease
+            await asyncio.shield(asyncio.to_thread(self.queue.release, job["id"]))
+            raise
+        except ExecutorBusy as e:
+            await asyncio.to_thread(self.queue.release, job["id"], e.retry_after)
+        except Exception as e:
+            print(f"Job Error ({kind} {job['id']}, attempt {job['attempts']}): {e}")
+            status = await asyncio.to_thread(self.queue.fail, job["id"], str(e) or type(e).__name__)
+            if status == "failed":
+                self.failed += 1
+            else:
+                self.retried += 1
+        else:
+            await asyncio.to_thread(self.queue.complete, job["id"], result)
+            self.completed += 1
+        finally:
+            self.active[kind] -= 1
+
+    async def _purge_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.queue.purge, self.retention)
+            except Exception as e:
+                print(f"Job Purge Error: {e}")
+            await asyncio.sleep(3600)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue": self.queue.stats(),
+            "workers": {kind: self.concurrency.get(kind, 1) for kind in self.handlers} if self._tasks else {},
+            "active": dict(self.active),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed
+        }
@@ -0,0 +1,311 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Request-scoped context. Tasks created while handling a request inherit it.
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="")
+mode_var: contextvars.ContextVar[str] = contextvars.ContextVar("mode", default="")
+_span_var: contextvars.ContextVar[str] = contextvars.ContextVar("span", default="")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """
+    A metric family with a fixed set of label names; children are keyed by label values.
+    Updates are guarded by a lock: metrics are also touched from worker threads.
+    """
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_child(key, value))
+        return lines
+
+    def _render_child(self, key, value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(key)
+            if child is None:
+                # Per-bucket (non-cumulative) counts, then count and sum
+                child = self._values[key] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            child[0][index] += 1
+            child[1] += 1
+            child[2] += value
+
+    def count(self, **labels) -> int:
+        child = self._values.get(self._key(labels))
+        return child[1] if child else 0
+
+    def _render_child(self, key, child) -> List[str]:
+        counts, total, value_sum = child
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_count{labels} {total}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(round(value_sum, 6))}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds metric families and renders them in the Prometheus text format (0.0.4).
+    Collectors are called at scrape time for values that live elsewhere (pool sizes etc.).
+    """
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics Collector Error: {e}")
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "echonative_stage_seconds", "Latency of a pipeline stage (decode, stt, llm, tts, pitch, score, db, ffmpeg)",
+    ["stage", "mode"]
+)
+stage_errors = registry.counter("echonative_stage_errors_total", "Pipeline stages that raised", ["stage", "mode"])
+stage_in_flight = registry.gauge("echonative_stage_in_flight", "Pipeline stages currently running", ["stage"])
+upstream_errors = registry.counter(
+    "echonative_upstream_errors_total", "Failed calls to external services (OpenAI, ElevenLabs)", ["service", "error"]
+)
+fallbacks = registry.counter(
+    "echonative_fallbacks_total", "Degraded answers served instead of an upstream result", ["service", "reason"]
+)
+http_seconds = registry.histogram(
+    "echonative_http_request_seconds", "Time to the end of the response", ["method", "route", "status"]
+)
+http_in_flight = registry.gauge("echonative_http_in_flight", "Requests currently being handled")
+shed = registry.counter("echonative_shed_total", "Requests rejected with 503 because a pool was saturated", ["pool"])
+pool_pending = registry.gauge("echonative_pool_pending", "Work waiting for or running in a pool", ["pool"])
+queue_depth = registry.gauge("echonative_queue_depth", "Queued background work", ["queue"])
+
+
+def record_upstream_error(service: str, error: BaseException):
+    upstream_errors.inc(service=service, error=type(error).__name__)
+
+
+def record_fallback(service: str, reason: str):
+    fallbacks.inc(service=service, reason=reason)
+
+
+class Tracer:
+    """
+    Optional structured trace spans (TRACE_SPANS=true): one JSON line per finished
+    stage with the request id, so a slow request can be taken apart in the logs.
+    """
+    def __init__(self, enabled: Optional[bool] = None, sink: Callable[[str], None] = print):
+        self.enabled = enabled if enabled is not None else os.getenv("TRACE_SPANS", "false").lower() == "true"
+        self.sink = sink
+
+    def emit(self, name: str, span_id: str, parent: str, started: float, duration: float, error: Optional[str], attrs: dict):
+        record = {
+            "trace": request_id_var.get() or None,
+            "span": span_id,
+            "parent": parent or None,
+            "name": name,
+            "start": round(started, 6),
+            "duration_ms": round(duration * 1000, 3),
+            "status": "error" if error else "ok",
+            **attrs
+        }
+        if error:
+            record["error"] = error
+        self.sink(json.dumps(record, ensure_ascii=False))
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def stage(name: str, mode: Optional[str] = None, **attrs) -> Iterator[None]:
+    """
+    Times a pipeline stage: records stage_seconds{stage, mode}, the in-flight gauge,
+    errors, and a trace span when tracing is on. mode defaults to the request's mode
+    (see bind_mode). Works around awaits: `with stage("stt"): await ...`.
+    """
+    mode = mode_var.get() if mode is None else mode
+    span_id = parent = ""
+    if tracer.enabled:
+        span_id, parent = uuid.uuid4().hex[:16], _span_var.get()
+        token = _span_var.set(span_id)
+    stage_in_flight.inc(stage=name)
+    wall, started = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        stage_errors.inc(stage=name, mode=mode)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        stage_in_flight.dec(stage=name)
+        stage_seconds.observe(duration, stage=name, mode=mode)
+        if span_id:
+            _span_var.reset(token)
+            tracer.emit(name, span_id, parent, wall, duration, error, {"mode": mode, **attrs} if mode else attrs)
+
+
+def bind_mode(mode: str):
+    """
+    Sets the mode label for stages recorded by the current request (and tasks it starts).
+    """
+    mode_var.set(mode)
+
+
+class RequestMetricsMiddleware:
+    """
+    ASGI middleware: assigns a request id (X-Request-ID, echoed back), tracks in-flight
+    requests and records latency per route template (not raw path, to bound cardinality).
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = ""
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        request_id_var.set(request_id)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        http_in_flight.inc()
+        # Stages of the request are children of its http span, whose id is the request id
+        token = _span_var.set(request_id)
+        wall, started = time.time(), time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            _span_var.reset(token)
+            http_in_flight.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            http_seconds.observe(duration, method=scope["method"], route=path, status=str(status["code"]))
+            if tracer.enabled:
+                tracer.emit("http", request_id, "", wall, duration, None, {
+                    "method": scope["method"], "route": path, "http_status": status["code"]
+                })
+
@@ -1,25 +1,52 @@
-from pydantic import BaseModel
-from typing import List, Optional, Any
+from pydantic import BaseModel, Field
+from typing import List, Optional, Any, Union
 
 class ProcessingRequest(BaseModel):
     user_id: str
     audio_data: str  # Base64 encoded or URL
     mode: str  # 'shadowing', 'completion', 'panic'
     context_text: Optional[str] = None
+    pitch_format: str = "points"  # 'points' | 'arrays' | 'f32'
+    score: bool = False  # also return an intonation score against the native reference
 
 class ProcessingResponse(BaseModel):
     original_text: str
     corrected_text: str
     explanation: Optional[str] = None
     audio_url: str
-    pitch_data: List[dict]
+    pitch_data: Union[List[dict], dict]
     diff: List[dict]
+    score: Optional[dict] = None
+    meta: Optional[dict] = None  # per-stage outcome: backend, failover, hedging (see CallPolicy)
+
+class ScoreRequest(BaseModel):
+    # Reference: a precomputed contour (id or target sentence) or an explicit contour
+    reference_id: Optional[str] = None
+    reference_text: Optional[str] = None
+    reference: Optional[Union[List[dict], dict]] = None
+    attempts: List[Union[List[dict], dict]]  # any pitch_data format
+
+class BatchItem(BaseModel):
+    audio_data: str  # Base64 encoded
+    mode: str  # 'shadowing', 'completion', 'panic'
+    context_text: Optional[str] = None
+    pitch_format: str = "points"
+    score: bool = False
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
 
 class MagicClipRequest(BaseModel):
     audio_data: str # User recording
     clip_filename: str # "godfather_demo.mp4"
     clip_text: str # "I'm gonna make him an offer..."
 
+class MagicClipJobRequest(BaseModel):
+    # The queued render only uses the cloned voice, so no recording is sent
+    clip_filename: str
+    clip_text: str
+    priority: int = Field(0, ge=0, le=9)  # higher runs first
+
 class MagicClipResponse(BaseModel):
     video_url: str
     audio_url: str
@@ -0,0 +1,192 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from app.core.executor import ExecutorBusy
+from app.core.governor import UpstreamBusy, remaining
+from app.core.metrics import record_fallback, registry
+
+# Per-request outcome metadata ({stage: {...}}), returned as "meta" by /process
+outcomes_var: contextvars.ContextVar[Optional[Dict[str, dict]]] = contextvars.ContextVar("outcomes", default=None)
+# The outcome record of the policy call in progress, so hedged() can flag it
+_record_var: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar("policy_record", default=None)
+
+hedges = registry.counter("echonative_hedges_total", "Duplicate upstream calls sent after the p95 latency", ["service", "backend"])
+failovers = registry.counter("echonative_failovers_total", "Calls answered by a later backend in the failover list", ["service", "backend"])
+
+# Share of the request's remaining budget a stage may use: STT leaves room for LLM and TTS
+STAGE_BUDGET_SHARES = {"stt": 0.3, "llm": 0.5, "tts": 1.0}
+HEDGE_MIN_SAMPLES = 20
+
+
+def begin_outcomes() -> Dict[str, dict]:
+    """
+    Starts collecting outcome metadata for the current request.
+    """
+    outcomes: Dict[str, dict] = {}
+    outcomes_var.set(outcomes)
+    return outcomes
+
+
+class LatencyTracker:
+    """
+    Recent successful call latencies for one backend (for its p95).
+    """
+    def __init__(self, window: int = 256):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return float(np.percentile(self.samples, 95))
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class CallPolicy:
+    """
+    How a service calls its backends, shared by STT, LLM and TTS:
+    - stage deadline: a share of what is left of the request budget (STAGE_BUDGET_SHARES),
+      capped by the service timeout; past it the call is shed (UpstreamBusy).
+    - hedging: an attempt still running after the backend's p95 gets a duplicate and the
+      first answer wins. At most HEDGE_MAX_RATIO of calls are hedged, so a slow provider
+      doesn't get double the load.
+    - failover: backends are tried in order; an error (or a shed) moves on to the next.
+    The outcome (backend, failed attempts, hedged, ms) goes into the request's metadata.
+    """
+    def __init__(self, service: str, timeout: float, no_hedge: Iterable[str] = ("local",)):
+        self.service = service
+        self.timeout = timeout
+        # Duplicating work on our own CPUs doesn't cut latency
+        self.no_hedge = set(no_hedge)
+        self.hedging = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+        self.hedge_max_ratio = float(os.getenv("HEDGE_MAX_RATIO", "0.1"))
+        self.hedge_min_delay = float(os.getenv("HEDGE_MIN_MS", "50")) / 1000
+        self.trackers: Dict[str, LatencyTracker] = {}
+
+    def stage_timeout(self) -> float:
+        left = remaining()
+        if left is None:
+            return self.timeout
+        return max(0.0, min(self.timeout, left * STAGE_BUDGET_SHARES.get(self.service, 1.0)))
+
+    def _tracker(self, backend: str) -> LatencyTracker:
+        if backend not in self.trackers:
+            self.trackers[backend] = LatencyTracker()
+        return self.trackers[backend]
+
+    async def run(self, backends: Sequence[str], call: Callable[[str], Awaitable[Any]], hedge: bool = True) -> Any:
+        """
+        Returns the first successful call(backend), trying backends in order.
+        hedge: hedge each attempt (callers that hedge at a lower layer pass False).
+        """
+        started = time.monotonic()
+        record = {"backend": None, "failed": [], "hedged": False}
+        try:
+            return await asyncio.wait_for(self._failover(backends, call, hedge, record), self.stage_timeout())
+        except asyncio.TimeoutError:
+            record["timed_out"] = True
+            raise UpstreamBusy(self.service, 1, "past its deadline")
+        finally:
+            record["ms"] = round((time.monotonic() - started) * 1000, 1)
+            outcomes = outcomes_var.get()
+            if outcomes is not None:
+                outcomes[self.service] = record
+
+    async def _failover(self, backends: Sequence[str], call, hedge: bool, record: dict) -> Any:
+        if not backends:
+            raise RuntimeError(f"no {self.service} backend available")
+        busy: Optional[ExecutorBusy] = None
+        error: Optional[Exception] = None
+        for i, backend in enumerate(backends):
+            token = _record_var.set(record)
+            try:
+                if hedge:
+                    result = await self.hedged(backend, lambda: call(backend))
+                else:
+                    result = await call(backend)
+            except Exception as e:
+                print(f"{self.service} backend '{backend}' failed: {e!r}")
+                record["failed"].append({"backend": backend, "error": type(e).__name__})
+                if i < len(backends) - 1:
+                    record_fallback(self.service, "failover")
+                if isinstance(e, ExecutorBusy):
+                    busy = busy or e
+                else:
+                    error = e
+                continue
+            finally:
+                _record_var.reset(token)
+            record["backend"] = backend
+            if i:
+                failovers.inc(service=self.service, backend=backend)
+            return result
+        # Everything shed: answer 503 rather than a degraded result
+        raise busy or error
+
+    def _hedge_delay(self, backend: str, tracker: LatencyTracker) -> Optional[float]:
+        if not self.hedging or backend in self.no_hedge:
+            return None
+        p95 = tracker.p95()
+        if p95 is None or tracker.hedges >= self.hedge_max_ratio * tracker.calls:
+            return None
+        return max(p95, self.hedge_min_delay)
+
+    async def hedged(self, backend: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        call() once, plus a duplicate if the first is still running after the backend's p95.
+        """
+        tracker = self._tracker(backend)
+        tracker.calls += 1
+        started = time.monotonic()
+        delay = self._hedge_delay(backend, tracker)
+        if delay is None:
+            result = await call()
+            tracker.samples.append(time.monotonic() - started)
+            return result
+
+        tasks: List[asyncio.Task] = [asyncio.ensure_future(call())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                tracker.hedges += 1
+                hedges.inc(service=self.service, backend=backend)
+                record = _record_var.get()
+                if record is not None:
+                    record["hedged"] = True
+                tasks.append(asyncio.ensure_future(call()))
+
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.cancelled():
+                        continue
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            tracker.hedge_wins += 1
+                        tracker.samples.append(time.monotonic() - started)
+                        return task.result()
+                    error = error or task.exception()
+            raise error or asyncio.CancelledError()
+        finally:
+            # The loser is no longer needed
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {backend: tracker.stats() for backend, tracker in self.trackers.items()}
@@ -1,7 +1,11 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from app.core.executor import ExecutorBusy
 
 # Secret key for JWT (Change this in production!)
 SECRET_KEY = "supersecretkeyshouldbechanged"
@@ -16,6 +20,30 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt is deliberately slow (~100-250 ms of CPU). It gets its own small pool so a burst
+# of logins can use at most AUTH_HASH_WORKERS cores and never occupies the threads that
+# serve sync endpoints; beyond AUTH_HASH_QUEUE_LIMIT waiting hashes, logins get a 503.
+hash_workers = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+hash_queue_limit = int(os.getenv("AUTH_HASH_QUEUE_LIMIT", "64"))
+_hash_pool = ThreadPoolExecutor(max_workers=hash_workers, thread_name_prefix="bcrypt")
+_hash_pending = 0
+
+async def _run_hash(fn, *args):
+    global _hash_pending
+    if _hash_pending >= hash_queue_limit:
+        raise ExecutorBusy("auth", retry_after=2)
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_pool, fn, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    return await _run_hash(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    return await _run_hash(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,60 @@
+import asyncio
+import fcntl
+import math
+import os
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
+
+
+def worker_count() -> int:
+    """
+    Number of server processes on this box (WEB_CONCURRENCY, set by scripts/serve.py
+    and gunicorn.conf.py). Box-wide limits are split between them.
+    """
+    return max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+
+
+def per_worker(total: float, minimum: int = 1) -> int:
+    """
+    This process's share of a box-wide (or account-wide) limit.
+    """
+    return max(math.ceil(total / worker_count()), minimum) if total else 0
+
+
+def shared_default(single: str, shared: str) -> str:
+    """
+    Default for settings that must be visible to every worker: `shared` when several run.
+    """
+    return shared if worker_count() > 1 else single
+
+
+@asynccontextmanager
+async def file_lock(path: str) -> AsyncIterator[None]:
+    """
+    Exclusive lock across processes (flock on `path`), e.g. so only one worker runs
+    startup ingest while the others wait and then find everything fresh.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def file_lock_sync(path: str) -> Iterator[None]:
+    """
+    Blocking variant of file_lock, for code already running in a thread.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
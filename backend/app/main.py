@@ -1,19 +1,78 @@
-from fastapi import FastAPI, Depends, HTTPException
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from app.core.models import ProcessingRequest, ProcessingResponse, MagicClipRequest, MagicClipResponse
 from app.services.engine import VoiceProcessor
-from app.core.database import create_db_and_tables, get_session
-from app.api import auth
-from app.models.user import User
-from sqlmodel import Session
-from datetime import datetime, date
+from app.services.batch import BatchManager
+from app.services.streaks import StreakUpdater
+from app.core.audio import media_type_of, read_audio_upload
+from app.core.database import create_db_and_tables
+from app.core.executor import ExecutorBusy, executor
+from app.core.http import clients
+from app.core.jobs import JobQueue, JobWorkers
+from app.core import metrics
+from app.core.governor import DeadlineMiddleware, governors
+from app.core.workers import per_worker
+from app.api import artifacts, auth, batch, jobs, pitch, reference, voice
+from app.models.user import UserPrincipal
+from urllib.parse import quote
+import json
 import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = FastAPI(title="EchoNative Backend", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_db_and_tables()
+    executor.start()
+    if not processor.mock_mode:
+        # Load and warm the local STT/TTS models (if any mode uses them) before taking traffic
+        await processor.stt_service.start()
+        await processor.tts_service.start()
+    # Magic Clip ingest: trim old renders periodically, pre-demux clip templates in the background
+    await asyncio.to_thread(processor.video_service.evict_outputs)
+    outputs_task = asyncio.create_task(processor.video_service.run_eviction())
+    # Generated audio served from /artifacts: collect expired files periodically
+    artifacts_task = asyncio.create_task(processor.artifacts.run_gc())
+    templates_task = asyncio.create_task(processor.video_service.prepare_templates())
+    # Reference contours for new/changed clips (sentences are built by scripts/build_reference_contours.py)
+    references_task = asyncio.create_task(processor.reference_builder.build_clips())
+    job_workers.start()
+    streaks.start()
+    yield
+    await job_workers.stop()
+    # Write out counters recorded since the last flush
+    await streaks.stop()
+    templates_task.cancel()
+    references_task.cancel()
+    artifacts_task.cancel()
+    outputs_task.cancel()
+    await batch_manager.shutdown()
+    await processor.stt_service.shutdown()
+    await processor.tts_service.shutdown()
+    # Close pooled upstream connections
+    await clients.aclose()
+    await executor.shutdown()
+
+app = FastAPI(title="EchoNative Backend", version="0.1.0", lifespan=lifespan)
+# Request ids, in-flight gauge and per-route latency for every request
+app.add_middleware(metrics.RequestMetricsMiddleware)
+# Latency budget per request: upstream queueing is shed (503) instead of blowing past it
+app.add_middleware(DeadlineMiddleware)
+
+@app.exception_handler(ExecutorBusy)
+async def executor_busy_handler(request, exc: ExecutorBusy):
+    # Shed load instead of queueing unbounded CPU/ffmpeg work
+    metrics.shed.inc(pool=exc.pool)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 # Mount Static Files (for Clips)
 # Ensure the directory exists
@@ -22,32 +81,87 @@ app.mount("/static", StaticFiles(directory="backend/static"), name="static")
 
 # Include Auth Router
 app.include_router(auth.router)
+app.include_router(voice.router)
+app.include_router(reference.router)
+app.include_router(pitch.router)
+app.include_router(batch.router)
+app.include_router(jobs.router)
+app.include_router(artifacts.router)
 
 # Determine mode from env
 mock_mode_env = os.getenv("MOCK_MODE", "true").lower() == "true"
 print(f"Starting VoiceProcessor with mock_mode={mock_mode_env}")
 
 processor = VoiceProcessor(mock_mode=mock_mode_env)
-
-@app.on_event("startup")
-def on_startup():
-    create_db_and_tables()
+app.state.processor = processor
+batch_manager = BatchManager(processor)
+app.state.batch_manager = batch_manager
+# Magic Clip render queue. MAGIC_CLIP_WORKERS=0 leaves rendering to scripts/run_job_workers.py
+job_queue = JobQueue()
+job_workers = JobWorkers(
+    job_queue,
+    {"magic_clip": processor.run_magic_clip_job},
+    concurrency={"magic_clip": int(os.getenv("MAGIC_CLIP_WORKERS", str(per_worker(2))))}
+)
+app.state.job_queue = job_queue
+app.state.job_workers = job_workers
+# Streak counters are written behind the request, coalesced per user
+streaks = StreakUpdater()
+app.state.streaks = streaks
 
 @app.get("/")
 def read_root():
     return {"status": "ok", "service": "EchoNative API", "mock_mode": mock_mode_env}
 
+@app.get("/stats")
+def get_stats():
+    """
+    Returns runtime counters (cache hit rates etc.) for operations.
+    """
+    return {
+        **processor.stats(),
+        "batch": batch_manager.stats(), "jobs": job_workers.stats(),
+        "streaks": streaks.stats(),
+        "auth": auth.principal_cache.stats(),
+        "upstream": governors.stats()
+    }
+
+def collect_runtime_gauges():
+    executor_stats = executor.stats()
+    metrics.pool_pending.set(executor_stats["cpu"]["pending"], pool="cpu")
+    metrics.pool_pending.set(executor_stats["ffmpeg"]["pending"], pool="ffmpeg")
+    metrics.queue_depth.set(batch_manager.stats()["items_pending"], queue="batch_items")
+    metrics.queue_depth.set(streaks.stats()["pending_users"], queue="streak_users")
+    metrics.queue_depth.set(job_queue.stats()["queued"], queue="magic_clip_jobs")
+    for name, governor in governors.stats().items():
+        metrics.pool_pending.set(governor["active"] + governor["queued"], pool=name)
+        metrics.queue_depth.set(governor["queued"], queue=name)
+
+metrics.registry.add_collector(collect_runtime_gauges)
+
+@app.get("/metrics")
+def get_metrics():
+    """
+    Prometheus scrape endpoint: per-stage latency histograms (by mode), upstream errors,
+    fallbacks, load shedding and in-flight gauges.
+    """
+    return Response(content=metrics.registry.render(), media_type=metrics.registry.content_type)
+
 @app.get("/clips")
 def get_clips():
     """
     Returns list of available video clips for Magic Clip mode.
     """
-    return processor.video_service.get_clips()
+    store = processor.reference_store
+    return [
+        {**clip, "reference_url": f"/reference/{clip['id']}" if clip['id'] in store else None}
+        for clip in processor.video_service.get_clips()
+    ]
 
 @app.post("/magic-clip", response_model=MagicClipResponse)
 async def process_magic_clip(
     request: MagicClipRequest,
-    current_user: User = Depends(auth.get_current_user)
+    current_user: UserPrincipal = Depends(auth.get_current_principal)
 ):
     """
     Process Magic Clip: Swap user voice into video template.
@@ -55,17 +169,55 @@ async def process_magic_clip(
     result = await processor.process_magic_clip(
         request.audio_data,
         request.clip_text,
-        request.clip_filename
+        request.clip_filename,
+        voice_id=await processor.voice_registry.get_voice_id(current_user.id)
     )
     if "error" in result:
         raise HTTPException(status_code=500, detail=result["error"])
     return result
 
+@app.post("/magic-clip/upload", response_model=MagicClipResponse)
+async def process_magic_clip_upload(
+    request: Request,
+    current_user: UserPrincipal = Depends(auth.get_current_principal)
+):
+    """
+    Binary variant of /magic-clip: multipart field "audio" or a raw audio body.
+    Parameters: clip_filename, clip_text, response_format ('json' | 'audio').
+    """
+    audio, params = await read_audio_upload(request)
+    if "clip_filename" not in params or "clip_text" not in params:
+        raise HTTPException(status_code=422, detail="clip_filename and clip_text are required")
+
+    response_format = params.get("response_format", "json")
+    result = await processor.process_magic_clip(
+        audio,
+        params["clip_text"],
+        params["clip_filename"],
+        store_audio=response_format != "audio",
+        voice_id=await processor.voice_registry.get_voice_id(current_user.id)
+    )
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+    if response_format == "audio":
+        return audio_response(result, ["video_url", "corrected_text"])
+    return result
+
+def audio_response(result: dict, header_fields: list) -> Response:
+    """
+    Returns the generated audio (MP3, or WAV from local TTS) as the response body; text fields travel as (URL-encoded) headers.
+    """
+    headers = {
+        f"X-{field.replace('_', '-').title()}": quote(str(result.get(field) or ""))
+        for field in header_fields
+    }
+    audio = bytes(result.get("audio_bytes") or b"")
+    return Response(content=audio, media_type=media_type_of(audio), headers=headers)
+
 @app.post("/process", response_model=ProcessingResponse)
 async def process_voice(
     request: ProcessingRequest, 
-    current_user: User = Depends(auth.get_current_user),
-    session: Session = Depends(get_session)
+    current_user: UserPrincipal = Depends(auth.get_current_principal)
 ):
     """
     Process user voice: STT -> LLM Fix -> TTS Clone
@@ -74,38 +226,97 @@ async def process_voice(
     result = await processor.process_audio(
         request.audio_data, 
         request.mode, 
-        request.context_text
+        request.context_text,
+        request.pitch_format,
+        voice_id=await processor.voice_registry.get_voice_id(current_user.id),
+        score=request.score
+    )
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
+
+    streaks.record(current_user.id)
+
+    return result
+
+@app.post("/process/upload", response_model=ProcessingResponse)
+async def process_voice_upload(
+    request: Request,
+    current_user: UserPrincipal = Depends(auth.get_current_principal)
+):
+    """
+    Binary variant of /process: multipart field "audio" or a raw audio body (no base64).
+    Parameters: mode, context_text, pitch_format, score ('true' | 'false'), response_format ('json' | 'audio').
+    With response_format=audio the body is the MP3 and the texts are returned as headers.
+    """
+    audio, params = await read_audio_upload(request)
+    if "mode" not in params:
+        raise HTTPException(status_code=422, detail="mode is required")
+
+    response_format = params.get("response_format", "json")
+    result = await processor.process_audio(
+        audio,
+        params["mode"],
+        params.get("context_text", ""),
+        params.get("pitch_format", "points"),
+        store_audio=response_format != "audio",
+        voice_id=await processor.voice_registry.get_voice_id(current_user.id),
+        score=params.get("score", "false").lower() == "true"
     )
-    
-    # --- Streak Logic ---
-    today = datetime.now().date()
-    
-    # 1. Update daily count
-    if current_user.last_active_date and current_user.last_active_date.date() == today:
-        current_user.daily_process_count += 1
-    else:
-        # New day, reset daily count
-        current_user.daily_process_count = 1
-        
-        # Check if yesterday was active to maintain streak
-        # Better logic: if diff is 1 day
-        if current_user.last_active_date:
-            delta = today - current_user.last_active_date.date()
-            if delta.days == 1:
-                # Streak continues
-                pass
-            elif delta.days > 1:
-                # Streak broken
-                current_user.streak_count = 0
-    
-    current_user.last_active_date = datetime.now()
-    
-    # 2. Check if streak target (3 sentences) met today
-    if current_user.daily_process_count == 3:
-        current_user.streak_count += 1
-
-    session.add(current_user)
-    session.commit()
-    # ---------------------
+    if "error" in result:
+        raise HTTPException(status_code=500, detail=result["error"])
 
+    streaks.record(current_user.id)
+
+    if response_format == "audio":
+        return audio_response(result, ["original_text", "corrected_text", "explanation"])
     return result
+
+@app.post("/process/stream")
+async def process_voice_stream(
+    request: ProcessingRequest,
+    current_user: UserPrincipal = Depends(auth.get_current_principal)
+):
+    """
+    Streaming variant of /process (Server-Sent Events).
+    Events: transcript, token, audio, pitch, done (or error).
+    """
+    voice_id = await processor.voice_registry.get_voice_id(current_user.id)
+
+    events = processor.stream_audio(
+        request.audio_data,
+        request.mode,
+        request.context_text,
+        request.pitch_format,
+        voice_id
+    )
+    # Run STT before committing to a 200: if it is shed, the client gets a plain 503
+    first = await events.__anext__()
+    # Like /process/upload: a failed transcription doesn't count towards the streak
+    if first["event"] != "error":
+        streaks.record(current_user.id)
+
+    async def event_stream():
+        event = first
+        try:
+            while True:
+                yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            pass
+        except ExecutorBusy as e:
+            # Headers are already sent: report the shed stage in-band
+            metrics.shed.inc(pool=e.pool)
+            data = {"error": str(e), "retry_after": e.retry_after}
+            yield f"event: error\ndata: {json.dumps(data)}\n\n"
+        except Exception as e:
+            # Any other stage failure: end the stream with an error instead of silently
+            print(f"Stream Error: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Processing failed'})}\n\n"
+        finally:
+            await events.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
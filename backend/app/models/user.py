@@ -14,6 +14,14 @@ class UserCreate(SQLModel):
     username: str
     password: str
 
+class UserPrincipal(SQLModel):
+    """
+    Identity of an authenticated request (cached, no DB row). Endpoints that need
+    user columns (streaks etc.) depend on get_current_user instead.
+    """
+    id: int
+    username: str
+
 class UserRead(SQLModel):
     id: int
     username: str
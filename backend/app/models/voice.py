@@ -0,0 +1,25 @@
+from sqlmodel import Field, SQLModel
+from typing import Optional
+from datetime import datetime
+
+class VoiceProfile(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True, unique=True)
+    provider: str = Field(default="elevenlabs")
+    provider_voice_id: Optional[str] = Field(default=None) # Set once cloning succeeded
+    status: str = Field(default="pending") # 'pending' | 'ready' | 'failed'
+    sample_count: int = Field(default=0)
+    sample_bytes: int = Field(default=0)
+    sample_seconds: float = Field(default=0.0)
+    error: Optional[str] = Field(default=None)
+    created_at: datetime = Field(default_factory=datetime.now)
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+class VoiceProfileRead(SQLModel):
+    provider: str
+    provider_voice_id: Optional[str]
+    status: str
+    sample_count: int
+    sample_seconds: float
+    error: Optional[str]
+    updated_at: datetime
@@ -0,0 +1,181 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Optional
+from app.core.executor import ExecutorBusy
+from app.core.governor import set_deadline
+
+
+class BatchJob:
+    """
+    A set of utterances processed together (e.g. a lesson recording split into takes).
+    Items finish in any order; `order` records completion order for event replay.
+    """
+    def __init__(self, user_id: int, items: List[dict], voice_id: Optional[str]):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.voice_id = voice_id
+        self.items: List[Optional[dict]] = items
+        self.total = len(items)
+        self.results: List[Optional[dict]] = [None] * self.total
+        self.order: List[int] = []
+        self.failed = 0
+        self.status = "queued"  # queued | running | done | cancelled
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled")
+
+    def progress(self, include_results: bool = False) -> dict:
+        progress = {
+            "job_id": self.id,
+            "status": self.status,
+            "total": self.total,
+            "completed": len(self.order),
+            "failed": self.failed,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+        if include_results:
+            progress["results"] = self.results
+        return progress
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def complete_item(self, index: int, result: dict):
+        self.results[index] = result
+        self.items[index] = None  # drop the audio as soon as it's processed
+        if "error" in result:
+            self.failed += 1
+        self.order.append(index)
+        await self._notify()
+
+    async def finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+        await self._notify()
+
+    async def events(self) -> AsyncIterator[dict]:
+        """
+        Yields {"event": "item", "data": {"index", "result"}} for every finished item
+        (already finished ones first), then {"event": "done", "data": progress}.
+        """
+        cursor = 0
+        while True:
+            while cursor < len(self.order):
+                index = self.order[cursor]
+                cursor += 1
+                yield {"event": "item", "data": {"index": index, "result": self.results[index]}}
+            if self.finished:
+                yield {"event": "done", "data": self.progress()}
+                return
+            async with self._changed:
+                await self._changed.wait_for(lambda: cursor < len(self.order) or self.finished)
+
+
+class BatchManager:
+    """
+    Runs batch jobs in the background through VoiceProcessor.
+    - At most `concurrency` items are processed at once across all jobs.
+    - Items use batched LLM corrections (see LLMService.correct_grammar), so
+      corrections finishing STT together share upstream calls.
+    - Identical target texts share TTS work through the TTS cache's single-flight.
+    Jobs are kept in memory for `retention` seconds after they finish.
+    """
+    def __init__(
+        self,
+        processor,
+        concurrency: Optional[int] = None,
+        max_items: Optional[int] = None,
+        max_jobs: Optional[int] = None,
+        retention: Optional[float] = None
+    ):
+        self.processor = processor
+        self.concurrency = concurrency or int(os.getenv("BATCH_CONCURRENCY", "4"))
+        self.max_items = max_items or int(os.getenv("BATCH_MAX_ITEMS", "200"))
+        self.max_jobs = max_jobs or int(os.getenv("BATCH_MAX_JOBS", "20"))
+        self.retention = retention if retention is not None else float(os.getenv("BATCH_RETENTION_SECONDS", "3600"))
+        self.jobs: Dict[str, BatchJob] = {}
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self.items_processed = 0
+
+    def submit(self, user_id: int, items: List[dict], voice_id: Optional[str] = None) -> BatchJob:
+        """
+        items: [{"audio": AudioInput, "mode", "context_text", "pitch_format", "score"}, ...]
+        Raises ValueError for an empty/oversized batch and ExecutorBusy when too many jobs are running.
+        """
+        if not items or len(items) > self.max_items:
+            raise ValueError(f"A batch needs between 1 and {self.max_items} items")
+        self._prune()
+        if sum(not job.finished for job in self.jobs.values()) >= self.max_jobs:
+            raise ExecutorBusy("batch", retry_after=30)
+
+        job = BatchJob(user_id, items, voice_id)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str, user_id: int) -> Optional[BatchJob]:
+        job = self.jobs.get(job_id)
+        # Other users' jobs are indistinguishable from missing ones
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j.id for j in self.jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self.jobs[job_id]
+
+    async def _run(self, job: BatchJob):
+        job.status = "running"
+        # Not interactive: items wait for upstream capacity instead of inheriting the request's deadline
+        set_deadline(None)
+        try:
+            await asyncio.gather(*[self._run_item(job, index) for index in range(job.total)])
+        except asyncio.CancelledError:
+            await job.finish("cancelled")
+            raise
+        await job.finish("done")
+
+    async def _run_item(self, job: BatchJob, index: int):
+        item = job.items[index]
+        async with self._slots:
+            try:
+                result = await self.processor.process_audio(
+                    item["audio"],
+                    item["mode"],
+                    item.get("context_text") or "",
+                    item.get("pitch_format", "points"),
+                    voice_id=job.voice_id,
+                    score=item.get("score", False),
+                    batched=True
+                )
+            except Exception as e:
+                print(f"Batch Error ({job.id}#{index}): {e}")
+                result = {"error": str(e) or type(e).__name__}
+        self.items_processed += 1
+        await job.complete_item(index, result)
+
+    async def shutdown(self):
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        running = [job for job in self.jobs.values() if not job.finished]
+        return {
+            "jobs": len(self.jobs),
+            "running": len(running),
+            "items_pending": sum(job.total - len(job.order) for job in running),
+            "items_processed": self.items_processed,
+            "concurrency": self.concurrency
+        }
@@ -1,10 +1,60 @@
-from typing import Dict
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
 import base64
-from app.services.pitch import PitchService
-from app.services.llm import LLMService
+import os
+import re
+import time
+from app.core.artifacts import ArtifactStore, LocalArtifactStore
+from app.core.audio import AudioInput, as_audio_bytes, finalize_wav, media_type_of, to_data_url, wav_header
+from app.core.executor import ExecutorBusy, executor
+from app.core.http import clients
+from app.core.metrics import bind_mode, record_fallback, stage
+from app.core.policy import begin_outcomes
+from app.services.pitch import PitchCache, PitchService
+from app.services.llm import LLMService, normalize_text, word_diff
+from app.services.reference import ReferenceBuilder, ReferenceStore
+from app.services.scoring import ScoringService
 from app.services.stt import SpeechToTextService
 from app.services.tts import TextToSpeechService
 from app.services.video import VideoService
+from app.services.voice import DEFAULT_VOICE_ID, VoiceRegistry
+
+# A sentence ends at terminal punctuation (optionally followed by a closing quote/bracket)
+# and whitespace. CJK punctuation needs no trailing space.
+SENTENCE_END = re.compile(r'(?<=[.!?])["\')\]]?\s+|(?<=[。！？])')
+
+
+def split_sentences(buffer: str) -> Tuple[List[str], str]:
+    """
+    Splits streamed text into complete sentences and the unfinished remainder.
+    """
+    parts = SENTENCE_END.split(buffer)
+    remainder = parts.pop()
+    return [p.strip() for p in parts if p.strip()], remainder
+
+
+class SpeculationMetrics:
+    """
+    Outcome of speculative TTS (synthesizing the expected text before the LLM answers).
+    saved_ms: how much earlier the audio was ready than a TTS call started after the LLM.
+    """
+    def __init__(self):
+        self.started = 0
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms_total = 0.0
+
+    def snapshot(self) -> Dict:
+        decided = self.hits + self.misses
+        return {
+            "started": self.started,
+            "hits": self.hits,
+            "misses": self.misses,
+            "mismatch_rate": round(self.misses / decided, 4) if decided else 0.0,
+            "saved_ms_total": round(self.saved_ms_total, 1),
+            "saved_ms_avg": round(self.saved_ms_total / self.hits, 1) if self.hits else 0.0
+        }
+
 
 class VoiceProcessor:
     """
@@ -15,16 +65,145 @@ class VoiceProcessor:
     def __init__(self, mock_mode=True):
         self.mock_mode = mock_mode
         self.pitch_service = PitchService()
+        self.pitch_cache = PitchCache()
+        self.scoring_service = ScoringService()
         self.llm_service = LLMService()
         self.stt_service = SpeechToTextService()
         self.tts_service = TextToSpeechService()
         self.video_service = VideoService()
+        # Generated audio is returned as a signed URL, not embedded in the response
+        self.artifacts: ArtifactStore = LocalArtifactStore.from_env()
+        self.voice_registry = VoiceRegistry(self.tts_service)
+        # Shadowing: start TTS for context_text while STT/LLM run
+        self.speculative_tts = os.getenv("SPECULATIVE_TTS", "true").lower() == "true"
+        self.speculation = SpeculationMetrics()
+        self.reference_store = ReferenceStore()
+        self.reference_builder = ReferenceBuilder(
+            self.reference_store, self.pitch_service, self.tts_service, self.video_service
+        )
+
+    def stats(self) -> Dict:
+        """
+        Runtime counters for the shared services (caches, pools, ...).
+        """
+        return {
+            "tts_cache": self.tts_service.cache.stats(),
+            "llm_cache": self.llm_service.cache.stats(),
+            "pitch_cache": self.pitch_cache.stats(),
+            "llm_batches": self.llm_service.batcher.stats(),
+            "llm_policy": {"models": self.llm_service.models, "backends": self.llm_service.policy.stats()},
+            "tts": self.tts_service.stats(),
+            "stt": self.stt_service.stats(),
+            "speculative_tts": self.speculation.snapshot(),
+            "video": self.video_service.stats(),
+            "artifacts": self.artifacts.stats(),
+            "reference": self.reference_store.stats(),
+            "http": clients.stats(),
+            "executor": executor.stats()
+        }
 
-    async def process_audio(self, audio_data: str, mode: str, context: str = "") -> Dict:
+    async def process_audio(
+        self,
+        audio_data: AudioInput,
+        mode: str,
+        context: str = "",
+        pitch_format: str = "points",
+        store_audio: bool = True,
+        voice_id: Optional[str] = None,
+        score: bool = False,
+        batched: bool = False
+    ) -> Dict:
         """
         Main entry point for processing user voice.
+        audio_data: base64 string (JSON API) or raw bytes/memoryview (upload API)
         mode: 'shadowing' | 'completion' | 'panic'
+        pitch_format: 'points' | 'arrays' | 'f32' (see PitchService.extract_pitch)
+        store_audio: store the audio and return a signed URL to it; otherwise return it as 'audio_bytes'
+        voice_id: the user's cloned voice (see VoiceRegistry)
+        score: also score the user's intonation against the native reference ('score' key)
+        batched: share LLM calls with other batched requests (see BatchManager)
+        The result's 'meta' has each stage's outcome: backend used, failed attempts, hedging, ms.
         """
+        bind_mode(mode)
+        outcomes = begin_outcomes()
+        attempt_task = None
+        speculative_tts = None
+        if score and not self.mock_mode:
+            # The user's own contour is analyzed while STT/LLM/TTS run
+            attempt_task = self._background(self._timed_cpu(
+                "pitch", self.pitch_service.extract_contour, bytes(as_audio_bytes(audio_data))
+            ))
+        if mode == 'shadowing' and context and self.speculative_tts and not self.mock_mode:
+            # The user is repeating context: its audio is almost always the answer
+            speculative_tts = self._background(self._speculate(context, voice_id or DEFAULT_VOICE_ID))
+            self.speculation.started += 1
+        try:
+            result = await self._process_audio(
+                audio_data, mode, context, pitch_format, store_audio, voice_id, attempt_task, speculative_tts, batched
+            )
+            result["meta"] = outcomes
+            return result
+        finally:
+            for task in (attempt_task, speculative_tts):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    @staticmethod
+    async def _timed_cpu(name: str, fn, *args):
+        with stage(name):
+            return await executor.run_cpu(name, fn, *args)
+
+    @staticmethod
+    def _background(coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        # Unused on early returns: don't log "exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _speculate(self, text: str, voice_id: str) -> Tuple[bytes, float, float]:
+        """
+        Returns (audio, TTS duration, completion time).
+        """
+        started_at = time.perf_counter()
+        audio = await self.tts_service.generate_audio(text, voice_id)
+        done_at = time.perf_counter()
+        return audio, done_at - started_at, done_at
+
+    async def _resolve_speculation(self, speculative_tts: asyncio.Task, context: str, target_text: str) -> bytes:
+        """
+        Returns the speculative audio if the final text matches what was synthesized
+        (ignoring case/punctuation, like the LLM cache); otherwise cancels it and returns b"".
+        """
+        if normalize_text(target_text) != normalize_text(context):
+            speculative_tts.cancel()
+            self.speculation.misses += 1
+            return b""
+
+        needed_at = time.perf_counter()
+        try:
+            audio, duration, done_at = await speculative_tts
+        except ExecutorBusy:
+            # Speculation was shed; the regular TTS call gets its own chance
+            self.speculation.misses += 1
+            return b""
+        self.speculation.hits += 1
+        if audio:
+            # Without speculation the same call would have started at needed_at
+            self.speculation.saved_ms_total += (needed_at + duration - max(needed_at, done_at)) * 1000
+        return audio
+
+    async def _process_audio(
+        self,
+        audio_data: AudioInput,
+        mode: str,
+        context: str,
+        pitch_format: str,
+        store_audio: bool,
+        voice_id: Optional[str],
+        attempt_task: Optional[asyncio.Task],
+        speculative_tts: Optional[asyncio.Task],
+        batched: bool
+    ) -> Dict:
         # 1. STT: Audio -> Text
         if self.mock_mode:
             if mode == 'panic':
@@ -60,28 +239,35 @@ class VoiceProcessor:
                 target_text = correction['corrected']
                 explanation = correction['explanation']
             else:
-                correction = await self.llm_service.correct_grammar(transcript, context)
+                correction = await self.llm_service.correct_grammar(transcript, context, batched=batched)
                 target_text = correction.get('corrected', transcript)
                 explanation = correction.get('explanation', '')
 
         # 3. TTS: Voice Cloning (Text -> Audio)
-        # TODO: In a real app, we retrieve the user's voice_id from DB based on user_id
-        user_voice_id = "21m00Tcm4TlvDq8ikWAM" # Example ID (Rachel)
+        user_voice_id = voice_id or DEFAULT_VOICE_ID
         
+        audio_bytes = b""
+        score_result = None
         if self.mock_mode:
             audio_url = "https://cdn.echonative.app/audio/demo_123.mp3"
             pitch_result = {"data": [{"t": 0.1, "f": 120}, {"t": 0.2, "f": 125}]}
         else:
-            audio_bytes = await self.tts_service.generate_audio(target_text, user_voice_id)
-            if audio_bytes:
-                b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                audio_url = f"data:audio/mpeg;base64,{b64_audio}"
-                pitch_result = self.pitch_service.extract_pitch(b64_audio)
+            if speculative_tts is not None:
+                audio_bytes = await self._resolve_speculation(speculative_tts, context, target_text)
+            if not audio_bytes:
+                audio_bytes = await self.tts_service.generate_audio(target_text, user_voice_id)
+            if audio_bytes and attempt_task is not None:
+                pitch_result, score_result = await self._pitch_and_score(target_text, audio_bytes, pitch_format, attempt_task)
+                audio_url = await self._audio_url(audio_bytes) if store_audio else ""
+            elif audio_bytes:
+                audio_url = await self._audio_url(audio_bytes) if store_audio else ""
+                # Praat is CPU-bound: run it in the process pool, not on the event loop
+                pitch_result = await self._pitch(audio_bytes, pitch_format)
             else:
                 audio_url = ""
                 pitch_result = {"data": []}
 
-        return {
+        result = {
             "original_text": transcript,
             "corrected_text": target_text,
             "explanation": explanation,
@@ -89,12 +275,88 @@ class VoiceProcessor:
             "pitch_data": pitch_result.get('data', []),
             "diff": correction.get('diff', [])
         }
+        if attempt_task is not None:
+            result["score"] = score_result
+        if not store_audio:
+            result["audio_bytes"] = audio_bytes
+        return result
+
+    async def _pitch(self, audio_bytes: bytes, pitch_format: str) -> Dict:
+        """
+        extract_pitch in the process pool, unless this audio was analyzed before
+        (by any worker when the cache is shared). Errors are not cached.
+        """
+        key = PitchCache.make_key(audio_bytes, pitch_format)
+        cached = await self.pitch_cache.get(key)
+        if cached is not None:
+            return cached
+        result = await self._timed_cpu("pitch", self.pitch_service.extract_pitch, audio_bytes, pitch_format)
+        if result.get("status") == "success":
+            await self.pitch_cache.set(key, result)
+        return result
+
+    async def _audio_url(self, audio_bytes: bytes) -> str:
+        """
+        Writes the audio to the artifact store and returns a signed URL for it.
+        Inlined as a data URL if the store can't take it (e.g. disk full).
+        """
+        try:
+            key = await asyncio.to_thread(self.artifacts.put, audio_bytes)
+            return self.artifacts.url(key)
+        except Exception as e:
+            print(f"Artifact Store Error: {e}")
+            record_fallback("artifacts", "inline_audio")
+            return to_data_url(audio_bytes)
+
+    async def _pitch_and_score(
+        self,
+        target_text: str,
+        audio_bytes: bytes,
+        pitch_format: str,
+        attempt_task: asyncio.Task
+    ) -> Tuple[Dict, Optional[Dict]]:
+        """
+        Pitch of the TTS audio (for display) plus the user's intonation score.
+        A precomputed native contour for the sentence is preferred as the reference.
+        """
+        try:
+            times, frequencies = await self._timed_cpu("pitch", self.pitch_service.extract_contour, audio_bytes)
+            pitch_result = {"data": self.pitch_service.format_contour(times, frequencies, pitch_format)}
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            return {"status": "error", "message": str(e)}, None
+
+        stored = await asyncio.to_thread(self.reference_store.find_text, target_text)
+        reference = (stored[1][0], stored[1][1]) if stored is not None else (times, frequencies)
+        try:
+            attempt = await attempt_task
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            # e.g. a container soundfile can't decode; the rest of the response is still useful
+            print(f"Scoring Error: {e}")
+            return pitch_result, None
 
-    async def process_magic_clip(self, audio_data: str, clip_text: str, clip_filename: str) -> Dict:
+        # Pure numpy and a few ms: cheaper inline than a trip to the process pool
+        with stage("score"):
+            scored = self.scoring_service.score(reference, attempt)
+        return pitch_result, scored.get("data")
+
+    async def process_magic_clip(
+        self,
+        audio_data: AudioInput,
+        clip_text: str,
+        clip_filename: str,
+        store_audio: bool = True,
+        voice_id: Optional[str] = None
+    ) -> Dict:
         """
         Special pipeline for Magic Clip:
         Audio -> (STT Optional) -> TTS (Perfect Clone) -> Video Swap
+        store_audio: store the audio and return a signed URL to it; otherwise return it as 'audio_bytes'
         """
+        bind_mode("magic_clip")
         # 1. We assume the user wants to say the 'clip_text'. 
         # We can skip STT/Correction if we trust the text, OR we can run STT to see if they were close.
         # For MVP, let's just assume the target text is the clip_text.
@@ -102,8 +364,9 @@ class VoiceProcessor:
         target_text = clip_text
         
         # 2. TTS: Generate perfect audio with user's voice
-        user_voice_id = "21m00Tcm4TlvDq8ikWAM" # Example ID
+        user_voice_id = voice_id or DEFAULT_VOICE_ID
         
+        audio_bytes = b""
         if self.mock_mode:
             # Return dummy video url
             video_url = "/static/clips/godfather_demo.mp4" # Just return original for mock
@@ -114,20 +377,191 @@ class VoiceProcessor:
             if not audio_bytes:
                 return {"error": "TTS failed"}
             
-            b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-            
             # Swap Audio in Video
             try:
-                video_url = await self.video_service.swap_audio(clip_filename, b64_audio)
+                video_url = await self.video_service.swap_audio(clip_filename, audio_bytes)
+            except ExecutorBusy:
+                raise
             except Exception as e:
                 print(f"Video Swap Error: {e}")
                 return {"error": "Video processing failed"}
 
-            audio_url = f"data:audio/mpeg;base64,{b64_audio}"
+            audio_url = await self._audio_url(audio_bytes) if store_audio else ""
 
-        return {
+        result = {
             "video_url": video_url,
             "audio_url": audio_url,
             "original_text": "User Audio", 
             "corrected_text": target_text
         }
+        if not store_audio:
+            result["audio_bytes"] = audio_bytes
+        return result
+
+    async def run_magic_clip_job(self, payload: Dict) -> Dict:
+        """
+        Job handler for queued Magic Clip renders (see JobWorkers).
+        Raises on failure so the queue can retry. The audio is already muxed into
+        the video, so it isn't stored in the job result.
+        """
+        result = await self.process_magic_clip(
+            "",  # the user's recording isn't used by the render
+            payload["clip_text"],
+            payload["clip_filename"],
+            store_audio=False,
+            voice_id=payload.get("voice_id")
+        )
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return {"video_url": result["video_url"], "corrected_text": result["corrected_text"]}
+
+    async def stream_audio(
+        self,
+        audio_data: AudioInput,
+        mode: str,
+        context: str = "",
+        pitch_format: str = "points",
+        voice_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Streaming variant of process_audio. Yields events as soon as each stage produces output:
+        transcript -> token* -> (audio, pitch)* -> done
+
+        TTS starts on the first complete sentence while the LLM is still streaming,
+        so time-to-first-audio does not depend on the length of the utterance.
+        """
+        bind_mode(mode)
+        outcomes = begin_outcomes()
+        # 1. STT: Audio -> Text
+        if self.mock_mode:
+            transcript = "我要一杯拿铁，加燕麦奶。" if mode == 'panic' else "I am think about quit my job."
+        else:
+            transcript = await self.stt_service.transcribe(audio_data)
+            if not transcript:
+                yield {"event": "error", "data": {"error": "STT failed"}}
+                return
+
+        yield {"event": "transcript", "data": {"text": transcript}}
+
+        if self.mock_mode:
+            async for event in self._stream_mock(transcript, mode):
+                yield event
+            return
+
+        if mode == 'panic':
+            deltas = self.llm_service.stream_translation(transcript)
+            explanation = "Translated Result"
+        else:
+            deltas = self.llm_service.stream_correction(transcript, context)
+            explanation = ""
+
+        user_voice_id = voice_id or DEFAULT_VOICE_ID
+
+        events: asyncio.Queue = asyncio.Queue()
+        segments: asyncio.Queue = asyncio.Queue()
+        text_parts: List[str] = []
+        tts_tasks: List[asyncio.Task] = []
+
+        def start_tts(sentence: str) -> Tuple[str, asyncio.Queue, asyncio.Task]:
+            # Chunks are buffered per sentence so later sentences synthesize while earlier ones play
+            chunks: asyncio.Queue = asyncio.Queue()
+
+            async def pump():
+                try:
+                    async for chunk in self.tts_service.stream_audio(sentence, user_voice_id):
+                        await chunks.put(chunk)
+                finally:
+                    chunks.put_nowait(None)
+
+            task = asyncio.create_task(pump())
+            tts_tasks.append(task)
+            return sentence, chunks, task
+
+        async def run_llm():
+            # 2. LLM: stream tokens, hand every complete sentence to TTS immediately
+            buffer = ""
+            with stage("llm"):
+                async for delta in deltas:
+                    text_parts.append(delta)
+                    await events.put({"event": "token", "data": {"text": delta}})
+                    buffer += delta
+                    sentences, buffer = split_sentences(buffer)
+                    for sentence in sentences:
+                        await segments.put(start_tts(sentence))
+            if buffer.strip():
+                await segments.put(start_tts(buffer.strip()))
+            await segments.put(None)
+
+        async def run_tts():
+            # 3. TTS: segments are synthesized concurrently but emitted in order, chunk by chunk
+            seq = 0
+            while (segment := await segments.get()) is not None:
+                sentence, chunks, task = segment
+                parts: List[bytes] = []
+                while (chunk := await chunks.get()) is not None:
+                    await events.put({"event": "audio", "data": {
+                        "seq": seq,
+                        "chunk": len(parts),
+                        "text": sentence,
+                        "audio": base64.b64encode(chunk).decode('utf-8'),
+                        "media_type": media_type_of(parts[0] if parts else chunk)
+                    }})
+                    parts.append(chunk)
+                # Surfaces ExecutorBusy from a saturated local TTS pool
+                await task
+                if not parts:
+                    continue
+                audio_bytes = finalize_wav(b"".join(parts))
+                pitch_result = await self._pitch(audio_bytes, pitch_format)
+                # The pitch event also marks the end of this segment's audio chunks
+                await events.put({"event": "pitch", "data": {"seq": seq, "data": pitch_result.get('data', [])}})
+                seq += 1
+
+        stages = [asyncio.create_task(run_llm()), asyncio.create_task(run_tts())]
+        done_stages = asyncio.gather(*stages)
+        done_stages.add_done_callback(lambda _: events.put_nowait(None))
+
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            await done_stages
+        finally:
+            # Client went away or a stage failed: stop all upstream work
+            for task in stages + tts_tasks:
+                task.cancel()
+
+        target_text = "".join(text_parts).strip()
+        yield {"event": "done", "data": {
+            "original_text": transcript,
+            "corrected_text": target_text,
+            "explanation": explanation,
+            "diff": [] if mode == 'panic' else word_diff(transcript, target_text),
+            "meta": outcomes
+        }}
+
+    async def _stream_mock(self, transcript: str, mode: str) -> AsyncIterator[Dict]:
+        if mode == 'panic':
+            target_text, explanation, diff = "I'd like a latte with oat milk, please.", "Translated from Chinese", []
+        else:
+            target_text, explanation = "I am thinking about quitting my job.", "Corrected verb forms."
+            diff = [{"old": "think", "new": "thinking", "type": "replace"}, {"old": "quit", "new": "quitting", "type": "replace"}]
+
+        for word in target_text.split(" "):
+            yield {"event": "token", "data": {"text": word + " "}}
+        # Same fields as the real stream: one chunk of 0.1 s of silence
+        silence = wav_header(16000, 3200) + bytes(3200)
+        yield {"event": "audio", "data": {
+            "seq": 0,
+            "chunk": 0,
+            "text": target_text,
+            "audio": base64.b64encode(silence).decode('utf-8'),
+            "media_type": media_type_of(silence)
+        }}
+        yield {"event": "pitch", "data": {"seq": 0, "data": [{"t": 0.1, "f": 120}, {"t": 0.2, "f": 125}]}}
+        yield {"event": "done", "data": {
+            "original_text": transcript,
+            "corrected_text": target_text,
+            "explanation": explanation,
+            "diff": diff,
+            "meta": {}
+        }}
@@ -1,18 +1,141 @@
 from openai import AsyncOpenAI
+from typing import Any, AsyncIterator, List, Optional, Tuple
+import asyncio
+import difflib
+import hashlib
 import json
 import os
+import unicodedata
+from app.core.batching import MicroBatcher
+from app.core.cache import LRUCache, ResultCache, SQLiteCache
+from app.core.database import sqlite_file_name
+from app.core.executor import ExecutorBusy
+from app.core.governor import call_timeout, governors
+from app.core.http import UpstreamClients, clients as upstream_clients
+from app.core.metrics import record_fallback, record_upstream_error, stage
+from app.core.policy import CallPolicy
+from app.core.workers import shared_default
+
+
+def word_diff(original: str, corrected: str) -> List[dict]:
+    """
+    Builds a word-level diff in the same shape GPT-4o returns from correct_grammar.
+    Used by the streaming path, where the model only streams the corrected text.
+    """
+    old_words = original.split()
+    new_words = corrected.split()
+    diff = []
+    matcher = difflib.SequenceMatcher(a=old_words, b=new_words, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        diff.append({
+            "old": " ".join(old_words[i1:i2]),
+            "new": " ".join(new_words[j1:j2]),
+            "type": op
+        })
+    return diff
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form for cache keys: case-folded, punctuation removed, whitespace collapsed.
+    "Can I get a coffee?" and "can i get a coffee" share one entry.
+    """
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return " ".join(text.split())
+
+class LLMCache(ResultCache):
+    """
+    Result cache in front of correct_grammar / translate_text.
+    Backend is pluggable: in-process LRU ('memory') or a SQLite table next to the app DB
+    ('sqlite', survives restarts and is shared across workers; the default when several
+    run). Both honour a TTL.
+    """
+    def __init__(self, backend=None):
+        super().__init__(backend if backend is not None else self._backend_from_env())
+
+    @staticmethod
+    def _backend_from_env():
+        ttl = float(os.getenv("LLM_CACHE_TTL", "86400")) or None
+        maxsize = int(os.getenv("LLM_CACHE_MAX_ITEMS", "10000"))
+        if os.getenv("LLM_CACHE_BACKEND", shared_default("memory", "sqlite")) == "sqlite":
+            return SQLiteCache(os.getenv("LLM_CACHE_DB", sqlite_file_name), table="llm_cache", maxsize=maxsize, ttl=ttl)
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def make_key(mode: str, text: str, context: str = "") -> str:
+        raw = json.dumps([mode, normalize_text(text), normalize_text(context)], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
 
 class LLMService:
     """
     Service for handling grammar correction and dialogue generation.
     """
-    def __init__(self, api_key: str = None):
-        self.client = AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+    def __init__(self, api_key: str = None, clients: Optional[UpstreamClients] = None, cache: Optional[LLMCache] = None):
+        self.api_key = api_key
+        self.clients = clients or upstream_clients
+        self.cache = cache or LLMCache()
+        # Failover order: a smaller model still beats the passthrough fallback
+        self.models = [m.strip() for m in os.getenv("LLM_MODELS", "gpt-4o,gpt-4o-mini").split(",") if m.strip()]
+        self.policy = CallPolicy("llm", timeout=self.clients.timeouts["llm"])
+        # Batch jobs: corrections arriving close together share one chat completion
+        self.batcher = MicroBatcher(
+            self._request_corrections,
+            max_size=int(os.getenv("LLM_BATCH_SIZE", "8")),
+            max_wait=float(os.getenv("LLM_BATCH_WAIT_MS", "50")) / 1000
+        )
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return self.clients.openai("llm", self.api_key)
+
+    async def _complete(self, messages: List[dict], **kwargs) -> Any:
+        """
+        One chat completion through the call policy: hedged, and retried on the next
+        model in LLM_MODELS if one fails.
+        """
+        return await self.policy.run(self.models, lambda model: self._create(model, messages, **kwargs))
+
+    async def _create(self, model: str, messages: List[dict], **kwargs) -> Any:
+        async with governors.slot("openai_llm"):
+            return await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=call_timeout(self.clients.timeouts["llm"]),
+                **kwargs
+            )
 
-    async def correct_grammar(self, text: str, context: str = "") -> dict:
+    async def correct_grammar(self, text: str, context: str = "", batched: bool = False) -> dict:
         """
         Uses GPT-4o to correct grammar and return a diff.
+        Identical (normalized) inputs are served from the cache.
+        batched: let the request share an upstream call with other batched corrections
+        (adds up to LLM_BATCH_WAIT_MS of latency; meant for batch jobs).
         """
+        key = LLMCache.make_key("correct", text, context)
+        if batched:
+            fetch = lambda: self.batcher.submit((text, context))
+        else:
+            fetch = lambda: self._request_correction(text, context)
+        try:
+            with stage("llm"):
+                return await self.cache.get_or_fetch(key, fetch)
+        except ExecutorBusy:
+            # Shed: the API answers 503 instead of a degraded 200
+            raise
+        except Exception as e:
+            # Fallback for demo/no-key (never cached)
+            print(f"LLM Error: {e}")
+            record_upstream_error("openai_llm", e)
+            record_fallback("llm", "correction_unavailable")
+            return {
+                "corrected": text, 
+                "explanation": "Service unavailable", 
+                "diff": []
+            }
+
+    async def _request_correction(self, text: str, context: str) -> dict:
         system_prompt = """
         You are an expert English language coach. 
         Your task is to correct the user's grammar while keeping the tone natural.
@@ -26,42 +149,160 @@ class LLMService:
         
         user_prompt = f"Context: {context}\nUser said: {text}"
 
+        response = await self._complete(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        content = response.choices[0].message.content
+        return json.loads(content)
+
+    async def _request_corrections(self, items: List[Tuple[str, str]]) -> List[dict]:
+        """
+        Corrects several (text, context) pairs with one chat completion.
+        Falls back to one request per item if the batched answer is unusable.
+        """
+        if len(items) == 1:
+            return [await self._request_correction(*items[0])]
+
+        system_prompt = """
+        You are an expert English language coach.
+        Correct each numbered sentence the user said, keeping the tone natural.
+        Return ONLY a JSON object with one result per input, in any order:
+        {
+            "results": [
+                {
+                    "id": 0,
+                    "corrected": "The corrected sentence",
+                    "explanation": "Brief explanation of why",
+                    "diff": [{"old": "wrong_word", "new": "right_word", "type": "replace/insert/delete"}]
+                }
+            ]
+        }
+        """
+        user_prompt = json.dumps(
+            [{"id": i, "context": context, "user_said": text} for i, (text, context) in enumerate(items)],
+            ensure_ascii=False
+        )
+
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
+            response = await self._complete(
+                [
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 response_format={"type": "json_object"}
             )
-            content = response.choices[0].message.content
-            return json.loads(content)
-        except Exception as e:
-            # Fallback for demo/no-key
-            print(f"LLM Error: {e}")
-            return {
-                "corrected": text, 
-                "explanation": "Service unavailable", 
-                "diff": []
+            by_id = {
+                result["id"]: {k: v for k, v in result.items() if k != "id"}
+                for result in json.loads(response.choices[0].message.content)["results"]
             }
+            results = [by_id[i] for i in range(len(items))]
+            if not all(isinstance(r.get("corrected"), str) for r in results):
+                raise ValueError("missing 'corrected' field")
+            return results
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"LLM Batch Error ({len(items)} items): {e}")
+            record_upstream_error("openai_llm", e)
+            record_fallback("llm", "batch_split")
+            return list(await asyncio.gather(*[self._request_correction(text, context) for text, context in items]))
 
     async def translate_text(self, text: str, target_lang: str = "English") -> str:
         """
         Translates text to target language using GPT-4o.
-        Used for Panic Button mode.
+        Used for Panic Button mode. Repeated phrases are served from the cache.
         """
-        system_prompt = f"You are a professional translator. Translate the following text into natural, native-sounding {target_lang}. Return ONLY the translation, no extra text."
-        
+        key = LLMCache.make_key(f"translate:{target_lang}", text)
         try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text}
-                ]
-            )
-            return response.choices[0].message.content.strip()
+            with stage("llm"):
+                return await self.cache.get_or_fetch(key, lambda: self._request_translation(text, target_lang))
+        except ExecutorBusy:
+            raise
         except Exception as e:
             print(f"Translation Error: {e}")
+            record_upstream_error("openai_llm", e)
+            record_fallback("llm", "translation_passthrough")
             return text # Fallback
+
+    async def _request_translation(self, text: str, target_lang: str) -> str:
+        system_prompt = f"You are a professional translator. Translate the following text into natural, native-sounding {target_lang}. Return ONLY the translation, no extra text."
+        
+        response = await self._complete([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": text}
+        ])
+        return response.choices[0].message.content.strip()
+
+    async def stream_correction(self, text: str, context: str = "") -> AsyncIterator[str]:
+        """
+        Streams the corrected sentence token by token (plain text, no JSON).
+        Used by the streaming pipeline so TTS can start on the first sentence.
+        """
+        system_prompt = """
+        You are an expert English language coach.
+        Correct the user's grammar while keeping the tone natural.
+        Return ONLY the corrected text, with no quotes or explanation.
+        """
+
+        cached = await self.cache.get(LLMCache.make_key("correct", text, context))
+        if cached is not None:
+            yield cached.get("corrected", text)
+            return
+
+        user_prompt = f"Context: {context}\nUser said: {text}"
+
+        async for delta in self._stream_chat(system_prompt, user_prompt, fallback=text):
+            yield delta
+
+    async def stream_translation(self, text: str, target_lang: str = "English") -> AsyncIterator[str]:
+        """
+        Streams the translation token by token. Streaming variant of translate_text.
+        """
+        cached = await self.cache.get(LLMCache.make_key(f"translate:{target_lang}", text))
+        if cached is not None:
+            yield cached
+            return
+
+        system_prompt = f"You are a professional translator. Translate the following text into natural, native-sounding {target_lang}. Return ONLY the translation, no extra text."
+
+        async for delta in self._stream_chat(system_prompt, text, fallback=text):
+            yield delta
+
+    async def _stream_chat(self, system_prompt: str, user_prompt: str, fallback: str) -> AsyncIterator[str]:
+        emitted = False
+        try:
+            # The slot is held until the stream ends: that is how long the upstream works on it
+            async with governors.slot("openai_llm"):
+                # Failover only while opening (not hedged: a duplicate stream doubles the tokens)
+                stream = await self.policy.run(
+                    self.models,
+                    lambda model: self.client.chat.completions.create(
+                        model=model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": user_prompt}
+                        ],
+                        stream=True,
+                        timeout=call_timeout(self.clients.timeouts["llm"])
+                    ),
+                    hedge=False
+                )
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        emitted = True
+                        yield delta
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"LLM Stream Error: {e}")
+            record_upstream_error("openai_llm", e)
+            if not emitted:
+                record_fallback("llm", "stream_passthrough")
+                yield fallback
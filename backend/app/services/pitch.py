@@ -1,8 +1,37 @@
 import parselmouth
 import numpy as np
+import soundfile as sf
 import base64
-import tempfile
+import hashlib
+import io
 import os
+from typing import Tuple
+from app.core.audio import AudioInput, as_audio_bytes
+from app.core.cache import LRUCache, ResultCache, SQLiteCache
+from app.core.database import sqlite_file_name
+from app.core.workers import shared_default
+
+PITCH_FORMATS = ("points", "arrays", "f32")
+
+class PitchCache(ResultCache):
+    """
+    extract_pitch results for generated audio, keyed by content hash and format.
+    Repeated phrases come back from the TTS cache byte-identical, so their contour is
+    computed once ('sqlite' backend: once for all workers; the default when several run).
+    """
+    def __init__(self, backend=None):
+        super().__init__(backend if backend is not None else self._backend_from_env())
+
+    @staticmethod
+    def _backend_from_env():
+        maxsize = int(os.getenv("PITCH_CACHE_MAX_ITEMS", "5000"))
+        if os.getenv("PITCH_CACHE_BACKEND", shared_default("memory", "sqlite")) == "sqlite":
+            return SQLiteCache(os.getenv("PITCH_CACHE_DB", sqlite_file_name), table="pitch_cache", maxsize=maxsize)
+        return LRUCache(maxsize=maxsize)
+
+    @staticmethod
+    def make_key(audio_bytes, output_format: str) -> str:
+        return f"{hashlib.sha256(audio_bytes).hexdigest()}:{output_format}"
 
 class PitchService:
     """
@@ -10,39 +39,175 @@ class PitchService:
     Used for the 'Guitar Hero' visualization mode.
     """
 
-    def extract_pitch(self, audio_data_b64: str) -> dict:
+    def extract_pitch(self, audio_data: AudioInput, output_format: str = "points") -> dict:
         """
-        Decodes base64 audio, saves to temp file, and extracts pitch using Praat.
-        Returns a list of {time, frequency} points.
+        Extracts pitch from audio (base64 string or raw bytes) in memory using Praat.
+        output_format:
+          'points' -> [{"t", "f"}, ...] (default)
+          'arrays' -> {"t": [...], "f": [...]}
+          'f32'    -> {"encoding": "float32-le", "frames": n, "buffer": base64(t[0..n] + f[0..n])}
         """
         try:
-            # Decode base64 to temp file
-            audio_bytes = base64.b64decode(audio_data_b64)
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-                temp_audio.write(audio_bytes)
-                temp_path = temp_audio.name
-
-            # Load into Parselmouth (Praat)
-            snd = parselmouth.Sound(temp_path)
-            
-            # Extract Pitch
-            # time_step=None (auto), pitch_floor=75.0, pitch_ceiling=600.0 (standard for human speech)
-            pitch = snd.to_pitch(pitch_floor=75.0, pitch_ceiling=600.0)
-            
-            # Convert to JSON-friendly format
-            pitch_values = pitch.selected_array['frequency']
-            times = pitch.xs()
-            
-            # Filter unvoiced segments (frequency = 0)
-            result = []
-            for t, f in zip(times, pitch_values):
-                if f > 0:  # Only voiced parts
-                    result.append({"t": round(t, 3), "f": round(f, 2)})
-            
-            # Cleanup
-            os.remove(temp_path)
-            
-            return {"status": "success", "data": result}
+            if output_format not in PITCH_FORMATS:
+                raise ValueError(f"Unknown pitch format: {output_format}")
+
+            times, pitch_values = self.extract_contour(audio_data)
+            return {"status": "success", "data": self.format_contour(times, pitch_values, output_format)}
 
         except Exception as e:
             return {"status": "error", "message": str(e)}
+
+    def extract_contour(self, audio_data: AudioInput) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the voiced contour as (times, frequencies) arrays. Raises on bad audio.
+        """
+        audio_bytes = as_audio_bytes(audio_data)
+        snd = self.load_sound(audio_bytes)
+
+        # Extract Pitch
+        # time_step=None (auto), pitch_floor=75.0, pitch_ceiling=600.0 (standard for human speech)
+        pitch = snd.to_pitch(pitch_floor=75.0, pitch_ceiling=600.0)
+
+        pitch_values = pitch.selected_array['frequency']
+        times = pitch.xs()
+
+        # Filter unvoiced segments (frequency = 0)
+        voiced = pitch_values > 0
+        return np.round(times[voiced], 3), np.round(pitch_values[voiced], 2)
+
+    @staticmethod
+    def load_sound(audio_bytes) -> parselmouth.Sound:
+        """
+        Decodes WAV/FLAC/OGG/MP3 bytes into a Praat Sound without touching the filesystem.
+        """
+        samples, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float64", always_2d=True)
+        if samples.shape[0] == 0:
+            raise ValueError("Audio Error: file contains no samples")
+        # soundfile returns (frames, channels); Praat expects (channels, frames)
+        return parselmouth.Sound(samples.T, sampling_frequency=sample_rate)
+
+    @staticmethod
+    def format_contour(times: np.ndarray, pitch_values: np.ndarray, output_format: str = "points"):
+        """
+        Converts voiced (t, f) arrays into the requested JSON-friendly shape.
+        """
+        if output_format == "arrays":
+            return {"t": times.tolist(), "f": pitch_values.tolist()}
+        if output_format == "f32":
+            packed = np.concatenate([times, pitch_values]).astype("<f4").tobytes()
+            return {
+                "encoding": "float32-le",
+                "frames": int(times.size),
+                "buffer": base64.b64encode(packed).decode("utf-8")
+            }
+        return [{"t": t, "f": f} for t, f in zip(times.tolist(), pitch_values.tolist())]
+
+
+class StreamingPitchTracker:
+    """
+    Incremental F0 estimator for live PCM (one instance per connection).
+    Samples go into a fixed-size ring buffer; every `hop` samples the latest window is
+    analyzed with YIN. All windows completed by one chunk are analyzed together
+    (batched FFT), so per-chunk cost stays small. Memory is constant for the whole session.
+    """
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        pitch_floor: float = 75.0,
+        pitch_ceiling: float = 600.0,
+        hop_ms: float = 10.0,
+        threshold: float = 0.15,
+        silence_rms: float = 0.01,
+        max_chunk_ms: float = 250.0
+    ):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.silence_rms = silence_rms
+        self.tau_min = max(2, int(sample_rate / pitch_ceiling))
+        self.tau_max = int(np.ceil(sample_rate / pitch_floor))
+        # Integration window covers one period of the lowest pitch
+        self.window = self.tau_max
+        self.frame_len = self.window + self.tau_max
+        self.hop = max(1, int(sample_rate * hop_ms / 1000))
+        self.fft_size = 1 << int(np.ceil(np.log2(self.frame_len + self.window)))
+        # Larger pushes are split so the ring never overwrites a window before it's analyzed
+        self.max_chunk = max(self.hop, int(sample_rate * max_chunk_ms / 1000))
+
+        self._ring = np.zeros(self.frame_len + self.max_chunk, dtype=np.float32)
+        self._written = 0                    # total samples received
+        self._next_end = self.frame_len      # end (exclusive) of the next window
+        self._offsets = np.arange(self.frame_len) - self.frame_len
+        self._taus = np.arange(self.tau_max + 1)
+
+    def push(self, samples: np.ndarray) -> list:
+        """
+        Feeds float samples in [-1, 1]. Returns voiced points [{"t", "f"}, ...] for every
+        window completed by these samples; t is the window center in seconds from stream start.
+        """
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        points = []
+        for start in range(0, samples.size, self.max_chunk):
+            points.extend(self._push_chunk(samples[start:start + self.max_chunk]))
+        return points
+
+    def _push_chunk(self, chunk: np.ndarray) -> list:
+        capacity = self._ring.size
+        start = self._written % capacity
+        first = min(chunk.size, capacity - start)
+        self._ring[start:start + first] = chunk[:first]
+        self._ring[:chunk.size - first] = chunk[first:]
+        self._written += chunk.size
+
+        if self._written < self._next_end:
+            return []
+        ends = np.arange(self._next_end, self._written + 1, self.hop)
+        self._next_end = int(ends[-1]) + self.hop
+
+        frames = self._ring[(ends[:, None] + self._offsets) % capacity].astype(np.float64)
+        frequencies = self._estimate(frames)
+        times = (ends - self.frame_len / 2) / self.sample_rate
+
+        voiced = frequencies > 0
+        return [
+            {"t": t, "f": f}
+            for t, f in zip(np.round(times[voiced], 3).tolist(), np.round(frequencies[voiced], 2).tolist())
+        ]
+
+    def _estimate(self, frames: np.ndarray) -> np.ndarray:
+        """
+        YIN on a (n_frames, frame_len) batch. Returns F0 per frame, 0 where unvoiced.
+        """
+        w, tau_max = self.window, self.tau_max
+
+        # d(tau) = E(x[0:w]) + E(x[tau:tau+w]) - 2 * r(tau), with r from one FFT per frame
+        spectrum = np.fft.rfft(frames, self.fft_size)
+        head = np.fft.rfft(frames[:, :w], self.fft_size)
+        r = np.fft.irfft(np.conj(head) * spectrum, self.fft_size)[:, :tau_max + 1]
+        energy = np.concatenate([np.zeros((frames.shape[0], 1)), np.cumsum(frames ** 2, axis=1)], axis=1)
+        shifted = energy[:, self._taus + w] - energy[:, self._taus]
+        diff = np.maximum(energy[:, w:w + 1] + shifted - 2 * r, 0.0)
+
+        # Cumulative mean normalized difference
+        cumulative = np.cumsum(diff[:, 1:], axis=1)
+        cmnd = np.ones_like(diff)
+        cmnd[:, 1:] = diff[:, 1:] * self._taus[1:] / np.maximum(cumulative, 1e-12)
+
+        # First local minimum below the threshold in [tau_min, tau_max)
+        band = cmnd[:, self.tau_min:tau_max]
+        candidates = (band[:, :-1] < self.threshold) & (band[:, :-1] <= band[:, 1:])
+        found = candidates.any(axis=1)
+        tau = candidates.argmax(axis=1) + self.tau_min
+
+        # Parabolic interpolation around the minimum
+        rows = np.arange(frames.shape[0])
+        left = cmnd[rows, tau - 1]
+        mid = cmnd[rows, tau]
+        right = cmnd[rows, tau + 1]
+        denom = left - 2 * mid + right
+        curved = np.abs(denom) > 1e-12
+        shift = np.where(curved, 0.5 * (left - right) / np.where(curved, denom, 1.0), 0.0)
+        refined = tau + np.clip(shift, -1, 1)
+
+        rms = np.sqrt(np.mean(frames[:, -w:] ** 2, axis=1))
+        voiced = found & (rms >= self.silence_rms)
+        return np.where(voiced, self.sample_rate / refined, 0.0)
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+import numpy as np
+from app.core.cache import LRUCache
+from app.core.executor import TaskExecutor, executor as default_executor
+from app.core.workers import file_lock, file_lock_sync
+from app.services.llm import normalize_text
+from app.services.pitch import PitchService
+from app.services.tts import TTSCache, TextToSpeechService
+from app.services.video import VideoService
+from app.services.voice import DEFAULT_VOICE_ID
+
+
+class ReferenceStore:
+    """
+    Precomputed native-speaker pitch contours.
+    One float32 .npy file per item (row 0 = times, row 1 = frequencies) plus an index.json
+    with the metadata. Arrays are memory-mapped on first use and kept open in an LRU.
+    Methods do blocking file I/O; they are cheap (no analysis) but call them from a thread
+    pool or a sync endpoint.
+    """
+    def __init__(self, directory: Optional[str] = None, max_open: int = 256):
+        self.directory = directory or os.getenv("REFERENCE_DIR", "backend/cache/reference")
+        self.index_path = os.path.join(self.directory, "index.json")
+        self.index: Dict[str, dict] = {}
+        self._index_mtime = None
+        self._arrays = LRUCache(maxsize=max_open)
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def item_id_for_text(text: str) -> str:
+        # Same normalization as the LLM cache: casing/punctuation don't change the target sentence
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"text-{digest[:16]}"
+
+    def _refresh(self):
+        # Picks up contours written by the ingest script while the server is running
+        try:
+            mtime = os.stat(self.index_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._index_mtime:
+            return
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            self.index = json.load(f)
+        self._index_mtime = mtime
+        self._arrays.clear()
+
+    def meta(self, item_id: str) -> Optional[dict]:
+        with self._lock:
+            self._refresh()
+            return self.index.get(item_id)
+
+    def get(self, item_id: str) -> Optional[Tuple[dict, np.ndarray]]:
+        """
+        Returns (metadata, 2xN array) or None if the item was never ingested.
+        """
+        with self._lock:
+            self._refresh()
+            meta = self.index.get(item_id)
+            if meta is None:
+                return None
+            contour = self._arrays.get(item_id)
+            if contour is None:
+                try:
+                    contour = np.load(os.path.join(self.directory, meta["file"]), mmap_mode="r")
+                except FileNotFoundError:
+                    return None
+                self._arrays.set(item_id, contour)
+            return meta, contour
+
+    def find_text(self, text: str) -> Optional[Tuple[dict, np.ndarray]]:
+        return self.get(self.item_id_for_text(text))
+
+    def put(self, item_id: str, times: np.ndarray, frequencies: np.ndarray, **meta) -> dict:
+        """
+        Stores a contour atomically and records it in the index.
+        """
+        contour = np.vstack([times, frequencies]).astype("<f4")
+        etag = hashlib.sha256(contour.tobytes()).hexdigest()[:20]
+        filename = f"{item_id}.npy"
+        path = os.path.join(self.directory, filename)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, contour)
+        os.replace(tmp_path, path)
+
+        entry = {
+            **meta,
+            "id": item_id,
+            "file": filename,
+            "frames": int(contour.shape[1]),
+            "duration": round(float(times[-1]), 3) if len(times) else 0.0,
+            "etag": etag
+        }
+        # Workers and the ingest script all update index.json: read-modify-write under a file lock
+        with self._lock, file_lock_sync(f"{self.index_path}.lock"):
+            self._refresh()
+            self.index[item_id] = entry
+            tmp_index = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_index, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, ensure_ascii=False, indent=1, sort_keys=True)
+            os.replace(tmp_index, self.index_path)
+            self._index_mtime = os.stat(self.index_path).st_mtime_ns
+            self._arrays.delete(item_id)
+        return entry
+
+    def __contains__(self, item_id: str) -> bool:
+        return self.meta(item_id) is not None
+
+    def stats(self) -> dict:
+        return {"items": len(self.index), "open": self._arrays.stats()}
+
+
+class ReferenceBuilder:
+    """
+    Ingest pipeline for reference contours:
+    - clips: the original audio track of every clip in VideoService.get_clips
+    - sentences: known target sentences, spoken by the default native voice (TTS)
+    Items whose source has not changed are skipped, so re-running is cheap.
+    """
+    def __init__(
+        self,
+        store: ReferenceStore,
+        pitch_service: PitchService,
+        tts_service: TextToSpeechService,
+        video_service: VideoService,
+        executor: Optional[TaskExecutor] = None
+    ):
+        self.store = store
+        self.pitch_service = pitch_service
+        self.tts_service = tts_service
+        self.video_service = video_service
+        self.executor = executor or default_executor
+
+    async def build_clips(self, force: bool = False) -> Dict[str, str]:
+        # One worker (or the ingest script) at a time; the rest then find the contours fresh
+        results = {}
+        async with file_lock(os.path.join(self.store.directory, ".build.lock")):
+            for clip in self.video_service.get_clips():
+                try:
+                    results[clip['id']] = await self.build_clip(clip, force=force)
+                except Exception as e:
+                    print(f"Reference Error ({clip['id']}): {e}")
+                    results[clip['id']] = "error"
+        return results
+
+    async def build_clip(self, clip: dict, force: bool = False) -> str:
+        source_path = os.path.join(self.video_service.clips_dir, clip['filename'])
+        source = f"clip:{clip['filename']}:{os.stat(source_path).st_mtime_ns}"
+        if not force and (self.store.meta(clip['id']) or {}).get("source") == source:
+            return "fresh"
+
+        # Mono 16 kHz WAV on stdout: enough for F0 up to the 600 Hz ceiling
+        cmd = [
+            "ffmpeg", "-v", "error",
+            "-i", source_path,
+            "-vn", "-ac", "1", "-ar", "16000",
+            "-f", "wav", "pipe:1"
+        ]
+        returncode, audio, stderr = await self.executor.run_subprocess_output("reference_extract", cmd)
+        if returncode != 0:
+            raise RuntimeError(stderr.decode(errors="replace").strip() or "ffmpeg failed")
+
+        await self._analyze(clip['id'], audio, kind="clip", text=clip['quote'], source=source)
+        return "built"
+
+    async def build_sentences(self, sentences: Iterable[str], force: bool = False) -> Dict[str, str]:
+        results = {}
+        for text in sentences:
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                results[text] = await self.build_sentence(text, force=force)
+            except Exception as e:
+                print(f"Reference Error ({text!r}): {e}")
+                results[text] = "error"
+        return results
+
+    async def build_sentence(self, text: str, voice_id: str = DEFAULT_VOICE_ID, force: bool = False) -> str:
+        item_id = self.store.item_id_for_text(text)
+        tts = self.tts_service
+        source = "tts:" + TTSCache.make_key(text, voice_id, tts.model_id, tts.voice_settings)
+        if not force and (self.store.meta(item_id) or {}).get("source") == source:
+            return "fresh"
+
+        audio = await tts.generate_audio(text, voice_id)
+        if not audio:
+            raise RuntimeError("TTS returned no audio")
+
+        await self._analyze(item_id, audio, kind="sentence", text=text, source=source)
+        return "built"
+
+    async def _analyze(self, item_id: str, audio: bytes, **meta):
+        times, frequencies = await self.executor.run_cpu(
+            "reference_pitch", self.pitch_service.extract_contour, audio
+        )
+        await asyncio.to_thread(self.store.put, item_id, times, frequencies, **meta)
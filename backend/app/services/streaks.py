@@ -0,0 +1,146 @@
+import asyncio
+import os
+from datetime import date, datetime
+from typing import Dict, Optional
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.database import async_engine, begin_write
+from app.core.metrics import stage
+from app.models.user import User
+
+STREAK_TARGET = 3  # processed sentences per day that count towards the streak
+
+
+def apply_activity(user: User, when: datetime, count: int = 1):
+    """
+    Applies `count` processed sentences made on `when`'s day to the user's counters.
+    Same result as recording them one by one.
+    """
+    today = when.date()
+    if user.last_active_date and user.last_active_date.date() == today:
+        before = user.daily_process_count
+    else:
+        # New day: reset the daily count; a gap of more than one day breaks the streak
+        before = 0
+        if user.last_active_date and (today - user.last_active_date.date()).days > 1:
+            user.streak_count = 0
+    user.daily_process_count = before + count
+    user.last_active_date = when
+
+    # Streak target reached today
+    if before < STREAK_TARGET <= user.daily_process_count:
+        user.streak_count += 1
+
+
+class StreakUpdater:
+    """
+    Write-behind streak counters. record() only bumps an in-memory counter per
+    (user, day); a background loop applies everything recorded since the last flush
+    in one transaction every `interval` seconds (or once `max_pending` users are waiting).
+    A user processing 20 sentences between flushes costs one UPDATE instead of 20 commits.
+    Counters not yet flushed are lost if the process is killed (not on a clean shutdown).
+    Each worker process has its own updater; flushes are serialized in the database.
+    """
+    def __init__(self, interval: Optional[float] = None, max_pending: Optional[int] = None, db_engine=None):
+        self.interval = interval or float(os.getenv("STREAK_FLUSH_SECONDS", "2.0"))
+        self.max_pending = max_pending or int(os.getenv("STREAK_FLUSH_MAX_USERS", "1000"))
+        self.engine = db_engine or async_engine
+        # user_id -> day -> [count, last activity]
+        self.pending: Dict[int, Dict[date, list]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.recorded = 0
+        self.flushes = 0
+        self.rows_written = 0
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # Let a flush in progress finish: cancelling it mid-write would drop its batch
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            self._stopping = False
+        await self.flush()
+
+    def record(self, user_id: int, when: Optional[datetime] = None):
+        when = when or datetime.now()
+        days = self.pending.setdefault(user_id, {})
+        entry = days.setdefault(when.date(), [0, when])
+        entry[0] += 1
+        entry[1] = max(entry[1], when)
+        self.recorded += 1
+        if len(self.pending) >= self.max_pending and self._wakeup is not None:
+            self._wakeup.set()
+
+    def view(self, user: User) -> User:
+        """
+        Applies the user's not-yet-flushed activity to `user` (a detached, per-request
+        instance) so responses show up-to-date counters.
+        """
+        for day in sorted(self.pending.get(user.id, {})):
+            count, when = self.pending[user.id][day]
+            apply_activity(user, when, count)
+        return user
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._stopping:
+                await self.flush()
+
+    async def flush(self):
+        if not self.pending:
+            return
+        batch, self.pending = self.pending, {}
+        try:
+            with stage("db", mode="", op="streak_flush"):
+                async with AsyncSession(self.engine) as session:
+                    # Other workers flush the same users: read and write under one lock
+                    await begin_write(session)
+                    users = (await session.exec(
+                        select(User).where(User.id.in_(list(batch))).with_for_update()
+                    )).all()
+                    for user in users:
+                        for day in sorted(batch[user.id]):
+                            count, when = batch[user.id][day]
+                            apply_activity(user, when, count)
+                        session.add(user)
+                    await session.commit()
+            self.flushes += 1
+            self.rows_written += len(users)
+        except Exception as e:
+            print(f"Streak Flush Error: {e}")
+            # Retry next time
+            self._restore(batch)
+        except BaseException:
+            # Cancelled mid-write: keep the counters for the next flush
+            self._restore(batch)
+            raise
+
+    def _restore(self, batch: Dict[int, Dict[date, list]]):
+        # Put the batch back in front of anything recorded meanwhile
+        for user_id, days in batch.items():
+            merged = self.pending.setdefault(user_id, {})
+            for day, (count, when) in days.items():
+                entry = merged.setdefault(day, [0, when])
+                entry[0] += count
+                entry[1] = max(entry[1], when)
+
+    def stats(self) -> dict:
+        return {
+            "pending_users": len(self.pending),
+            "recorded": self.recorded,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written
+        }
@@ -1,45 +1,288 @@
 from openai import AsyncOpenAI
-import base64
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import asyncio
+import io
 import os
+import numpy as np
+from app.core.audio import AudioInput, as_audio_bytes
+from app.core.batching import MicroBatcher
+from app.core.executor import ExecutorBusy
+from app.core.governor import call_timeout, governors
+from app.core.http import UpstreamClients, clients as upstream_clients
+from app.core.metrics import mode_var, record_fallback, record_upstream_error, stage
+from app.core.policy import CallPolicy
+
+try:
+    # Optional: only needed for STT_BACKEND=local (pip install faster-whisper)
+    from faster_whisper import WhisperModel, decode_audio
+    from faster_whisper.audio import pad_or_trim
+    from faster_whisper.tokenizer import Tokenizer
+except ImportError:
+    WhisperModel = None
+
+SAMPLE_RATE = 16000
+# Whisper's decoder context (tokens)
+MAX_TEXT_TOKENS = 448
+
+
+def parse_mode_map(value: str) -> Dict[str, str]:
+    """
+    "shadowing=local,panic=openai" -> {"shadowing": "local", "panic": "openai"}
+    """
+    mapping = {}
+    for item in value.split(","):
+        key, _, val = item.partition("=")
+        if key.strip() and val.strip():
+            mapping[key.strip()] = val.strip()
+    return mapping
+
+
+def decode_pcm(audio_bytes: bytes) -> np.ndarray:
+    """
+    Any container/codec the browser sends -> mono float32 at 16 kHz.
+    """
+    return decode_audio(io.BytesIO(audio_bytes), sampling_rate=SAMPLE_RATE)
+
+
+class OpenAIWhisperBackend:
+    """
+    Hosted whisper-1. The buffer is uploaded directly; nothing is written to disk.
+    """
+    name = "openai"
+    ready = True
+
+    def __init__(self, api_key: str = None, clients: Optional[UpstreamClients] = None):
+        self.api_key = api_key
+        self.clients = clients or upstream_clients
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        return self.clients.openai("stt", self.api_key)
+
+    async def transcribe(self, audio_bytes: bytes, mode: str = "") -> str:
+        async with governors.slot("openai_stt"):
+            # The filename only tells Whisper how to sniff the container
+            transcription = await self.client.audio.transcriptions.create(
+                model="whisper-1",
+                file=("audio.wav", bytes(audio_bytes)),
+                timeout=call_timeout(self.clients.timeouts["stt"])
+            )
+        return transcription.text
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": True}
+
+
+class LocalWhisperBackend:
+    """
+    On-box Whisper (faster-whisper / CTranslate2, int8 on CPU).
+    The model is loaded once by start() and warmed up; LOCAL_STT_WORKERS threads share it
+    (CTranslate2 runs that many inferences in parallel). Short utterances of the same
+    language arriving within LOCAL_STT_BATCH_WAIT_MS are decoded as one batch.
+    """
+    name = "local"
+
+    def __init__(self, model: Any = None):
+        self.model_size = os.getenv("LOCAL_STT_MODEL", "small")
+        self.compute_type = os.getenv("LOCAL_STT_COMPUTE_TYPE", "int8")
+        self.workers = int(os.getenv("LOCAL_STT_WORKERS", "2"))
+        self.cpu_threads = int(os.getenv("LOCAL_STT_THREADS", "2"))
+        self.queue_limit = int(os.getenv("LOCAL_STT_QUEUE_LIMIT", "32"))
+        self.beam_size = int(os.getenv("LOCAL_STT_BEAM_SIZE", "1"))
+        self.batch_size = int(os.getenv("LOCAL_STT_BATCH_SIZE", "8"))
+        self.batch_wait = float(os.getenv("LOCAL_STT_BATCH_WAIT_MS", "30")) / 1000
+        self.batch_max_seconds = float(os.getenv("LOCAL_STT_BATCH_MAX_SECONDS", "15"))
+        # Whisper needs the language up front to batch; modes without one are auto-detected, unbatched
+        self.languages = parse_mode_map(os.getenv("LOCAL_STT_LANGUAGES", "shadowing=en,completion=en,panic=zh"))
+
+        self.model = model
+        self.batchers: Dict[str, MicroBatcher] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    async def start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stt")
+        if self.model is None:
+            if WhisperModel is None:
+                raise RuntimeError("faster-whisper is not installed")
+            self.model = await self._run(self._load)
+            # The first inference allocates buffers; pay for it before the first user does
+            await self._run(self._transcribe_one, np.zeros(SAMPLE_RATE, dtype=np.float32), "en")
+            print(f"Local STT ready: {self.model_size} ({self.compute_type}, {self.workers} workers)")
+
+    async def shutdown(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+    def _load(self):
+        return WhisperModel(
+            self.model_size,
+            device="cpu",
+            compute_type=self.compute_type,
+            cpu_threads=self.cpu_threads,
+            num_workers=self.workers
+        )
+
+    async def _run(self, fn, *args):
+        if self._pool is None:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    async def transcribe(self, audio_bytes: bytes, mode: str = "") -> str:
+        if self._pending >= self.queue_limit:
+            self.rejected += 1
+            raise ExecutorBusy("stt")
+        self._pending += 1
+        try:
+            audio = await self._run(decode_pcm, bytes(audio_bytes))
+            language = self.languages.get(mode)
+            if language and len(audio) <= self.batch_max_seconds * SAMPLE_RATE:
+                return await self._batcher(language).submit(audio)
+            return await self._run(self._transcribe_one, audio, language)
+        finally:
+            self._pending -= 1
+
+    def _batcher(self, language: str) -> MicroBatcher:
+        if language not in self.batchers:
+            self.batchers[language] = MicroBatcher(
+                lambda audios: self._run(self._transcribe_batch, audios, language),
+                max_size=self.batch_size,
+                max_wait=self.batch_wait
+            )
+        return self.batchers[language]
+
+    def _transcribe_one(self, audio: np.ndarray, language: Optional[str]) -> str:
+        segments, _ = self.model.transcribe(
+            audio,
+            language=language,
+            beam_size=self.beam_size,
+            without_timestamps=True,
+            condition_on_previous_text=False
+        )
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    def _transcribe_batch(self, audios: List[np.ndarray], language: str) -> List[str]:
+        """
+        One encoder pass and one decode for the whole batch. Every utterance fits
+        Whisper's 30 s window, so each is a single padded segment.
+        """
+        if len(audios) == 1:
+            return [self._transcribe_one(audios[0], language)]
+        model = self.model
+        features = np.stack([pad_or_trim(model.feature_extractor(audio)) for audio in audios])
+        encoder_output = model.encode(features)
+        tokenizer = Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language=language)
+        prompt = model.get_prompt(tokenizer, [], without_timestamps=True)
+        results = model.model.generate(
+            encoder_output,
+            [prompt] * len(audios),
+            beam_size=self.beam_size,
+            max_length=MAX_TEXT_TOKENS,
+            suppress_blank=True
+        )
+        return [tokenizer.decode(result.sequences_ids[0]).strip() for result in results]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "model": self.model_size,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "batches": {language: batcher.stats() for language, batcher in self.batchers.items()}
+        }
+
 
 class SpeechToTextService:
     """
     Service for converting Audio to Text (ASR).
-    Currently supports OpenAI Whisper.
+    Backends: hosted OpenAI Whisper ('openai') and on-box faster-whisper ('local'),
+    chosen per mode (STT_BACKEND default, STT_BACKEND_BY_MODE overrides). If that backend
+    is unavailable or fails, the next ready one in STT_FAILOVER is tried (see CallPolicy).
     """
-    def __init__(self, api_key: str = None):
-        self.client = AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+    def __init__(self, api_key: str = None, clients: Optional[UpstreamClients] = None, backends: Optional[Dict[str, Any]] = None):
+        self.backends = backends if backends is not None else {
+            "openai": OpenAIWhisperBackend(api_key, clients),
+            "local": LocalWhisperBackend()
+        }
+        self.default_backend = os.getenv("STT_BACKEND", "openai")
+        self.routes = parse_mode_map(os.getenv("STT_BACKEND_BY_MODE", ""))
+        self.failover = [name.strip() for name in os.getenv("STT_FAILOVER", "openai,local").split(",") if name.strip()]
+        self.policy = CallPolicy("stt", timeout=(clients or upstream_clients).timeouts["stt"])
+
+    def backend_name(self, mode: str) -> str:
+        return self.routes.get(mode, self.default_backend)
 
-    async def transcribe(self, audio_data_b64: str) -> str:
+    def candidates(self, mode: str) -> List[str]:
         """
-        Transcribes base64 encoded audio using Whisper-1.
+        Ready backends in the order they are tried: the mode's backend, then STT_FAILOVER.
         """
-        temp_path = None
+        primary = self.backend_name(mode)
+        names = [primary] + [name for name in self.failover if name != primary]
+        return [name for name in names if name in self.backends and self.backends[name].ready]
+
+    async def start(self):
+        """
+        Loads the local model if any mode uses it (called by the FastAPI lifespan).
+        """
+        names = {self.default_backend, *self.routes.values()}
+        for name in names:
+            backend = self.backends.get(name)
+            if backend is not None and hasattr(backend, "start"):
+                try:
+                    await backend.start()
+                except Exception as e:
+                    print(f"STT backend '{name}' unavailable, falling back to OpenAI Whisper: {e}")
+
+    async def shutdown(self):
+        for backend in self.backends.values():
+            if hasattr(backend, "shutdown"):
+                await backend.shutdown()
+
+    async def transcribe(self, audio_data: AudioInput) -> str:
+        """
+        Transcribes audio (base64 string or raw bytes) with the backend configured
+        for the request's mode (see metrics.bind_mode).
+        """
+        mode = mode_var.get()
+        names = self.candidates(mode) or ["openai"]
         try:
-            # Decode base64 to temp file
-            # Whisper API requires a file-like object or path
-            audio_bytes = base64.b64decode(audio_data_b64)
-            
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-                temp_audio.write(audio_bytes)
-                temp_path = temp_audio.name
-
-            # Call Whisper API
-            with open(temp_path, "rb") as audio_file:
-                transcription = await self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file
-                )
-            
-            return transcription.text
+            with stage("decode"):
+                audio_bytes = as_audio_bytes(audio_data)
 
+            with stage("stt", backend=names[0]):
+                return await self.policy.run(names, lambda name: self._transcribe_with(name, audio_bytes, mode))
+
+        except ExecutorBusy:
+            raise
         except Exception as e:
             print(f"STT Error: {e}")
+            record_fallback("stt", "empty_transcript")
             # Fallback for when API fails or mock is needed implicitly
             return ""
-        
-        finally:
-            # Cleanup
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
+
+    async def _transcribe_with(self, name: str, audio_bytes, mode: str) -> str:
+        try:
+            return await self.backends[name].transcribe(audio_bytes, mode)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            # Counted against the backend that failed ("openai_stt", "local_stt"), failed over or not
+            record_upstream_error(f"{name}_stt", e)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": self.default_backend,
+            "by_mode": self.routes,
+            "failover": self.failover,
+            "policy": self.policy.stats(),
+            "backends": {name: backend.stats() for name, backend in self.backends.items()}
+        }
@@ -1,46 +1,542 @@
+import asyncio
+import hashlib
+import json
 import os
-import httpx
-from typing import Optional
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.audio import finalize_wav, wav_header
+from app.core.cache import DiskCache, LRUCache, SingleFlight
+from app.core.executor import ExecutorBusy
+from app.core.governor import call_timeout, governors
+from app.core.http import UpstreamClients, clients as upstream_clients, retry_async
+from app.core.metrics import mode_var, record_fallback, record_upstream_error, stage, stage_seconds
+from app.core.policy import CallPolicy
+from app.services.stt import parse_mode_map
 
-class TextToSpeechService:
+try:
+    # Optional: only needed for TTS_BACKEND=local (pip install coqui-tts)
+    import torch
+    from TTS.tts.configs.xtts_config import XttsConfig
+    from TTS.tts.models.xtts import Xtts
+except ImportError:
+    Xtts = None
+
+class TTSCache:
     """
-    Service for converting Text to Audio (TTS).
-    Integrates with ElevenLabs for high-quality Voice Cloning.
+    Content-addressed cache for generated speech.
+    Memory LRU in front of a size-bounded directory of audio files (MP3 or WAV,
+    depending on the backend; stored as .bin since the key doesn't say which).
+    Concurrent misses for the same key share one upstream call.
+    """
+    def __init__(self, directory: str = "backend/cache/tts", memory_items: int = 256, disk_bytes: int = 512 * 1024 * 1024):
+        self.memory = LRUCache(maxsize=memory_items)
+        self._migrate_suffix(directory, ".mp3", ".bin")
+        self.disk = DiskCache(directory, max_bytes=disk_bytes, suffix=".bin")
+        self.flight = SingleFlight()
+        self.upstream_calls = 0
+
+    @staticmethod
+    def _migrate_suffix(directory: str, old: str, new: str):
+        # Entries written before WAV backends existed were all named .mp3
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.endswith(old):
+                path = os.path.join(directory, name)
+                try:
+                    os.replace(path, path[:-len(old)] + new)
+                except FileNotFoundError:
+                    pass  # Another worker got there first
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, model_id: str, voice_settings: dict) -> str:
+        # Whitespace does not change the spoken output; case and punctuation do (prosody)
+        normalized = " ".join(text.split())
+        raw = json.dumps([voice_id, normalized, model_id, voice_settings], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        audio = self.memory.get(key)
+        if audio is None:
+            audio = await asyncio.to_thread(self.disk.get, key)
+            if audio is not None:
+                self.memory.set(key, audio)
+        return audio
+
+    async def set(self, key: str, audio: bytes):
+        await asyncio.to_thread(self.disk.set, key, audio)
+        self.memory.set(key, audio)
+
+    async def get_or_fetch(self, key: str, fetch) -> bytes:
+        audio = self.memory.get(key)
+        if audio is not None:
+            return audio
+        return await self.flight.do(key, lambda: self._load(key, fetch))
+
+    async def _load(self, key: str, fetch) -> bytes:
+        audio = await asyncio.to_thread(self.disk.get, key)
+        if audio is None:
+            self.upstream_calls += 1
+            audio = await fetch()
+            if not audio:
+                # Don't cache failures
+                return audio
+            await asyncio.to_thread(self.disk.set, key, audio)
+        self.memory.set(key, audio)
+        return audio
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats(),
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.flight.shared
+        }
+
+
+class ElevenLabsBackend:
+    """
+    ElevenLabs voice cloning via the streaming endpoint. MP3 frames arrive as they are
+    synthesized and each decodes on its own, so the first chunk can play right away.
     """
-    def __init__(self, api_key: str = None):
+    name = "elevenlabs"
+
+    def __init__(self, api_key: str = None, clients: Optional[UpstreamClients] = None):
         self.api_key = api_key or os.getenv("ELEVENLABS_API_KEY")
-        self.base_url = "https://api.elevenlabs.io/v1"
+        self.clients = clients or upstream_clients
+        # Overridable for staging proxies and the benchmark's fake upstream (bench/fake_upstreams.py)
+        self.base_url = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1").rstrip("/")
+        self.output_format = os.getenv("ELEVENLABS_OUTPUT_FORMAT", "mp3_44100_128")
+        self.model_id = "eleven_multilingual_v2"
+        self.voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.75
+        }
 
-    async def generate_audio(self, text: str, voice_id: str) -> bytes:
-        """
-        Generates audio for the given text using the specific voice_id.
-        Returns raw audio bytes (MP3).
-        """
-        if not self.api_key:
-             print("Warning: Missing ELEVENLABS_API_KEY")
-             return b""
+    @property
+    def ready(self) -> bool:
+        return bool(self.api_key)
 
-        url = f"{self.base_url}/text-to-speech/{voice_id}"
-        
+    async def stream(self, text: str, voice_id: str) -> AsyncIterator[bytes]:
+        client = self.clients.http("elevenlabs")
         headers = {
             "xi-api-key": self.api_key,
             "Content-Type": "application/json"
         }
-        
         payload = {
             "text": text,
-            "model_id": "eleven_multilingual_v2",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.75
-            }
+            "model_id": self.model_id,
+            "voice_settings": self.voice_settings
         }
 
-        async with httpx.AsyncClient() as client:
+        async def send():
+            request = client.build_request(
+                "POST",
+                f"{self.base_url}/text-to-speech/{voice_id}/stream",
+                params={"output_format": self.output_format},
+                json=payload,
+                headers=headers,
+                timeout=call_timeout(self.clients.timeouts["tts"])
+            )
+            response = await client.send(request, stream=True)
+            if response.status_code >= 400:
+                # Error bodies are small; reading one hands the connection back to the pool
+                await response.aread()
+            return response
+
+        # ElevenLabs limits concurrent requests per account; a stream holds its slot until it ends
+        async with governors.slot("elevenlabs"):
+            # Retries only happen before the first byte; a stream that breaks midway is not replayed
+            response = await retry_async(send, attempts=self.clients.max_retries + 1)
             try:
-                response = await client.post(url, json=payload, headers=headers)
                 response.raise_for_status()
-                return response.content
-            except Exception as e:
-                print(f"TTS Error: {e}")
-                return b""
+                if self.output_format.startswith("pcm_"):
+                    # Raw PCM: give it a container so the chunks still concatenate into a playable file
+                    yield wav_header(int(self.output_format.split("_")[1]))
+                async for chunk in response.aiter_bytes():
+                    if chunk:
+                        yield chunk
+            finally:
+                await response.aclose()
+
+    async def clone_voice(self, name: str, samples: List[Tuple[str, bytes]]) -> str:
+        if not self.api_key:
+            raise RuntimeError("Missing ELEVENLABS_API_KEY")
+
+        client = self.clients.http("elevenlabs")
+        async with governors.slot("elevenlabs"):
+            response = await client.post(
+                f"{self.base_url}/voices/add",
+                headers={"xi-api-key": self.api_key},
+                data={"name": name},
+                files=[("files", (filename, audio)) for filename, audio in samples],
+                # Uploading several samples takes longer than a single TTS call
+                timeout=self.clients.timeouts["tts"] * 3
+            )
+        response.raise_for_status()
+        return response.json()["voice_id"]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "output_format": self.output_format}
+
+
+class XTTSBackend:
+    """
+    On-box XTTS v2 (Coqui) on CPU, no per-character cost.
+    The model is loaded and warmed once by start(). Speaker conditioning is computed once
+    per voice (clone_voice) and kept in memory and in XTTS_VOICES_DIR; voices that were
+    never cloned locally use the studio speaker XTTS_DEFAULT_SPEAKER.
+    Audio streams as 16-bit PCM in a WAV container, a chunk every few hundred ms of speech.
+    """
+    name = "local"
+    model_id = "xtts_v2"
+    sample_rate = 24000
+
+    def __init__(self, model: Any = None):
+        self.model_dir = os.getenv("XTTS_MODEL_DIR", "backend/models/xtts_v2")
+        self.voices_dir = os.getenv("XTTS_VOICES_DIR", "backend/cache/xtts_voices")
+        self.language = os.getenv("XTTS_LANGUAGE", "en")
+        self.default_speaker = os.getenv("XTTS_DEFAULT_SPEAKER", "Ana Florence")
+        self.workers = int(os.getenv("XTTS_WORKERS", "1"))
+        self.threads = int(os.getenv("XTTS_THREADS", "4"))
+        self.queue_limit = int(os.getenv("XTTS_QUEUE_LIMIT", "16"))
+        self.stream_chunk_size = int(os.getenv("XTTS_STREAM_CHUNK_SIZE", "20"))
+        self.voice_settings = {"language": self.language, "speaker": self.default_speaker}
+
+        self.model = model
+        self.speakers = LRUCache(maxsize=int(os.getenv("XTTS_VOICE_CACHE_ITEMS", "256")))
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.rejected = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.model is not None
+
+    async def start(self):
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="tts")
+        if self.model is None:
+            if Xtts is None:
+                raise RuntimeError("coqui-tts is not installed")
+            self.model = await self._run(self._load)
+            # The first inference allocates buffers; pay for it before the first user does
+            chunks = await self._run(self._open_stream, "Hello.", "")
+            while await self._run(self._next_chunk, chunks) is not None:
+                pass
+            print(f"Local TTS ready: {self.model_id} ({self.workers} workers)")
+
+    async def shutdown(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await asyncio.to_thread(pool.shutdown, wait=True, cancel_futures=True)
+
+    def _load(self):
+        torch.set_num_threads(self.threads)
+        config = XttsConfig()
+        config.load_json(os.path.join(self.model_dir, "config.json"))
+        model = Xtts.init_from_config(config)
+        model.load_checkpoint(config, checkpoint_dir=self.model_dir, use_deepspeed=False)
+        model.eval()
+        return model
+
+    async def _run(self, fn, *args):
+        if self._pool is None:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def _voice_path(self, voice_id: str) -> str:
+        return os.path.join(self.voices_dir, hashlib.sha256(voice_id.encode("utf-8")).hexdigest() + ".pt")
+
+    def _speaker(self, voice_id: str) -> Tuple[Any, Any]:
+        """
+        (gpt_cond_latent, speaker_embedding) for a voice.
+        """
+        speaker = self.speakers.get(voice_id)
+        if speaker is None:
+            path = self._voice_path(voice_id)
+            if voice_id and os.path.exists(path):
+                data = torch.load(path)
+            else:
+                data = self.model.speaker_manager.speakers[self.default_speaker]
+            speaker = (data["gpt_cond_latent"], data["speaker_embedding"])
+            self.speakers.set(voice_id, speaker)
+        return speaker
+
+    def _add_voice(self, voice_id: str, samples: List[Tuple[str, bytes]]):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = []
+            for i, (filename, audio) in enumerate(samples):
+                path = os.path.join(tmp, f"{i}{os.path.splitext(filename)[1] or '.wav'}")
+                with open(path, "wb") as f:
+                    f.write(audio)
+                paths.append(path)
+            gpt_cond_latent, speaker_embedding = self.model.get_conditioning_latents(audio_path=paths)
+        os.makedirs(self.voices_dir, exist_ok=True)
+        torch.save({"gpt_cond_latent": gpt_cond_latent, "speaker_embedding": speaker_embedding}, self._voice_path(voice_id))
+        self.speakers.set(voice_id, (gpt_cond_latent, speaker_embedding))
+
+    async def clone_voice(self, name: str, samples: List[Tuple[str, bytes]], voice_id: Optional[str] = None) -> str:
+        """
+        Computes the speaker conditioning once. voice_id: reuse an id from another
+        provider so one id works with both backends.
+        """
+        if voice_id is None:
+            voice_id = "local-" + hashlib.sha256(b"".join(audio for _, audio in samples)).hexdigest()[:24]
+        await self._run(self._add_voice, voice_id, samples)
+        return voice_id
+
+    def _open_stream(self, text: str, voice_id: str):
+        gpt_cond_latent, speaker_embedding = self._speaker(voice_id)
+        return self.model.inference_stream(
+            text,
+            self.language,
+            gpt_cond_latent,
+            speaker_embedding,
+            stream_chunk_size=self.stream_chunk_size,
+            enable_text_splitting=False
+        )
+
+    @staticmethod
+    def _next_chunk(chunks) -> Optional[bytes]:
+        chunk = next(chunks, None)
+        if chunk is None:
+            return None
+        samples = np.clip(chunk.detach().cpu().numpy(), -1.0, 1.0)
+        return (samples * 32767).astype("<i2").tobytes()
+
+    async def stream(self, text: str, voice_id: str) -> AsyncIterator[bytes]:
+        if self._pending >= self.queue_limit:
+            self.rejected += 1
+            raise ExecutorBusy("tts")
+        self._pending += 1
+        try:
+            # The generator is advanced one chunk per pool task, so concurrent requests interleave
+            chunks = await self._run(self._open_stream, text, voice_id)
+            yield wav_header(self.sample_rate)
+            while (chunk := await self._run(self._next_chunk, chunks)) is not None:
+                yield chunk
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "pending": self._pending,
+            "rejected": self.rejected,
+            "voices": self.speakers.stats()
+        }
+
+
+class TextToSpeechService:
+    """
+    Service for converting Text to Audio (TTS).
+    Backends: ElevenLabs voice cloning ('elevenlabs') and on-box XTTS ('local'), chosen
+    per mode like STT (TTS_BACKEND default, TTS_BACKEND_BY_MODE overrides). Both stream:
+    stream_audio yields chunks that concatenate into one playable file (MP3 or WAV);
+    generate_audio returns the whole file. A failing backend fails over to the next ready
+    one in TTS_FAILOVER (streams only until their first chunk).
+    """
+    def __init__(
+        self,
+        api_key: str = None,
+        cache: Optional[TTSCache] = None,
+        clients: Optional[UpstreamClients] = None,
+        backends: Optional[Dict[str, Any]] = None
+    ):
+        self.backends = backends if backends is not None else {
+            "elevenlabs": ElevenLabsBackend(api_key, clients),
+            "local": XTTSBackend()
+        }
+        self.default_backend = os.getenv("TTS_BACKEND", "elevenlabs")
+        self.routes = parse_mode_map(os.getenv("TTS_BACKEND_BY_MODE", ""))
+        self.failover = [name.strip() for name in os.getenv("TTS_FAILOVER", "elevenlabs,local").split(",") if name.strip()]
+        self.policy = CallPolicy("tts", timeout=(clients or upstream_clients).timeouts["tts"])
+        self.cache = cache or TTSCache(
+            directory=os.getenv("TTS_CACHE_DIR", "backend/cache/tts"),
+            memory_items=int(os.getenv("TTS_CACHE_MEMORY_ITEMS", "256")),
+            disk_bytes=int(os.getenv("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024
+        )
+
+    def backend(self):
+        """
+        The backend for the current request's mode (see metrics.bind_mode).
+        Falls back to ElevenLabs while the local model is not loaded.
+        """
+        backend = self.backends.get(self.routes.get(mode_var.get(), self.default_backend))
+        if backend is None or not backend.ready:
+            backend = self.backends["elevenlabs"]
+        return backend
+
+    def candidates(self) -> List[str]:
+        """
+        Ready backends in the order they are tried: backend() first, then TTS_FAILOVER.
+        """
+        primary = self.backend().name
+        names = [primary] + [name for name in self.failover if name != primary]
+        return [name for name in names if name in self.backends and self.backends[name].ready]
+
+    @property
+    def model_id(self) -> str:
+        return self.backend().model_id
+
+    @property
+    def voice_settings(self) -> dict:
+        return self.backend().voice_settings
+
+    def _backend_names(self) -> set:
+        return {self.default_backend, *self.routes.values()}
+
+    async def start(self):
+        """
+        Loads the local model if any mode uses it (called by the FastAPI lifespan).
+        """
+        for name in self._backend_names():
+            backend = self.backends.get(name)
+            if backend is not None and hasattr(backend, "start"):
+                try:
+                    await backend.start()
+                except Exception as e:
+                    print(f"TTS backend '{name}' unavailable, falling back to ElevenLabs: {e}")
+
+    async def shutdown(self):
+        for backend in self.backends.values():
+            if hasattr(backend, "shutdown"):
+                await backend.shutdown()
+
+    def _check_ready(self, backend) -> bool:
+        if not backend.ready:
+            print("Warning: Missing ELEVENLABS_API_KEY")
+        return backend.ready
+
+    def _key(self, name: str, text: str, voice_id: str) -> str:
+        backend = self.backends[name]
+        return TTSCache.make_key(text, voice_id, backend.model_id, backend.voice_settings)
+
+    async def generate_audio(self, text: str, voice_id: str) -> bytes:
+        """
+        Generates audio for the given text using the specific voice_id.
+        Returns the whole file (MP3 or WAV). Repeated phrases are served from the cache.
+        """
+        names = self.candidates()
+        if not names:
+            self._check_ready(self.backend())
+            return b""
+
+        try:
+            with stage("tts", backend=names[0]):
+                # Hedging happens inside the cache fetch, so concurrent misses still share one call
+                return await self.policy.run(names, lambda name: self.cache.get_or_fetch(
+                    self._key(name, text, voice_id),
+                    lambda: self.policy.hedged(name, lambda: self._fetch_audio(text, voice_id, name))
+                ), hedge=False)
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            record_fallback("tts", "no_audio")
+            return b""
+
+    async def _fetch_audio(self, text: str, voice_id: str, backend_name: str) -> bytes:
+        audio = await self._request_audio(text, voice_id, backend_name)
+        if not audio:
+            raise RuntimeError(f"TTS backend '{backend_name}' returned no audio")
+        return audio
+
+    async def _request_audio(self, text: str, voice_id: str, backend_name: Optional[str] = None) -> bytes:
+        backend = self.backends[backend_name] if backend_name else self.backend()
+        try:
+            return finalize_wav(b"".join([chunk async for chunk in backend.stream(text, voice_id)]))
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            record_upstream_error(backend.name, e)
+            return b""
+
+    async def _open_stream(self, name: str, text: str, voice_id: str) -> Tuple[AsyncIterator[bytes], bytes]:
+        """
+        Starts a backend stream and waits for its first chunk (the point of no failover).
+        """
+        stream = self.backends[name].stream(text, voice_id)
+        try:
+            return stream, await stream.__anext__()
+        except BaseException:
+            await stream.aclose()
+            raise
+
+    async def stream_audio(self, text: str, voice_id: str) -> AsyncIterator[bytes]:
+        """
+        Yields audio chunks as they are synthesized; cached phrases arrive as one chunk.
+        A stream that completes is cached for generate_audio/stream_audio.
+        A failure before the first chunk fails over (or yields nothing); a later one ends the stream early.
+        """
+        names = self.candidates()
+        if not names:
+            self._check_ready(self.backend())
+            return
+
+        cached = await self.cache.get(self._key(names[0], text, voice_id))
+        if cached is not None:
+            yield cached
+            return
+
+        # Timed by hand: stage() keeps a span context var, which must not stay set across yields
+        mode = mode_var.get()
+        started = time.perf_counter()
+        parts: List[bytes] = []
+        self.cache.upstream_calls += 1
+        name = names[0]
+        try:
+            opened = {}
+            async def attempt(candidate):
+                opened[candidate] = await self._open_stream(candidate, text, voice_id)
+                return candidate
+            name = await self.policy.run(names, attempt, hedge=False)
+            stream, first = opened[name]
+            stage_seconds.observe(time.perf_counter() - started, stage="tts_first_chunk", mode=mode)
+            parts.append(first)
+            yield first
+            async for chunk in stream:
+                parts.append(chunk)
+                yield chunk
+        except ExecutorBusy:
+            raise
+        except Exception as e:
+            print(f"TTS Error: {e}")
+            record_upstream_error(name, e)
+            record_fallback("tts", "truncated_audio" if parts else "no_audio")
+            return
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, stage="tts", mode=mode)
+        if parts:
+            await self.cache.set(self._key(name, text, voice_id), finalize_wav(b"".join(parts)))
+
+    async def clone_voice(self, name: str, samples: List[Tuple[str, bytes]]) -> str:
+        """
+        Registers a voice clone from reference samples on the backends in use.
+        samples: [(filename, audio bytes), ...]. Returns the voice_id (shared by both
+        backends when both are in use). Raises on failure (called from background
+        enrollment, not the hot path).
+        """
+        names = self._backend_names()
+        local = self.backends.get("local")
+        use_local = "local" in names and local is not None and local.ready
+        voice_id = None
+        if not use_local or names - {"local"}:
+            voice_id = await self.backends["elevenlabs"].clone_voice(name, samples)
+        if use_local:
+            voice_id = await local.clone_voice(name, samples, voice_id)
+        return voice_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": self.default_backend,
+            "by_mode": self.routes,
+            "failover": self.failover,
+            "policy": self.policy.stats(),
+            "backends": {name: backend.stats() for name, backend in self.backends.items()}
+        }
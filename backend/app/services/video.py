@@ -1,8 +1,12 @@
-import subprocess
+import asyncio
+import hashlib
 import os
-import uuid
-import base64
-import tempfile
+import time
+from typing import Dict, Optional
+from app.core.audio import AudioInput, as_audio_bytes
+from app.core.cache import SingleFlight
+from app.core.executor import TaskExecutor, executor as default_executor
+from app.core.workers import file_lock
 
 class VideoService:
     """
@@ -10,14 +14,34 @@ class VideoService:
     Handles replacing audio tracks in video templates.
     """
     
-    def __init__(self, static_dir: str = "backend/static"):
+    def __init__(
+        self,
+        static_dir: str = "backend/static",
+        executor: Optional[TaskExecutor] = None,
+        templates_dir: Optional[str] = None
+    ):
         self.static_dir = static_dir
+        self.executor = executor or default_executor
         self.clips_dir = os.path.join(static_dir, "clips")
         self.outputs_dir = os.path.join(static_dir, "outputs")
+        # Video-only copies of each clip (not public, unlike /static)
+        self.templates_dir = templates_dir or os.getenv("CLIP_TEMPLATES_DIR", "backend/cache/clip_templates")
+        self.templates: Dict[str, dict] = {}
+        self.probe_timeout = float(os.getenv("FFPROBE_TIMEOUT", "15"))
+
+        # Output eviction policy
+        self.outputs_max_bytes = int(os.getenv("MAGIC_OUTPUTS_MAX_MB", "2048")) * 1024 * 1024
+        self.outputs_max_age = float(os.getenv("MAGIC_OUTPUTS_MAX_AGE_HOURS", "72")) * 3600
+        self.evict_interval = float(os.getenv("MAGIC_OUTPUTS_EVICT_INTERVAL", "600"))
+
+        self.renders = SingleFlight()
+        self.render_hits = 0
+        self.render_misses = 0
         
         # Ensure directories exist
         os.makedirs(self.clips_dir, exist_ok=True)
         os.makedirs(self.outputs_dir, exist_ok=True)
+        os.makedirs(self.templates_dir, exist_ok=True)
 
     def get_clips(self):
         """
@@ -43,50 +67,206 @@ class VideoService:
         
         return available
 
-    async def swap_audio(self, clip_filename: str, audio_data_b64: str) -> str:
+    async def prepare_templates(self):
+        """
+        Ingest step (run at startup): demuxes every clip into a video-only stream and
+        probes its duration, so each render only has to mux in the new audio.
+        Templates are rebuilt when the source clip changes. With several workers, one
+        builds while the others wait, then find the templates fresh.
+        """
+        async with file_lock(os.path.join(self.templates_dir, ".lock")):
+            for clip in self.get_clips():
+                try:
+                    await self._prepare_template(clip['filename'])
+                except Exception as e:
+                    # Renders fall back to the original clip
+                    print(f"Template Error ({clip['filename']}): {e}")
+
+    async def _prepare_template(self, filename: str):
+        source = os.path.join(self.clips_dir, filename)
+        template = os.path.join(self.templates_dir, filename)
+        source_mtime = os.path.getmtime(source)
+
+        if not os.path.exists(template) or os.path.getmtime(template) < source_mtime:
+            # Write under a temp name: a partial template (process killed mid-write) would look fresh
+            root, ext = os.path.splitext(template)
+            temp_path = f"{root}.{os.getpid()}.tmp{ext}"
+            try:
+                returncode, stderr = await self.executor.run_subprocess("ffmpeg_template", [
+                    "ffmpeg",
+                    "-i", source,
+                    "-map", "0:v:0",
+                    "-c:v", "copy",
+                    "-an",
+                    "-movflags", "+faststart",
+                    "-y",
+                    temp_path
+                ])
+                if returncode != 0:
+                    raise RuntimeError(stderr.decode(errors='replace')[-500:])
+                os.replace(temp_path, template)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        self.templates[filename] = {
+            "path": template,
+            "source_mtime": source_mtime,
+            "duration": await self._probe_duration(template)
+        }
+
+    async def _probe_duration(self, path: str) -> Optional[float]:
+        # Through the ffmpeg pool like the demux; a hung ffprobe must not hold the template lock
+        try:
+            returncode, stdout, _ = await asyncio.wait_for(
+                self.executor.run_subprocess_output("ffprobe", [
+                    "ffprobe", "-v", "error",
+                    "-show_entries", "format=duration",
+                    "-of", "default=noprint_wrappers=1:nokey=1",
+                    path
+                ], timeout=self.probe_timeout),
+                timeout=self.probe_timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"FFprobe Timeout: {path}")
+            return None
+        if returncode != 0:
+            return None
+        try:
+            return float(stdout.strip())
+        except ValueError:
+            return None
+
+    def render_key(self, clip_filename: str, audio_bytes) -> str:
+        """
+        Renders are content-addressed: same clip version + same audio -> same output file.
         """
-        Replaces audio in the video clip with the provided base64 audio.
+        source_mtime = os.path.getmtime(os.path.join(self.clips_dir, clip_filename))
+        digest = hashlib.sha256()
+        digest.update(f"{clip_filename}:{source_mtime}:".encode("utf-8"))
+        digest.update(audio_bytes)
+        return digest.hexdigest()[:32]
+
+    async def swap_audio(self, clip_filename: str, audio_data: AudioInput) -> str:
+        """
+        Replaces audio in the video clip with the provided audio (base64 string or raw bytes).
         Returns the path to the output video (relative to static root).
+        A repeated (clip, audio) pair returns the existing render without running ffmpeg.
         """
         input_video = os.path.join(self.clips_dir, clip_filename)
-        if not os.path.exists(input_video):
+        if os.path.basename(clip_filename) != clip_filename or not os.path.exists(input_video):
             raise FileNotFoundError(f"Clip {clip_filename} not found")
 
-        # Create temp file for new audio
-        audio_bytes = base64.b64decode(audio_data_b64)
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_audio:
-            temp_audio.write(audio_bytes)
-            temp_audio_path = temp_audio.name
+        audio_bytes = as_audio_bytes(audio_data)
 
-        # Generate output filename
-        output_filename = f"magic_{uuid.uuid4().hex}.mp4"
+        output_filename = f"magic_{self.render_key(clip_filename, audio_bytes)}.mp4"
         output_path = os.path.join(self.outputs_dir, output_filename)
 
+        try:
+            os.utime(output_path) # Keep popular renders from being evicted
+            self.render_hits += 1
+            return f"/static/outputs/{output_filename}"
+        except FileNotFoundError:
+            pass # Not rendered yet, or just evicted (by another worker or the startup eviction)
+
+        self.render_misses += 1
+        await self.renders.do(output_filename, lambda: self._render(clip_filename, audio_bytes, output_path))
+        return f"/static/outputs/{output_filename}"
+
+    async def _render(self, clip_filename: str, audio_bytes, output_path: str):
+        # Prefer the pre-demuxed video-only template if it is still current
+        input_video = os.path.join(self.clips_dir, clip_filename)
+        template = self.templates.get(clip_filename)
+        if template and template["source_mtime"] == os.path.getmtime(input_video):
+            input_video = template["path"]
+
+        # Write under a temp name so a half-written file is never served as a cache hit
+        temp_path = f"{output_path}.{os.getpid()}.tmp.mp4"
+
         # FFmpeg command: Replace audio
+        # -i pipe:0: Read the new audio from stdin (no temp file)
         # -c:v copy: Don't re-encode video (fast!)
         # -map 0:v:0: Use video from file 0
         # -map 1:a:0: Use audio from file 1
         # -shortest: Stop when the shortest stream ends (usually audio if it's shorter)
+        # -movflags +faststart: moov atom first, so playback can start before download ends
         # -y: Overwrite output
         cmd = [
             "ffmpeg",
             "-i", input_video,
-            "-i", temp_audio_path,
+            "-i", "pipe:0",
             "-c:v", "copy",
             "-c:a", "aac",
             "-map", "0:v:0",
             "-map", "1:a:0",
             "-shortest",
+            "-movflags", "+faststart",
             "-y",
-            output_path
+            temp_path
         ]
 
         try:
-            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-            return f"/static/outputs/{output_filename}"
-        except subprocess.CalledProcessError as e:
-            print(f"FFmpeg Error: {e}")
-            raise RuntimeError("Video processing failed")
+            # Runs as an asyncio subprocess so a render never blocks the event loop
+            returncode, stderr = await self.executor.run_subprocess("ffmpeg", cmd, input=bytes(audio_bytes))
+            if returncode != 0:
+                print(f"FFmpeg Error: {stderr.decode(errors='replace')[-500:]}")
+                raise RuntimeError("Video processing failed")
+            os.replace(temp_path, output_path)
         finally:
-            if os.path.exists(temp_audio_path):
-                os.remove(temp_audio_path)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def evict_outputs(self):
+        """
+        Deletes renders older than outputs_max_age, then the least recently used
+        ones until the directory fits in outputs_max_bytes.
+        """
+        now = time.time()
+        outputs = []
+        for name in os.listdir(self.outputs_dir):
+            if not (name.startswith("magic_") and name.endswith(".mp4")) or name.endswith(".tmp.mp4"):
+                continue
+            path = os.path.join(self.outputs_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.outputs_max_age:
+                self._remove(path)
+            else:
+                outputs.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in outputs)
+        for _, size, path in sorted(outputs):
+            if total <= self.outputs_max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    async def run_eviction(self):
+        """
+        Runs evict_outputs every evict_interval seconds after the startup pass (started
+        by the FastAPI lifespan), so a render doesn't pay for a scan of the outputs directory.
+        """
+        while True:
+            await asyncio.sleep(self.evict_interval)
+            try:
+                await asyncio.to_thread(self.evict_outputs)
+            except Exception as e:
+                print(f"Output Eviction Error: {e}")
+
+    @staticmethod
+    def _remove(path: str):
+        # Other workers evict the same directory
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "templates": len(self.templates),
+            "render_hits": self.render_hits,
+            "render_misses": self.render_misses,
+            "coalesced": self.renders.shared
+        }
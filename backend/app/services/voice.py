@@ -0,0 +1,103 @@
+import asyncio
+import io
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+import soundfile as sf
+from sqlmodel import Session, select
+from app.core.cache import LRUCache
+from app.core.database import engine
+from app.models.voice import VoiceProfile
+from app.services.tts import TextToSpeechService
+
+DEFAULT_VOICE_ID = "21m00Tcm4TlvDq8ikWAM" # Example ID (Rachel), used until a user has a clone
+
+class VoiceRegistry:
+    """
+    Maps users to their cloned provider voice_id.
+    Read-through cache in front of the VoiceProfile table: the hot path touches the DB
+    once per user every `ttl` seconds. Enrollment updates this worker's cache when it
+    completes; other workers pick the new clone up when their entry expires.
+    """
+    def __init__(
+        self,
+        tts_service: TextToSpeechService,
+        max_users: int = 10000,
+        db_engine=None,
+        ttl: Optional[float] = None
+    ):
+        self.tts_service = tts_service
+        self.engine = db_engine or engine
+        self.cache = LRUCache(maxsize=max_users, ttl=ttl or float(os.getenv("VOICE_CACHE_TTL", "60")))
+
+    async def get_voice_id(self, user_id: Optional[int]) -> str:
+        if user_id is None:
+            return DEFAULT_VOICE_ID
+        voice_id = self.cache.get(user_id)
+        if voice_id is None:
+            voice_id = await asyncio.to_thread(self._load_voice_id, user_id)
+            # Users without a clone are cached too (negative caching)
+            self.cache.set(user_id, voice_id)
+        return voice_id
+
+    def _load_voice_id(self, user_id: int) -> str:
+        with Session(self.engine) as session:
+            profile = session.exec(select(VoiceProfile).where(VoiceProfile.user_id == user_id)).first()
+        if profile and profile.provider_voice_id:
+            return profile.provider_voice_id
+        return DEFAULT_VOICE_ID
+
+    def start_enrollment(self, session: Session, user_id: int, samples: List[Tuple[str, bytes]]) -> VoiceProfile:
+        """
+        Creates (or resets) the user's profile as 'pending' with sample metadata.
+        The actual clone is registered by enroll() in the background.
+        A previous clone keeps serving until the new one is ready.
+        """
+        profile = session.exec(select(VoiceProfile).where(VoiceProfile.user_id == user_id)).first()
+        if profile is None:
+            profile = VoiceProfile(user_id=user_id)
+
+        profile.status = "pending"
+        profile.error = None
+        profile.sample_count = len(samples)
+        profile.sample_bytes = sum(len(audio) for _, audio in samples)
+        profile.sample_seconds = round(sum(sample_duration(audio) for _, audio in samples), 2)
+        profile.updated_at = datetime.now()
+
+        session.add(profile)
+        session.commit()
+        session.refresh(profile)
+        return profile
+
+    async def enroll(self, user_id: int, name: str, samples: List[Tuple[str, bytes]]):
+        """
+        Background job: registers the clone with the provider, then stores the result.
+        """
+        try:
+            voice_id = await self.tts_service.clone_voice(name, samples)
+            await asyncio.to_thread(self._finish_enrollment, user_id, voice_id, None)
+            self.cache.set(user_id, voice_id)
+        except Exception as e:
+            print(f"Voice Enrollment Error: {e}")
+            await asyncio.to_thread(self._finish_enrollment, user_id, None, str(e))
+
+    def _finish_enrollment(self, user_id: int, voice_id: Optional[str], error: Optional[str]):
+        with Session(self.engine) as session:
+            profile = session.exec(select(VoiceProfile).where(VoiceProfile.user_id == user_id)).first()
+            if profile is None:
+                return
+            if voice_id:
+                profile.provider_voice_id = voice_id
+                profile.status = "ready"
+            else:
+                profile.status = "failed"
+                profile.error = error
+            profile.updated_at = datetime.now()
+            session.add(profile)
+            session.commit()
+
+def sample_duration(audio: bytes) -> float:
+    try:
+        return sf.info(io.BytesIO(audio)).duration
+    except Exception:
+        return 0.0
@@ -0,0 +1,171 @@
+"""
+Helpers shared by the benchmark scripts: statistics, synthetic audio, result files.
+"""
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import soundfile as sf
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values, dtype=np.float64), q))
+
+
+def summarize_ms(samples: Sequence[float]) -> Dict[str, float]:
+    """
+    samples in seconds -> latency summary in milliseconds.
+    """
+    ms = [s * 1000 for s in samples]
+    if not ms:
+        return {"count": 0}
+    return {
+        "count": len(ms),
+        "mean": round(sum(ms) / len(ms), 3),
+        "min": round(min(ms), 3),
+        "p50": round(percentile(ms, 50), 3),
+        "p95": round(percentile(ms, 95), 3),
+        "p99": round(percentile(ms, 99), 3),
+        "max": round(max(ms), 3)
+    }
+
+
+def speech_like_wav(seconds: float, rate: int = 16000, base_freq: float = 140.0, seed: int = 0) -> bytes:
+    """
+    A voiced signal with a gliding pitch and syllable-like pauses, so pitch
+    analysis does realistic work (Praat finds voiced frames and unvoiced gaps).
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    freq = base_freq * (1 + 0.25 * np.sin(2 * np.pi * 0.7 * t + rng.uniform(0, np.pi)))
+    phase = 2 * np.pi * np.cumsum(freq) / rate
+    voice = sum(np.sin(k * phase) / k for k in range(1, 5))
+    syllables = (np.sin(2 * np.pi * 3.0 * t) > -0.6).astype(np.float64)
+    signal = 0.3 * voice * syllables + 0.003 * rng.standard_normal(t.size)
+    buffer = io.BytesIO()
+    sf.write(buffer, signal, rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_metadata(config: dict) -> dict:
+    return {
+        "commit": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": config
+    }
+
+
+def write_results(results: dict, path: Optional[str]):
+    text = json.dumps(results, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Results written to {path}")
+    else:
+        print(text)
+
+
+def parse_histograms(text: str, name: str) -> Dict[tuple, dict]:
+    """
+    Reads one histogram family from a Prometheus text exposition:
+    {labels (sorted tuple, without le): {"buckets": [(le, cumulative)], "count", "sum"}}.
+    """
+    families: Dict[tuple, dict] = {}
+    for line in text.splitlines():
+        if not line.startswith(name + "_"):
+            continue
+        metric, _, value = line.rpartition(" ")
+        suffix, _, raw_labels = metric[len(name) + 1:].partition("{")
+        labels = dict(_parse_labels(raw_labels.rstrip("}")))
+        le = labels.pop("le", None)
+        entry = families.setdefault(tuple(sorted(labels.items())), {"buckets": [], "count": 0, "sum": 0.0})
+        if suffix == "bucket":
+            entry["buckets"].append((math.inf if le == "+Inf" else float(le), float(value)))
+        elif suffix == "count":
+            entry["count"] = float(value)
+        elif suffix == "sum":
+            entry["sum"] = float(value)
+    return families
+
+
+def _parse_labels(raw: str) -> List[tuple]:
+    pairs, i = [], 0
+    while i < len(raw):
+        eq = raw.index("=", i)
+        key = raw[i:eq]
+        j, value = eq + 2, []
+        while raw[j] != '"':
+            if raw[j] == "\\":
+                j += 1
+                value.append({"n": "\n"}.get(raw[j], raw[j]))
+            else:
+                value.append(raw[j])
+            j += 1
+        pairs.append((key, "".join(value)))
+        i = j + 2  # closing quote and comma
+    return pairs
+
+
+def histogram_delta(before: dict, after: dict) -> Dict[tuple, dict]:
+    """
+    Per-label count / mean / p95 of what was observed between two scrapes.
+    p95 is interpolated within the bucket, as Prometheus' histogram_quantile does.
+    """
+    deltas = {}
+    for labels, entry in after.items():
+        base = before.get(labels, {"buckets": [], "count": 0, "sum": 0.0})
+        count = entry["count"] - base["count"]
+        if count <= 0:
+            continue
+        base_buckets = dict(base["buckets"])
+        buckets = [(le, cumulative - base_buckets.get(le, 0.0)) for le, cumulative in entry["buckets"]]
+        deltas[labels] = {
+            "count": int(count),
+            "mean_ms": round((entry["sum"] - base["sum"]) / count * 1000, 3),
+            "p95_ms": round(_bucket_quantile(buckets, 0.95) * 1000, 3)
+        }
+    return deltas
+
+
+def _bucket_quantile(buckets: List[tuple], q: float) -> float:
+    total = buckets[-1][1] if buckets else 0
+    if not total:
+        return 0.0
+    rank, lower, previous = q * total, 0.0, 0.0
+    for le, cumulative in buckets:
+        if cumulative >= rank:
+            if math.isinf(le):
+                return lower
+            width = cumulative - previous
+            return lower + (le - lower) * ((rank - previous) / width if width else 0.0)
+        lower, previous = le, cumulative
+    return lower
+
+
+def add_backend_to_path():
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
@@ -0,0 +1,76 @@
+"""
+Compares two benchmark result files (load.py or micro.py output, e.g. from the
+base and head commits) and exits non-zero if anything regressed past the threshold.
+
+    python backend/bench/compare.py base.json head.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Iterator, Optional, Tuple
+
+# (metric, higher is better)
+LOAD_METRICS = [("latency_ms.p50", False), ("latency_ms.p95", False), ("latency_ms.p99", False), ("rps", True), ("error_rate", False)]
+MICRO_METRICS = [("p50", False), ("p95", False)]
+# Error rates are compared in absolute points, not percent of a tiny number
+ERROR_RATE_SLACK = 0.01
+
+
+def lookup(data: dict, path: str) -> Optional[float]:
+    for key in path.split("."):
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def comparisons(base: dict, head: dict) -> Iterator[Tuple[str, str, float, float, bool]]:
+    if base.get("kind") != head.get("kind"):
+        raise SystemExit(f"Cannot compare a {base.get('kind')} run with a {head.get('kind')} run")
+    if head.get("kind") == "load":
+        for name, scenario in head["scenarios"].items():
+            for metric, higher_is_better in LOAD_METRICS:
+                yield name, metric, lookup(base["scenarios"].get(name, {}), metric), lookup(scenario, metric), higher_is_better
+    else:
+        for benchmark, cases in head["benchmarks"].items():
+            for case, stats in cases.items():
+                for metric, higher_is_better in MICRO_METRICS:
+                    base_stats = base["benchmarks"].get(benchmark, {}).get(case)
+                    yield f"{benchmark} {case}", metric, lookup(base_stats or {}, metric), lookup(stats if isinstance(stats, dict) else {}, metric), higher_is_better
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed regression in percent")
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+
+    print(f"base {base.get('commit')} ({base.get('timestamp')}) -> head {head.get('commit')} ({head.get('timestamp')})")
+    regressions = 0
+    for case, metric, old, new, higher_is_better in comparisons(base, head):
+        if old is None or new is None:
+            continue
+        if metric == "error_rate":
+            regressed = new - old > ERROR_RATE_SLACK
+            change = f"{(new - old) * 100:+.2f} pts"
+        else:
+            delta = (new - old) / old * 100 if old else 0.0
+            regressed = (-delta if higher_is_better else delta) > args.threshold
+            change = f"{delta:+.1f}%"
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{case:<28} {metric:<16} {old:>12} -> {new:<12} {change:>10}{flag}")
+
+    if regressions:
+        print(f"{regressions} regression(s) over {args.threshold}%")
+        sys.exit(1)
+    print("No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Local stand-ins for the OpenAI (Whisper, chat completions) and ElevenLabs APIs,
+with configurable latency and error distributions. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:PORT/v1 and ELEVENLABS_BASE_URL=http://127.0.0.1:PORT/v1.
+
+Usage:
+    python backend/bench/fake_upstreams.py --port 8766 \\
+        --profile stt=300:900:0.01 --profile llm=600:2000 --profile tts=400:1200:0.02
+
+A profile is service=median_ms[:p99_ms[:error_rate]]; latency is log-normal.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from typing import Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+sys.path.insert(0, os.path.dirname(__file__))
+from common import speech_like_wav
+
+SERVICES = ("stt", "llm", "tts")
+DEFAULT_PROFILES = {"stt": "300:900", "llm": "600:2000", "tts": "400:1200"}
+
+# Sentences "heard" by the fake Whisper; --sentences bounds how many distinct ones (cache hit rate)
+SENTENCES = [
+    "I am think about quit my job.",
+    "She don't like the coffee here.",
+    "Can you tell me where is the station?",
+    "We was going to the cinema yesterday.",
+    "He have three brothers and one sister.",
+    "I want that you help me with this.",
+    "They is very happy about the results.",
+    "How much it costs to go to the airport?",
+    "I am agree with your opinion about it.",
+    "My friend and me went to the beach last weekend.",
+]
+
+
+class LatencyProfile:
+    def __init__(self, median_ms: float, p99_ms: float, error_rate: float = 0.0):
+        self.median = median_ms / 1000
+        # log-normal: p99 = median * exp(2.326 * sigma)
+        self.sigma = max(math.log(max(p99_ms, median_ms) / median_ms), 0.0) / 2.326 if median_ms > 0 else 0.0
+        self.error_rate = error_rate
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyProfile":
+        parts = [float(p) for p in spec.split(":")]
+        median = parts[0]
+        p99 = parts[1] if len(parts) > 1 else median
+        return cls(median, p99, parts[2] if len(parts) > 2 else 0.0)
+
+    async def wait(self) -> bool:
+        """
+        Sleeps for one latency sample. Returns False if this call should fail.
+        """
+        if self.median > 0:
+            await asyncio.sleep(random.lognormvariate(math.log(self.median), self.sigma))
+        return random.random() >= self.error_rate
+
+
+def error_response() -> JSONResponse:
+    # Mostly retryable failures, like the real APIs under load
+    status = random.choice([429, 500, 503])
+    return JSONResponse(status_code=status, content={"error": {"message": "fake upstream failure", "type": "server_error"}})
+
+
+def create_app(profiles: Dict[str, LatencyProfile], sentences: int = len(SENTENCES)) -> FastAPI:
+    app = FastAPI(title="EchoNative fake upstreams")
+    pool = SENTENCES[:max(1, min(sentences, len(SENTENCES)))]
+    audio_by_length: Dict[int, bytes] = {}
+    app.state.calls = {service: 0 for service in SERVICES}
+
+    def tts_audio(text: str) -> bytes:
+        # ~65 ms per character like natural speech, bucketed so synthesis is done once per length
+        seconds = min(max(round(len(text) * 0.065, 1), 0.5), 10.0)
+        key = int(seconds * 10)
+        if key not in audio_by_length:
+            audio_by_length[key] = speech_like_wav(seconds, rate=22050, base_freq=180.0, seed=key)
+        return audio_by_length[key]
+
+    def completion(content: str) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 50, "completion_tokens": 30, "total_tokens": 80}
+        }
+
+    def correction(text: str) -> dict:
+        corrected = text.replace(" think about quit", " thinking about quitting").replace(" don't", " doesn't")
+        return {"corrected": corrected, "explanation": "Fixed verb forms.", "diff": []}
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok", "calls": app.state.calls}
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(request: Request):
+        app.state.calls["stt"] += 1
+        await (await request.form())["file"].read()
+        if not await profiles["stt"].wait():
+            return error_response()
+        return {"text": random.choice(pool)}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.calls["llm"] += 1
+        body = await request.json()
+        system, user = body["messages"][0]["content"], body["messages"][-1]["content"]
+        if body.get("stream"):
+            return StreamingResponse(stream_chat(user), media_type="text/event-stream")
+        if not await profiles["llm"].wait():
+            return error_response()
+
+        if body.get("response_format", {}).get("type") == "json_object":
+            if '"results"' in system:
+                items = json.loads(user)
+                content = {"results": [{"id": item["id"], **correction(item["user_said"])} for item in items]}
+            else:
+                content = correction(user.rpartition("User said: ")[2])
+            return completion(json.dumps(content))
+        # Translation
+        return completion("I'd like a latte with oat milk, please.")
+
+    async def stream_chat(user: str):
+        text = correction(user.rpartition("User said: ")[2])["corrected"]
+        words = text.split(" ")
+        # Time to first token is most of the latency; the rest streams quickly
+        await profiles["llm"].wait()
+        for i, word in enumerate(words):
+            chunk = {
+                "id": "chatcmpl-stream", "object": "chat.completion.chunk", "created": int(time.time()), "model": "gpt-4o",
+                "choices": [{"index": 0, "delta": {"content": word + (" " if i < len(words) - 1 else "")}, "finish_reason": None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(0.01)
+        yield "data: [DONE]\n\n"
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        app.state.calls["tts"] += 1
+        body = await request.json()
+        if not await profiles["tts"].wait():
+            return error_response()
+        return Response(content=tts_audio(body["text"]), media_type="audio/mpeg")
+
+    @app.post("/v1/text-to-speech/{voice_id}/stream")
+    async def text_to_speech_stream(voice_id: str, request: Request):
+        app.state.calls["tts"] += 1
+        body = await request.json()
+        # Time to first byte is most of the latency; the audio then arrives in ~0.5 s chunks
+        if not await profiles["tts"].wait():
+            return error_response()
+        audio = tts_audio(body["text"])
+
+        async def chunks():
+            step = 22050
+            for start in range(0, len(audio), step):
+                yield audio[start:start + step]
+                await asyncio.sleep(0.01)
+
+        return StreamingResponse(chunks(), media_type="audio/mpeg")
+
+    return app
+
+
+def parse_profiles(specs) -> Dict[str, LatencyProfile]:
+    merged = dict(DEFAULT_PROFILES)
+    for spec in specs or []:
+        service, _, value = spec.partition("=")
+        if service not in SERVICES:
+            raise SystemExit(f"Unknown service in profile: {service} (expected one of {', '.join(SERVICES)})")
+        merged[service] = value
+    return {service: LatencyProfile.parse(value) for service, value in merged.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI/ElevenLabs upstreams for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--profile", action="append", help="service=median_ms[:p99_ms[:error_rate]]")
+    parser.add_argument("--sentences", type=int, default=len(SENTENCES), help="distinct transcripts (lower = more cache hits)")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(parse_profiles(args.profile), args.sentences), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
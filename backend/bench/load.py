@@ -0,0 +1,269 @@
+"""
+Load test: starts the fake upstreams and the API (real pipeline, MOCK_MODE=false)
+in subprocesses, drives /process, /magic-clip and /token at a fixed concurrency
+and reports latency percentiles, throughput and the per-stage breakdown scraped
+from /metrics.
+
+Run from the repository root:
+    python backend/bench/load.py --scenarios process,token --concurrency 16 --requests 200 \\
+        --profile llm=800:2500:0.02 --output bench-results.json
+
+Compare two runs with backend/bench/compare.py.
+"""
+import argparse
+import asyncio
+import base64
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(__file__))
+from common import (
+    BACKEND_DIR, REPO_DIR, histogram_delta, parse_histograms, run_metadata, speech_like_wav, summarize_ms, write_results
+)
+
+SCENARIOS = ("process", "process-stream", "magic-clip", "token")
+CLIP_FILENAME = "godfather_demo.mp4"
+PASSWORD = "bench-password"
+
+
+def start_process(cmd: List[str], env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, "wb")
+    return subprocess.Popen(cmd, cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+
+
+def stop_process(proc: subprocess.Popen):
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGINT)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, proc: subprocess.Popen, timeout: float = 90.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {proc.returncode} (see log)")
+        try:
+            if (await client.get(url, timeout=2.0)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"{url} not ready after {timeout} s")
+
+
+class Scenario:
+    def __init__(self, name: str, client: httpx.AsyncClient, tokens: List[str], args):
+        self.name = name
+        self.client = client
+        self.tokens = tokens
+        self.args = args
+        self.audio_b64 = base64.b64encode(speech_like_wav(args.audio_seconds)).decode("ascii")
+
+    async def request(self, i: int) -> int:
+        headers = {"Authorization": f"Bearer {self.tokens[i % len(self.tokens)]}"}
+        if self.name == "process":
+            response = await self.client.post("/process", headers=headers, json={
+                "user_id": str(i % len(self.tokens)),
+                "audio_data": self.audio_b64,
+                "mode": self.args.mode,
+                "context_text": self.args.context,
+                "score": self.args.score
+            })
+        elif self.name == "process-stream":
+            async with self.client.stream("POST", "/process/stream", headers=headers, json={
+                "user_id": str(i % len(self.tokens)),
+                "audio_data": self.audio_b64,
+                "mode": self.args.mode,
+                "context_text": self.args.context
+            }) as response:
+                async for _ in response.aiter_bytes():
+                    pass
+        elif self.name == "magic-clip":
+            response = await self.client.post("/magic-clip", headers=headers, json={
+                "audio_data": self.audio_b64,
+                "clip_filename": CLIP_FILENAME,
+                # Distinct texts: every request renders instead of hitting the render cache
+                "clip_text": f"I'm gonna make him an offer he can't refuse, take {i}."
+            })
+        else:
+            response = await self.client.post("/token", data={"username": f"bench{i % len(self.tokens)}", "password": PASSWORD})
+        return response.status_code
+
+    async def run(self, total: int, concurrency: int) -> dict:
+        latencies: List[float] = []
+        statuses: Counter = Counter()
+        counter = iter(range(total))
+
+        async def worker():
+            for i in counter:
+                started = time.perf_counter()
+                try:
+                    status = await self.request(i)
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[str(status)] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - started
+        ok = statuses.get("200", 0)
+        return {
+            "requests": total,
+            "concurrency": concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "rps": round(total / elapsed, 2),
+            "error_rate": round(1 - ok / total, 4) if total else 0.0,
+            "status": dict(statuses),
+            "latency_ms": summarize_ms(latencies)
+        }
+
+
+def stage_breakdown(before: str, after: str) -> Dict[str, dict]:
+    deltas = histogram_delta(
+        parse_histograms(before, "echonative_stage_seconds"),
+        parse_histograms(after, "echonative_stage_seconds")
+    )
+    breakdown = {}
+    for labels, values in sorted(deltas.items()):
+        labels = dict(labels)
+        key = labels["stage"] + (f"/{labels['mode']}" if labels.get("mode") else "")
+        breakdown[key] = values
+    return breakdown
+
+
+async def run_benchmark(args, app_url: str) -> dict:
+    results = {}
+    async with httpx.AsyncClient(base_url=app_url, timeout=args.timeout, limits=httpx.Limits(max_connections=args.concurrency + 8)) as client:
+        users = max(1, min(args.users, args.concurrency))
+        tokens = []
+        for n in range(users):
+            await client.post("/register", json={"username": f"bench{n}", "password": PASSWORD})
+            response = await client.post("/token", data={"username": f"bench{n}", "password": PASSWORD})
+            response.raise_for_status()
+            tokens.append(response.json()["access_token"])
+
+        for name in args.scenarios:
+            if name == "magic-clip" and not shutil.which("ffmpeg"):
+                results[name] = {"skipped": "ffmpeg not found"}
+                continue
+            scenario = Scenario(name, client, tokens, args)
+            if args.warmup:
+                await scenario.run(args.warmup, min(args.concurrency, args.warmup))
+            before = (await client.get("/metrics")).text
+            print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}...")
+            results[name] = await scenario.run(args.requests, args.concurrency)
+            results[name]["stages"] = stage_breakdown(before, (await client.get("/metrics")).text)
+            latency = results[name]["latency_ms"]
+            print(f"  {results[name]['rps']} req/s  p50 {latency.get('p50')} ms  p95 {latency.get('p95')} ms  "
+                  f"p99 {latency.get('p99')} ms  errors {results[name]['error_rate']:.2%}")
+    return results
+
+
+def ensure_clip():
+    clip = os.path.join(BACKEND_DIR, "static", "clips", CLIP_FILENAME)
+    if not os.path.exists(clip) and shutil.which("ffmpeg"):
+        subprocess.run([sys.executable, os.path.join(BACKEND_DIR, "scripts", "init_clips.py")], cwd=REPO_DIR, check=False)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="EchoNative load test against fake upstreams")
+    parser.add_argument("--scenarios", default="process,token", help=f"comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests before each scenario")
+    parser.add_argument("--users", type=int, default=16, help="distinct users (tokens) sending requests")
+    parser.add_argument("--mode", default="shadowing", choices=["shadowing", "completion", "panic"])
+    parser.add_argument("--context", default="I am thinking about quitting my job.")
+    parser.add_argument("--score", action="store_true", help="request intonation scores on /process")
+    parser.add_argument("--audio-seconds", type=float, default=3.0)
+    parser.add_argument("--profile", action="append", help="fake upstream latency, service=median_ms[:p99_ms[:error_rate]]")
+    parser.add_argument("--sentences", type=int, default=10, help="distinct transcripts (lower = more cache hits)")
+    parser.add_argument("--app-env", action="append", default=[], help="extra KEY=VALUE for the API process")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--app-workers", type=int, default=1, help="API worker processes (multi-worker mode)")
+    parser.add_argument("--upstream-port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    work_dir = tempfile.mkdtemp(prefix="echonative-bench-")
+    upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+    app_url = f"http://127.0.0.1:{args.app_port}"
+
+    upstream_cmd = [sys.executable, os.path.join(BACKEND_DIR, "bench", "fake_upstreams.py"),
+                    "--port", str(args.upstream_port), "--sentences", str(args.sentences)]
+    for profile in args.profile or []:
+        upstream_cmd += ["--profile", profile]
+
+    # Fresh state for every run: database, caches and job queue live in the work dir
+    app_env = {
+        **os.environ,
+        "MOCK_MODE": "false",
+        "OPENAI_API_KEY": "bench",
+        "ELEVENLABS_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{upstream_url}/v1",
+        "ELEVENLABS_BASE_URL": f"{upstream_url}/v1",
+        "HTTP2": "false",
+        "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+        "JOBS_DB": os.path.join(work_dir, "jobs.db"),
+        "LLM_CACHE_DB": os.path.join(work_dir, "cache.db"),
+        "PITCH_CACHE_DB": os.path.join(work_dir, "cache.db"),
+        "TTS_CACHE_DIR": os.path.join(work_dir, "tts"),
+        "REFERENCE_DIR": os.path.join(work_dir, "reference"),
+        "CLIP_TEMPLATES_DIR": os.path.join(work_dir, "clip_templates"),
+        "PYTHONPATH": BACKEND_DIR
+    }
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        app_env[key] = value
+    app_env["WEB_CONCURRENCY"] = str(args.app_workers)
+    app_cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.app_port), "--log-level", "warning",
+        "--workers", str(args.app_workers)
+    ]
+
+    if "magic-clip" in args.scenarios:
+        ensure_clip()
+
+    upstream = start_process(upstream_cmd, dict(os.environ), os.path.join(work_dir, "upstream.log"))
+    app = None
+    try:
+        async def run() -> dict:
+            nonlocal app
+            async with httpx.AsyncClient() as probe:
+                await wait_ready(probe, f"{upstream_url}/health", upstream)
+                app = start_process(app_cmd, app_env, os.path.join(work_dir, "app.log"))
+                await wait_ready(probe, f"{app_url}/", app)
+            return await run_benchmark(args, app_url)
+
+        scenarios = asyncio.run(run())
+    finally:
+        if app is not None:
+            stop_process(app)
+        stop_process(upstream)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output",)}
+    write_results({"kind": "load", **run_metadata(config), "scenarios": scenarios}, args.output)
+    print(f"Logs and state: {work_dir}")
+
+
+if __name__ == "__main__":
+    main()
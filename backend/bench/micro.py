@@ -0,0 +1,124 @@
+"""
+Micro-benchmarks for the CPU/ffmpeg-bound pieces of the pipeline:
+PitchService.extract_pitch (per output format and audio length) and
+VideoService.swap_audio (one ffmpeg remux per call; skipped without ffmpeg).
+
+Run from the repository root:
+    python backend/bench/micro.py --repeat 30 --output micro.json
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, List, Optional
+
+sys.path.insert(0, os.path.dirname(__file__))
+from common import add_backend_to_path, run_metadata, speech_like_wav, summarize_ms, write_results
+
+add_backend_to_path()
+from app.core.executor import TaskExecutor
+from app.services.pitch import PitchService
+from app.services.video import VideoService
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize_ms(samples)
+
+
+def bench_pitch(durations: List[float], formats: List[str], repeat: int, warmup: int) -> dict:
+    service = PitchService()
+    results = {}
+    for seconds in durations:
+        audio = speech_like_wav(seconds, rate=22050, base_freq=180.0)
+        for pitch_format in formats:
+            result = service.extract_pitch(audio, pitch_format)
+            if result.get("status") != "success":
+                raise RuntimeError(f"extract_pitch failed: {result}")
+            results[f"{seconds:g}s/{pitch_format}"] = measure(
+                lambda: service.extract_pitch(audio, pitch_format), repeat, warmup
+            )
+    return results
+
+
+def bench_swap_audio(durations: List[float], repeat: int, warmup: int) -> dict:
+    if not shutil.which("ffmpeg"):
+        return {"skipped": "ffmpeg not found"}
+
+    static_dir = tempfile.mkdtemp(prefix="echonative-micro-")
+    clip = "bench_clip.mp4"
+    os.makedirs(os.path.join(static_dir, "clips"), exist_ok=True)
+    subprocess.run([
+        "ffmpeg", "-loglevel", "error",
+        "-f", "lavfi", "-i", "color=c=darkblue:s=640x360:d=10",
+        "-f", "lavfi", "-i", "anullsrc=r=44100:cl=stereo",
+        "-c:v", "libx264", "-c:a", "aac", "-shortest", "-y",
+        os.path.join(static_dir, "clips", clip)
+    ], check=True)
+
+    async def run() -> dict:
+        executor = TaskExecutor()
+        service = VideoService(static_dir=static_dir, executor=executor, templates_dir=os.path.join(static_dir, "templates"))
+        results = {}
+        for seconds in durations:
+            counter = iter(range(10 ** 9))
+
+            async def render():
+                # Unique audio per call: renders are content-addressed and would otherwise be cache hits
+                audio = speech_like_wav(seconds, seed=next(counter))
+                started = time.perf_counter()
+                await service.swap_audio(clip, audio)
+                return time.perf_counter() - started
+
+            for _ in range(warmup):
+                await render()
+            results[f"{seconds:g}s"] = summarize_ms([await render() for _ in range(repeat)])
+        return results
+
+    try:
+        return asyncio.run(run())
+    finally:
+        shutil.rmtree(static_dir, ignore_errors=True)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="EchoNative micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--durations", default="1,5,10", help="audio lengths in seconds")
+    parser.add_argument("--formats", default="points,arrays,f32", help="pitch output formats")
+    parser.add_argument("--only", choices=["pitch", "swap_audio"], help="run a single benchmark")
+    parser.add_argument("--output", help="write JSON results here (default: stdout)")
+    args = parser.parse_args(argv)
+    durations = [float(d) for d in args.durations.split(",")]
+
+    benchmarks = {}
+    if args.only in (None, "pitch"):
+        print("Benchmarking PitchService.extract_pitch...")
+        benchmarks["extract_pitch"] = bench_pitch(durations, args.formats.split(","), args.repeat, args.warmup)
+    if args.only in (None, "swap_audio"):
+        print("Benchmarking VideoService.swap_audio...")
+        benchmarks["swap_audio"] = bench_swap_audio(durations, max(1, args.repeat // 4), min(args.warmup, 1))
+
+    for name, cases in benchmarks.items():
+        for case, stats in cases.items():
+            if isinstance(stats, dict):
+                print(f"  {name} {case}: p50 {stats['p50']} ms  p95 {stats['p95']} ms")
+            else:
+                print(f"  {name}: {case} {stats}")
+    config = {k: v for k, v in vars(args).items() if k != "output"}
+    write_results({"kind": "micro", **run_metadata(config), "benchmarks": benchmarks}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for running the API on every core (one event loop per worker).
+Run from the repository root (paths like backend/static are relative to it):
+
+    PYTHONPATH=backend gunicorn -c backend/gunicorn.conf.py app.main:app
+
+or `python backend/scripts/serve.py --workers N --preload`. Needs `gunicorn` and
+`uvicorn-worker` (see requirements.txt).
+"""
+import multiprocessing
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# Set WEB_CONCURRENCY (not -w): the app splits box-wide limits by it (CPU pool, upstream quotas)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+# Import the app once in the master; workers fork with the code and read-only data already loaded
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+# Recycle workers now and then (0 = never); jitter keeps them from restarting together
+max_requests = int(os.getenv("MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+
+def post_fork(server, worker):
+    # Pooled DB connections opened in the master must not be shared with the children
+    from app.core.database import async_engine, engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
@@ -0,0 +1,39 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv
+from app.core.http import clients
+from app.services.engine import VoiceProcessor
+
+async def build(sentences_path: str = None, force: bool = False):
+    """
+    Precomputes native reference contours for every clip and (optionally) every
+    target sentence in a text file, one sentence per line.
+    Sentences are spoken by the default voice, so ELEVENLABS_API_KEY is required for them.
+    """
+    processor = VoiceProcessor(mock_mode=False)
+    builder = processor.reference_builder
+    try:
+        results = await builder.build_clips(force=force)
+        if sentences_path:
+            with open(sentences_path, "r", encoding="utf-8") as f:
+                results.update(await builder.build_sentences(f, force=force))
+    finally:
+        await clients.aclose()
+
+    for item, status in results.items():
+        print(f"{status:>6}  {item}")
+    print(f"Reference contours: {processor.reference_store.stats()['items']} items in {processor.reference_store.directory}")
+    return results
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Build precomputed reference pitch contours")
+    parser.add_argument("--sentences", help="Text file with one target sentence per line")
+    parser.add_argument("--force", action="store_true", help="Rebuild items whose source has not changed")
+    args = parser.parse_args()
+    asyncio.run(build(args.sentences, args.force))
@@ -0,0 +1,42 @@
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from dotenv import load_dotenv
+
+async def run(workers: int):
+    """
+    Runs Magic Clip render workers without the API, consuming the same SQLite job queue.
+    Start the API with MAGIC_CLIP_WORKERS=0 to move all rendering here.
+    """
+    from app.core.executor import executor
+    from app.core.http import clients
+    from app.core.jobs import JobQueue, JobWorkers
+    from app.services.engine import VoiceProcessor
+
+    processor = VoiceProcessor(mock_mode=os.getenv("MOCK_MODE", "true").lower() == "true")
+    job_workers = JobWorkers(JobQueue(), {"magic_clip": processor.run_magic_clip_job}, concurrency={"magic_clip": workers})
+
+    executor.start()
+    await processor.video_service.prepare_templates()
+    job_workers.start()
+    print(f"Magic Clip workers running: {workers}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_workers.stop()
+        await clients.aclose()
+        await executor.shutdown()
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run Magic Clip render workers")
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,42 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from dotenv import load_dotenv
+
+def main():
+    """
+    Starts the API with several worker processes (one event loop each).
+    --preload runs gunicorn with backend/gunicorn.conf.py (app imported once, then forked);
+    otherwise uvicorn's process manager starts each worker from scratch.
+    """
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Run the EchoNative API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count()))))
+    parser.add_argument("--preload", action="store_true", help="gunicorn with preload (needs gunicorn + uvicorn-worker)")
+    args = parser.parse_args()
+
+    # Read by every worker: box-wide limits are split between them (app/core/workers.py)
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [BACKEND_DIR, os.getenv("PYTHONPATH")]))
+    # Static, cache and DB paths are relative to the repository root
+    os.chdir(REPO_DIR)
+
+    if args.preload:
+        os.environ["BIND"] = f"{args.host}:{args.port}"
+        os.environ["PRELOAD_APP"] = "true"
+        config = os.path.join(BACKEND_DIR, "gunicorn.conf.py")
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", config, "app.main:app"])
+
+    import uvicorn
+    uvicorn.run("app.main:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
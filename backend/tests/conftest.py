@@ -0,0 +1,35 @@
+import atexit
+import os
+import shutil
+import tempfile
+import pytest
+
+# Services built with default settings (e.g. app.main's processor) keep their stores out of the tree
+_state_dir = tempfile.mkdtemp(prefix="echonative-tests-")
+# atexit rather than a session fixture: the directory must exist before app modules are imported
+atexit.register(shutil.rmtree, _state_dir, ignore_errors=True)
+for _name, _sub in (("TTS_CACHE_DIR", "tts"), ("REFERENCE_DIR", "reference"), ("ARTIFACT_DIR", "artifacts"),
+                    ("CLIP_TEMPLATES_DIR", "clip_templates"), ("XTTS_VOICES_DIR", "xtts_voices")):
+    os.environ.setdefault(_name, os.path.join(_state_dir, _sub))
+_database = os.path.join(_state_dir, "database.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_database}")
+for _name in ("JOBS_DB", "LLM_CACHE_DB", "PITCH_CACHE_DB"):
+    os.environ.setdefault(_name, _database)
+
+from app.core.artifacts import LocalArtifactStore
+from app.services.engine import VoiceProcessor
+from app.services.reference import ReferenceStore
+from app.services.tts import TTSCache
+
+@pytest.fixture
+def processor(tmp_path):
+    """
+    VoiceProcessor(mock_mode=False) whose artifact, TTS cache and reference stores
+    live in tmp_path instead of backend/cache.
+    """
+    processor = VoiceProcessor(mock_mode=False)
+    processor.artifacts = LocalArtifactStore(str(tmp_path / "artifacts"))
+    processor.tts_service.cache = TTSCache(directory=str(tmp_path / "tts"))
+    processor.reference_store = ReferenceStore(str(tmp_path / "reference"))
+    processor.reference_builder.store = processor.reference_store
+    return processor
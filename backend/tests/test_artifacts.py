@@ -0,0 +1,67 @@
+import os
+import time
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import artifacts
+from app.core.artifacts import LocalArtifactStore
+
+def make_client(store):
+    app = FastAPI()
+    app.include_router(artifacts.router)
+    app.state.processor = SimpleNamespace(artifacts=store)
+    return TestClient(app)
+
+def test_content_addressed_and_written_once(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), secret="s")
+    key = store.put(b"mp3 bytes")
+    assert store.put(b"mp3 bytes") == key
+    assert key.endswith(".mp3") and store.put(b"RIFF....WAVE").endswith(".wav")
+    assert store.writes == 2 and store.dedup_hits == 1
+    # Same window, same URL: repeat plays hit the client cache
+    assert store.url(key) == store.url(key)
+
+def test_signed_urls_reject_tampering_and_expiry(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), secret="s", url_ttl=60)
+    key = store.put(b"mp3 bytes")
+    expires = int(time.time()) + 60
+    sig = store.sign(key, expires)
+    assert store.verify(key, expires, sig)
+    assert not store.verify(key, expires + 1, sig)
+    assert not store.verify(key, int(time.time()) - 1, store.sign(key, int(time.time()) - 1))
+    assert not LocalArtifactStore(str(tmp_path), secret="other").verify(key, expires, sig)
+    assert store.path("../" + key) is None
+
+def test_served_with_range_etag_and_cache_control(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), secret="s")
+    audio = bytes(range(256)) * 4
+    url = store.url(store.put(audio))
+    client = make_client(store)
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == audio
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert "immutable" in response.headers["cache-control"]
+
+    partial = client.get(url, headers={"Range": "bytes=100-199"})
+    assert partial.status_code == 206
+    assert partial.content == audio[100:200]
+
+    etag = response.headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(url.replace("sig=", "sig=0")).status_code == 403
+
+def test_gc_removes_expired_then_oldest(tmp_path):
+    store = LocalArtifactStore(str(tmp_path), secret="s", url_ttl=1, max_age=3600, max_bytes=25)
+    old = store.put(b"a" * 10)
+    path = store.path(old)
+    os.utime(path, (time.time() - 7200, time.time() - 7200))
+    keys = [store.put(bytes([i]) * 10) for i in range(3)]
+    for age, key in zip((30, 20, 10), keys):
+        os.utime(store.path(key), (time.time() - age, time.time() - age))
+
+    store.gc()
+    assert store.path(old) is None  # past max_age
+    assert store.path(keys[0]) is None  # least recent, over max_bytes
+    assert store.path(keys[1]) and store.path(keys[2])
@@ -0,0 +1,59 @@
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+import app.core.audio as audio
+from app.core.audio import read_audio_upload
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(audio, "MAX_UPLOAD_BYTES", 1024)
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        data, params = await read_audio_upload(request)
+        return {"size": len(data), "params": params}
+
+    return TestClient(app)
+
+def test_multipart_audio_and_fields(client):
+    response = client.post(
+        "/upload?mode=panic",
+        files={"audio": ("a.wav", b"RIFF" + b"\0" * 100)},
+        data={"mode": "shadowing", "context": "Hello."}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"size": 104, "params": {"mode": "shadowing", "context": "Hello."}}
+
+def test_multipart_requires_audio_file(client):
+    response = client.post("/upload", data={"audio": "not-a-file"}, files={"other": ("a.wav", b"RIFF")})
+    assert response.status_code == 422
+
+def test_oversize_content_length_rejected_before_reading(client):
+    response = client.post("/upload", content=b"x" * 10, headers={"content-length": str(10 ** 9)})
+    assert response.status_code == 413
+
+@pytest.mark.parametrize("multipart", [True, False])
+def test_oversize_streamed_body_rejected(client, multipart):
+    def body():
+        # Chunked (no Content-Length): the cap is enforced while reading
+        yield b"x" * 2048
+    if multipart:
+        response = client.post("/upload", files={"audio": ("a.wav", b"x" * 2048)})
+    else:
+        response = client.post("/upload", content=body())
+    assert response.status_code == 413
+
+def test_upload_without_context_sends_empty_context(monkeypatch):
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock
+    from app import main
+    process = AsyncMock(return_value={"original_text": "hi", "corrected_text": "Hi.", "audio_url": "/a",
+                                      "pitch_data": [], "diff": []})
+    monkeypatch.setattr(main.processor, "process_audio", process)
+    monkeypatch.setattr(main.processor.voice_registry, "get_voice_id", AsyncMock(return_value=None))
+    monkeypatch.setitem(main.app.dependency_overrides, main.auth.get_current_principal, lambda: SimpleNamespace(id=1))
+
+    response = TestClient(main.app).post("/process/upload", files={"audio": ("a.wav", b"RIFF")}, data={"mode": "free_talk"})
+    assert response.status_code == 200
+    assert process.call_args.args[2] == ""
@@ -0,0 +1,71 @@
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.api import auth
+from app.core import security
+from app.core.executor import ExecutorBusy
+from app.core.security import create_access_token
+from app.models.user import User
+
+@pytest_asyncio.fixture
+async def db(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        session.add(User(id=7, username="alice", hashed_password="x"))
+        await session.commit()
+    monkeypatch.setattr(auth, "async_engine", engine)
+    auth.principal_cache.clear()
+    yield engine
+    auth.principal_cache.clear()
+    await engine.dispose()
+
+@pytest.mark.asyncio
+async def test_principal_is_cached_after_first_lookup(db):
+    token = create_access_token({"sub": "alice"})
+    principal = await auth.get_current_principal(token)
+    assert (principal.id, principal.username) == (7, "alice")
+
+    # No DB round trip on the next request
+    async with db.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    assert (await auth.get_current_principal(token)).id == 7
+    assert auth.principal_cache.hits == 1
+
+@pytest.mark.asyncio
+async def test_invalid_token_and_unknown_user_are_rejected(db):
+    with pytest.raises(HTTPException) as e:
+        await auth.get_current_principal("not-a-jwt")
+    assert e.value.status_code == 401
+    with pytest.raises(HTTPException):
+        await auth.get_current_principal(create_access_token({"sub": "mallory"}))
+    assert len(auth.principal_cache) == 0
+
+@pytest.mark.asyncio
+async def test_get_current_user_hydrates_and_invalidates_deleted_users(db):
+    principal = await auth.get_current_principal(create_access_token({"sub": "alice"}))
+    async with AsyncSession(db) as session:
+        user = await auth.get_current_user(principal, session)
+        assert user.username == "alice" and user.streak_count == 0
+        await session.delete(user)
+        await session.commit()
+
+    async with AsyncSession(db) as session:
+        with pytest.raises(HTTPException):
+            await auth.get_current_user(principal, session)
+    assert auth.principal_cache.get("alice") is None
+
+@pytest.mark.asyncio
+async def test_password_hashing_runs_in_bounded_pool(monkeypatch):
+    hashed = await security.get_password_hash_async("pw123456")
+    assert await security.verify_password_async("pw123456", hashed)
+    assert not await security.verify_password_async("wrong", hashed)
+
+    monkeypatch.setattr(security, "hash_queue_limit", 0)
+    with pytest.raises(ExecutorBusy):
+        await security.verify_password_async("pw123456", hashed)
@@ -0,0 +1,163 @@
+import pytest
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from app.core.batching import MicroBatcher
+from app.core.executor import ExecutorBusy
+from app.services.batch import BatchManager
+from app.services.llm import LLMCache, LLMService
+from app.core.cache import LRUCache
+
+@pytest.mark.asyncio
+async def test_micro_batcher_groups_concurrent_calls():
+    calls = []
+    async def double(items):
+        calls.append(items)
+        return [i * 2 for i in items]
+    batcher = MicroBatcher(double, max_size=3, max_wait=0.01)
+
+    results = await asyncio.gather(*[batcher.submit(i) for i in range(5)])
+
+    assert results == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2], [3, 4]]
+    assert batcher.stats()["batches"] == 2
+
+@pytest.mark.asyncio
+async def test_micro_batcher_propagates_errors_to_the_whole_batch():
+    async def broken(items):
+        raise RuntimeError("upstream down")
+    batcher = MicroBatcher(broken, max_wait=0.01)
+    results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+@pytest.mark.asyncio
+async def test_micro_batcher_cancels_callers_when_the_batch_is_cancelled():
+    started = asyncio.Event()
+    async def hang(items):
+        started.set()
+        await asyncio.sleep(10)
+    batcher = MicroBatcher(hang, max_wait=0.01)
+    callers = [asyncio.ensure_future(batcher.submit(i)) for i in range(2)]
+    await started.wait()
+
+    for task in batcher._running:
+        task.cancel()
+    results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), timeout=1)
+    assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+@pytest.mark.asyncio
+async def test_batched_corrections_share_one_completion():
+    service = LLMService(api_key="test-key", cache=LLMCache(backend=LRUCache()))
+    answer = {"results": [
+        {"id": 1, "corrected": "She goes.", "explanation": "", "diff": []},
+        {"id": 0, "corrected": "I went.", "explanation": "", "diff": []}
+    ]}
+    create = AsyncMock(return_value=SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(answer)))]
+    ))
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    service.clients = MagicMock()
+    service.clients.openai.return_value = client
+
+    results = await asyncio.gather(
+        service.correct_grammar("I goed.", batched=True),
+        service.correct_grammar("She go.", batched=True)
+    )
+
+    assert [r["corrected"] for r in results] == ["I went.", "She goes."]
+    create.assert_called_once()
+    # Results are cached per item like unbatched corrections
+    assert (await service.correct_grammar("i goed"))["corrected"] == "I went."
+    create.assert_called_once()
+
+@pytest.fixture
+def manager():
+    processor = MagicMock()
+    running = {"now": 0, "max": 0}
+
+    async def process_audio(audio, mode, context, pitch_format, **kwargs):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        await asyncio.sleep(0.01)
+        running["now"] -= 1
+        if audio == "broken":
+            return {"error": "STT failed"}
+        assert kwargs["batched"] is True
+        return {"original_text": audio, "corrected_text": audio.upper()}
+
+    processor.process_audio = AsyncMock(side_effect=process_audio)
+    manager = BatchManager(processor, concurrency=2, max_items=10, max_jobs=1)
+    manager.running = running
+    return manager
+
+def items(*audios):
+    return [{"audio": a, "mode": "free_talk"} for a in audios]
+
+@pytest.mark.asyncio
+async def test_batch_job_streams_items_and_bounds_concurrency(manager):
+    job = manager.submit(user_id=1, items=items("a", "b", "broken", "d", "e"))
+
+    events = [e async for e in job.events()]
+
+    assert [e["event"] for e in events] == ["item"] * 5 + ["done"]
+    assert sorted(e["data"]["index"] for e in events[:-1]) == [0, 1, 2, 3, 4]
+    assert events[-1]["data"]["completed"] == 5
+    assert events[-1]["data"]["failed"] == 1
+    assert manager.running["max"] == 2
+
+    progress = job.progress(include_results=True)
+    assert progress["status"] == "done"
+    assert progress["results"][0]["corrected_text"] == "A"
+    assert job.items == [None] * 5
+
+    # Late subscribers get the full replay
+    assert len([e async for e in job.events()]) == 6
+
+@pytest.mark.asyncio
+async def test_batch_limits_and_ownership(manager):
+    with pytest.raises(ValueError):
+        manager.submit(user_id=1, items=[])
+    with pytest.raises(ValueError):
+        manager.submit(user_id=1, items=items(*"abcdefghijk"))
+
+    job = manager.submit(user_id=1, items=items("a"))
+    with pytest.raises(ExecutorBusy):
+        manager.submit(user_id=1, items=items("b"))
+    assert manager.get(job.id, user_id=2) is None
+    assert manager.get(job.id, user_id=1) is job
+    await job.task
+
+@pytest.fixture
+def upload_client(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api import batch
+    from app.api.auth import get_current_principal
+    import app.core.audio as audio
+    monkeypatch.setattr(audio, "MAX_UPLOAD_BYTES", 100)
+    monkeypatch.setattr(batch, "MAX_BATCH_UPLOAD_BYTES", 150)
+    app = FastAPI()
+    app.include_router(batch.router)
+    app.dependency_overrides[get_current_principal] = lambda: SimpleNamespace(id=1)
+    app.state.processor = SimpleNamespace(voice_registry=SimpleNamespace(get_voice_id=AsyncMock(return_value="v")))
+    app.state.batch_manager = MagicMock()
+    app.state.batch_manager.submit.return_value.progress.return_value = {"job_id": "j"}
+    return TestClient(app), app.state.batch_manager
+
+def test_batch_upload_streams_files_with_caps(upload_client):
+    client, manager = upload_client
+    files = [("audio", ("a.wav", b"a" * 60)), ("audio", ("b.wav", b"b" * 60))]
+    assert client.post("/batch/upload", files=files, data={"mode": "free_talk"}).status_code == 202
+    items = manager.submit.call_args.args[1]
+    assert [bytes(item["audio"]) for item in items] == [b"a" * 60, b"b" * 60]
+    assert items[0]["context_text"] == ""
+
+    # One file over MAX_UPLOAD_BYTES, all files over the batch cap, an oversize Content-Length
+    assert client.post("/batch/upload", files=[("audio", ("a.wav", b"a" * 120))], data={"mode": "free_talk"}).status_code == 413
+    assert client.post("/batch/upload", files=files * 2, data={"mode": "free_talk"}).status_code == 413
+    response = client.post("/batch/upload", content=b"x", headers={
+        "content-type": "multipart/form-data; boundary=x", "content-length": str(10 ** 9)
+    })
+    assert response.status_code == 413
+    assert manager.submit.call_count == 1
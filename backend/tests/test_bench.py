@@ -0,0 +1,57 @@
+import os
+import sys
+from fastapi.testclient import TestClient
+from app.core.metrics import MetricsRegistry
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+from common import histogram_delta, parse_histograms, summarize_ms
+from fake_upstreams import LatencyProfile, create_app
+
+def test_histogram_delta_between_scrapes():
+    registry = MetricsRegistry()
+    latency = registry.histogram("stage_seconds", "Stage latency", ["stage", "mode"], buckets=(0.1, 1.0))
+    latency.observe(0.05, stage="stt", mode='sha"dow')
+    before = parse_histograms(registry.render(), "stage_seconds")
+    for value in (0.2, 0.4, 0.6, 0.8):
+        latency.observe(value, stage="stt", mode='sha"dow')
+    latency.observe(0.05, stage="tts", mode="")
+
+    deltas = histogram_delta(before, parse_histograms(registry.render(), "stage_seconds"))
+    stt = deltas[(("mode", 'sha"dow'), ("stage", "stt"))]
+    assert stt["count"] == 4
+    assert stt["mean_ms"] == 500.0
+    # All four in the (0.1, 1.0] bucket: p95 interpolates to 0.1 + 0.9 * 0.95
+    assert stt["p95_ms"] == 955.0
+    assert deltas[(("mode", ""), ("stage", "tts"))]["count"] == 1
+
+def test_summarize_ms():
+    stats = summarize_ms([0.01, 0.02, 0.03, 0.04])
+    assert stats["count"] == 4
+    assert stats["p50"] == 25.0
+    assert stats["max"] == 40.0
+    assert summarize_ms([]) == {"count": 0}
+
+def test_fake_upstreams_serve_openai_and_elevenlabs_shapes():
+    profiles = {service: LatencyProfile(0, 0) for service in ("stt", "llm", "tts")}
+    client = TestClient(create_app(profiles, sentences=1))
+
+    stt = client.post("/v1/audio/transcriptions", files={"file": ("a.wav", b"RIFF")}, data={"model": "whisper-1"})
+    assert stt.json() == {"text": "I am think about quit my job."}
+
+    chat = client.post("/v1/chat/completions", json={
+        "model": "gpt-4o",
+        "response_format": {"type": "json_object"},
+        "messages": [{"role": "system", "content": "Fix grammar."}, {"role": "user", "content": "User said: I am think about quit my job."}]
+    })
+    assert "thinking about quitting" in chat.json()["choices"][0]["message"]["content"]
+
+    tts = client.post("/v1/text-to-speech/voice", json={"text": "Hello there"})
+    assert tts.status_code == 200
+    assert tts.content[:4] == b"RIFF"
+    streamed = client.post("/v1/text-to-speech/voice/stream", json={"text": "Hello there"})
+    assert streamed.content == tts.content
+
+def test_latency_profile_error_rate():
+    assert LatencyProfile.parse("0:0:1").error_rate == 1.0
+    profile = LatencyProfile.parse("300:900")
+    assert profile.median == 0.3 and profile.sigma > 0
@@ -1,6 +1,9 @@
 import pytest
 import asyncio
 from unittest.mock import MagicMock, AsyncMock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api import artifacts
 from app.services.engine import VoiceProcessor
 
 @pytest.mark.asyncio
@@ -22,11 +25,10 @@ async def test_process_shadowing_mode_mocked():
     assert "pitch_data" in result
 
 @pytest.mark.asyncio
-async def test_process_flow_with_service_mocks():
+async def test_process_flow_with_service_mocks(processor):
     """
     Test the orchestration logic with mocked services (mock_mode=False)
     """
-    processor = VoiceProcessor(mock_mode=False)
     
     # Mock internal services
     processor.stt_service.transcribe = AsyncMock(return_value="Hello world")
@@ -41,10 +43,148 @@ async def test_process_flow_with_service_mocks():
     # Assertions
     assert result["original_text"] == "Hello world"
     assert result["corrected_text"] == "Hello world."
-    assert result["audio_url"].startswith("data:audio/mpeg;base64,")
+    # Stored once, returned as a signed URL instead of a data URI
+    assert result["audio_url"].startswith("/artifacts/") and "sig=" in result["audio_url"]
+    # The URL as returned is fetchable from the API
+    app = FastAPI()
+    app.include_router(artifacts.router)
+    app.state.processor = processor
+    response = TestClient(app).get(result["audio_url"])
+    assert response.status_code == 200 and response.content == b"fake_mp3_bytes"
     assert len(result["pitch_data"]) == 1
     
     # Verify calls
     processor.stt_service.transcribe.assert_called_once()
     processor.llm_service.correct_grammar.assert_called_once()
     processor.tts_service.generate_audio.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_stream_audio_mocked():
+    """
+    Streaming flow in Mock Mode emits transcript -> tokens -> audio -> pitch -> done
+    """
+    processor = VoiceProcessor(mock_mode=True)
+
+    events = [e async for e in processor.stream_audio("base64_fake_data", "shadowing")]
+    names = [e["event"] for e in events]
+
+    assert names[0] == "transcript"
+    assert "token" in names
+    assert names[-1] == "done"
+    assert events[-1]["data"]["corrected_text"] == "I am thinking about quitting my job."
+    # Mock audio events carry the same fields as the real pipeline's
+    audio = next(e["data"] for e in events if e["event"] == "audio")
+    assert set(audio) == {"seq", "chunk", "text", "audio", "media_type"}
+    assert audio["media_type"] == "audio/wav"
+
+@pytest.mark.asyncio
+async def test_stream_audio_starts_tts_per_sentence(processor):
+    """
+    TTS is started for each complete sentence while the LLM is still streaming.
+    """
+
+    async def fake_stream(text, context=""):
+        for delta in ["Hello ", "world. ", "How are ", "you?"]:
+            yield delta
+
+    processor.stt_service.transcribe = AsyncMock(return_value="hello world how are you")
+    processor.llm_service.stream_correction = fake_stream
+    async def fake_tts_stream(text, voice_id):
+        # Audio arrives in chunks as it is synthesized
+        yield b"fake_mp3_"
+        yield b"bytes"
+
+    processor.tts_service.stream_audio = fake_tts_stream
+    processor.pitch_service.extract_pitch = MagicMock(return_value={"data": [{"t":0, "f":100}]})
+
+    events = [e async for e in processor.stream_audio("base64_audio", "free_talk")]
+
+    audio = [e["data"] for e in events if e["event"] == "audio"]
+    assert [a["text"] for a in audio] == ["Hello world.", "Hello world.", "How are you?", "How are you?"]
+    assert [(a["seq"], a["chunk"]) for a in audio] == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    assert audio[0]["media_type"] == "audio/mpeg"
+    # Pitch runs on the whole segment once its last chunk is out
+    assert processor.pitch_service.extract_pitch.call_args_list[0].args[0] == b"fake_mp3_bytes"
+    kinds = [e["event"] for e in events if e["event"] in ("audio", "pitch")]
+    assert kinds == ["audio", "audio", "pitch", "audio", "audio", "pitch"]
+    assert events[0] == {"event": "transcript", "data": {"text": "hello world how are you"}}
+    assert events[-1]["data"]["corrected_text"] == "Hello world. How are you?"
+    assert events[-1]["data"]["diff"]
+
+@pytest.mark.asyncio
+async def test_process_binary_audio_without_inline_encoding(processor):
+    """
+    Raw bytes go straight to the services and the MP3 comes back as bytes, not a data URL.
+    """
+
+    processor.stt_service.transcribe = AsyncMock(return_value="Hello world")
+    processor.llm_service.correct_grammar = AsyncMock(return_value={
+        "corrected": "Hello world.", "explanation": "Added punctuation", "diff": []
+    })
+    processor.tts_service.generate_audio = AsyncMock(return_value=b"fake_mp3_bytes")
+    processor.pitch_service.extract_pitch = MagicMock(return_value={"data": [{"t":0, "f":100}]})
+
+    upload = memoryview(bytearray(b"RIFF-raw-wav"))
+    result = await processor.process_audio(upload, "free_talk", store_audio=False)
+
+    assert result["audio_url"] == ""
+    assert result["audio_bytes"] == b"fake_mp3_bytes"
+    processor.stt_service.transcribe.assert_called_once_with(upload)
+    processor.pitch_service.extract_pitch.assert_called_once_with(b"fake_mp3_bytes", "points")
+
+@pytest.mark.asyncio
+async def test_shadowing_uses_speculative_tts_when_correction_matches(processor):
+    """
+    TTS for context_text starts with the request; a matching correction reuses it.
+    """
+    processor.speculative_tts = True
+
+    async def slow_stt(audio):
+        await asyncio.sleep(0.02)
+        return "i am thinking about quitting my job"
+    processor.stt_service.transcribe = slow_stt
+    processor.llm_service.correct_grammar = AsyncMock(return_value={
+        "corrected": "I am thinking about quitting my job", "explanation": "", "diff": []
+    })
+    async def slow_tts(text, voice_id):
+        await asyncio.sleep(0.02)
+        return b"fake_mp3_bytes"
+    processor.tts_service.generate_audio = AsyncMock(side_effect=slow_tts)
+    processor.pitch_service.extract_pitch = MagicMock(return_value={"data": []})
+
+    context = "I am thinking about quitting my job."
+    result = await processor.process_audio("base64_audio", "shadowing", context)
+
+    assert result["audio_url"].startswith("/artifacts/")
+    processor.tts_service.generate_audio.assert_called_once()
+    assert processor.tts_service.generate_audio.call_args.args[0] == context
+    stats = processor.stats()["speculative_tts"]
+    assert stats["hits"] == 1 and stats["mismatch_rate"] == 0.0
+    assert stats["saved_ms_total"] > 0
+
+@pytest.mark.asyncio
+async def test_shadowing_mismatch_cancels_speculative_tts(processor):
+    processor.speculative_tts = True
+    cancelled = asyncio.Event()
+
+    async def tts(text, voice_id):
+        if text == "Hello there.":
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return b"corrected_mp3"
+    async def slow_stt(audio):
+        await asyncio.sleep(0.01)
+        return "hello"
+    processor.stt_service.transcribe = slow_stt
+    processor.llm_service.correct_grammar = AsyncMock(return_value={"corrected": "Hello.", "diff": []})
+    processor.tts_service.generate_audio = AsyncMock(side_effect=tts)
+    processor.pitch_service.extract_pitch = MagicMock(return_value={"data": []})
+
+    result = await processor.process_audio("base64_audio", "shadowing", "Hello there.", store_audio=False)
+
+    assert result["audio_bytes"] == b"corrected_mp3"
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert processor.stats()["speculative_tts"]["mismatch_rate"] == 1.0
@@ -0,0 +1,76 @@
+import pytest
+import asyncio
+import math
+import sys
+from app.core.executor import ExecutorBusy, TaskExecutor
+
+@pytest.mark.asyncio
+async def test_run_cpu_without_pool_uses_thread():
+    executor = TaskExecutor()
+    result = await executor.run_cpu("factorial", math.factorial, 5)
+    assert result == 120
+    assert executor.stats()["tasks"]["factorial"]["count"] == 1
+
+@pytest.mark.asyncio
+async def test_run_cpu_in_process_pool():
+    executor = TaskExecutor()
+    executor.cpu_workers = 1
+    executor.start()
+    try:
+        assert await executor.run_cpu("factorial", math.factorial, 6) == 720
+    finally:
+        await executor.shutdown()
+
+@pytest.mark.asyncio
+async def test_run_cpu_records_time_waiting_for_a_worker():
+    import time
+    executor = TaskExecutor()
+    executor.cpu_workers = 1
+    executor.start()
+    try:
+        # Warm the worker so process startup isn't counted as queueing
+        await executor.run_cpu("warmup", math.factorial, 1)
+        await asyncio.gather(*(executor.run_cpu("sleep", time.sleep, 0.2) for _ in range(2)))
+        with pytest.raises(ValueError):
+            await executor.run_cpu("sqrt", math.sqrt, -1)
+    finally:
+        await executor.shutdown()
+    tasks = executor.stats()["tasks"]
+    # The second sleep queued behind the first one
+    assert tasks["sleep"]["wait_ms_avg"] >= 50
+    assert 150 <= tasks["sleep"]["run_ms_max"] < 1000
+    assert tasks["sqrt"]["errors"] == 1
+
+@pytest.mark.asyncio
+async def test_run_cpu_rejects_when_queue_full():
+    executor = TaskExecutor()
+    executor.cpu_queue_limit = 0
+    with pytest.raises(ExecutorBusy):
+        await executor.run_cpu("factorial", math.factorial, 5)
+    assert executor.metrics["factorial"].rejected == 1
+
+@pytest.mark.asyncio
+async def test_run_subprocess_caps_concurrency():
+    executor = TaskExecutor()
+    executor._ffmpeg_slots = asyncio.Semaphore(1)
+    executor.ffmpeg_concurrency = 1
+    executor.ffmpeg_queue_limit = 1
+    cmd = [sys.executable, "-c", "import time; time.sleep(0.2)"]
+
+    first = asyncio.create_task(executor.run_subprocess("sleep", cmd))
+    second = asyncio.create_task(executor.run_subprocess("sleep", cmd))
+    await asyncio.sleep(0.05)
+    with pytest.raises(ExecutorBusy):
+        await executor.run_subprocess("sleep", cmd)
+
+    assert [(await first)[0], (await second)[0]] == [0, 0]
+    stats = executor.stats()["tasks"]["sleep"]
+    assert stats["count"] == 2 and stats["rejected"] == 1
+
+@pytest.mark.asyncio
+async def test_run_subprocess_passes_stdin_and_returns_stderr():
+    executor = TaskExecutor()
+    cmd = [sys.executable, "-c", "import sys; sys.stderr.write(sys.stdin.read()); sys.exit(3)"]
+    returncode, stderr = await executor.run_subprocess("echo", cmd, input=b"boom")
+    assert returncode == 3
+    assert stderr == b"boom"
@@ -0,0 +1,116 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import AsyncMock
+from app.core.governor import DeadlineMiddleware, Governor, UpstreamBusy, bind_user, call_timeout, remaining, set_deadline
+from app.services.llm import LLMCache, LLMService
+from app.core.cache import LRUCache
+
+async def call(governor, user, log, hold=0.01):
+    bind_user(user)
+    async with governor.slot():
+        log.append(user)
+        await asyncio.sleep(hold)
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    governor = Governor("test", rate=20, burst=1, concurrency=10)
+    log = []
+    started = time.monotonic()
+    await asyncio.gather(*[call(governor, "u", log, hold=0) for _ in range(3)])
+    # One token up front, then one every 50 ms
+    assert time.monotonic() - started >= 0.09
+    assert governor.stats()["granted"] == 3
+
+@pytest.mark.asyncio
+async def test_waiting_calls_are_served_round_robin_per_user():
+    governor = Governor("test", rate=0, burst=0, concurrency=1)
+    log = []
+    tasks = [asyncio.create_task(call(governor, "alice", log)) for _ in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call(governor, "bob", log)))
+    await asyncio.gather(*tasks)
+    # Bob doesn't wait behind Alice's whole burst
+    assert log == ["alice", "alice", "bob", "alice"]
+    assert governor.active == 0 and governor.queued == 0
+
+@pytest.mark.asyncio
+async def test_sheds_when_expected_wait_exceeds_deadline():
+    governor = Governor("test", rate=0, burst=0, concurrency=1)
+    governor.hold_seconds = 2.0
+    holder = asyncio.create_task(call(governor, "alice", [], hold=0.2))
+    await asyncio.sleep(0)
+
+    set_deadline(0.5)
+    with pytest.raises(UpstreamBusy) as exc:
+        await governor.acquire()
+    assert exc.value.pool == "test" and exc.value.retry_after >= 2
+    assert call_timeout(30.0) <= 0.5
+
+    # No deadline (batch jobs): waits its turn instead
+    set_deadline(None)
+    await call(governor, "bob", [])
+    await holder
+    assert governor.stats()["shed"] == 1
+
+@pytest.mark.asyncio
+async def test_deadline_expiring_in_queue_is_shed_and_cleaned_up():
+    governor = Governor("test", rate=0, burst=0, concurrency=1)
+    holder = asyncio.create_task(call(governor, "alice", [], hold=0.2))
+    await asyncio.sleep(0)
+
+    set_deadline(0.05)
+    with pytest.raises(UpstreamBusy):
+        await governor.acquire()
+    assert governor.queued == 0
+    await holder
+    assert governor.active == 0
+
+@pytest.mark.asyncio
+async def test_shed_llm_call_is_not_a_silent_fallback():
+    service = LLMService(cache=LLMCache(backend=LRUCache()))
+    service._request_correction = AsyncMock(side_effect=UpstreamBusy("openai_llm", 3))
+    with pytest.raises(UpstreamBusy):
+        await service.correct_grammar("I has a cat")
+
+@pytest.mark.asyncio
+async def test_batch_routes_have_no_default_deadline():
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen[scope["path"]] = remaining()
+
+    middleware = DeadlineMiddleware(app)
+    for path in ("/process", "/batch/upload", "/voice/enroll"):
+        await middleware({"type": "http", "path": path, "headers": []}, None, None)
+    await middleware({"type": "http", "path": "/batch", "headers": [(b"x-request-deadline-ms", b"2000")]}, None, None)
+
+    assert 14 < seen["/process"] <= 15
+    assert seen["/batch/upload"] is None and seen["/voice/enroll"] is None
+    # The client can still ask for a budget
+    assert 1 < seen["/batch"] <= 2
+    set_deadline(None)
+
+@pytest.mark.asyncio
+async def test_deadline_starts_after_the_body_is_received():
+    seen = []
+
+    async def app(scope, receive, send):
+        while (await receive())["more_body"]:
+            pass
+        seen.append(remaining())
+
+    middleware = DeadlineMiddleware(app)
+    middleware.default_ms = 500
+    for path in ("/process", "/process/upload"):
+        chunks = [{"type": "http.request", "body": b"a", "more_body": True},
+                  {"type": "http.request", "body": b"b", "more_body": False}]
+
+        async def receive():
+            await asyncio.sleep(0.2)  # slow client
+            return chunks.pop(0)
+
+        await middleware({"type": "http", "path": path, "headers": []}, receive, None)
+    # 400 ms went into receiving; the whole budget is left for the work
+    assert all(left > 0.45 for left in seen)
+    set_deadline(None)
@@ -0,0 +1,69 @@
+import pytest
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock
+import httpx
+from app.core.http import UpstreamClients, retry_async
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+@pytest.mark.asyncio
+async def test_pooled_client_reuses_connections(server, monkeypatch):
+    monkeypatch.setenv("HTTP2", "false")
+    clients = UpstreamClients()
+    client = clients.http("test")
+    assert clients.http("test") is client
+
+    for _ in range(5):
+        response = await client.get(server)
+        assert response.status_code == 200
+
+    stats = clients.stats()["test"]
+    assert stats["requests"] == 5
+    assert stats["new_connections"] == 1
+    assert stats["reuse_ratio"] == 0.8
+    assert stats["in_flight"] == 0
+    await clients.aclose()
+
+@pytest.mark.asyncio
+async def test_retry_async_retries_retryable_status():
+    responses = [httpx.Response(429), httpx.Response(503), httpx.Response(200)]
+    fn = AsyncMock(side_effect=responses)
+
+    response = await retry_async(fn, attempts=3, base_delay=0)
+
+    assert response.status_code == 200
+    assert fn.call_count == 3
+
+@pytest.mark.asyncio
+async def test_retry_async_is_bounded():
+    fn = AsyncMock(return_value=httpx.Response(503))
+
+    response = await retry_async(fn, attempts=2, base_delay=0)
+
+    assert response.status_code == 503
+    assert fn.call_count == 2
+
+@pytest.mark.asyncio
+async def test_retry_async_does_not_retry_client_errors():
+    fn = AsyncMock(return_value=httpx.Response(401))
+    response = await retry_async(fn, attempts=3, base_delay=0)
+    assert response.status_code == 401
+    fn.assert_called_once()
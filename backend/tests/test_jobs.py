@@ -0,0 +1,89 @@
+import pytest
+import asyncio
+import time
+from app.core.executor import ExecutorBusy
+from app.core.jobs import JobQueue, JobWorkers
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(path=str(tmp_path / "jobs.db"), lease_seconds=60)
+
+def test_claim_orders_by_priority_then_age(queue):
+    low = queue.enqueue("magic_clip", {"n": 1})
+    high = queue.enqueue("magic_clip", {"n": 2}, priority=5)
+    queue.enqueue("other", {"n": 3}, priority=9)
+
+    assert queue.claim("magic_clip")["id"] == high["id"]
+    claimed = queue.claim("magic_clip")
+    assert claimed["id"] == low["id"]
+    assert claimed["status"] == "running" and claimed["attempts"] == 1
+    assert queue.claim("magic_clip") is None
+
+def test_failures_retry_with_backoff_then_fail(queue):
+    job = queue.enqueue("magic_clip", {}, max_attempts=2)
+
+    queue.claim("magic_clip")
+    assert queue.fail(job["id"], "ffmpeg crashed", base_delay=0.0) == "queued"
+    queue.claim("magic_clip")
+    assert queue.fail(job["id"], "ffmpeg crashed again") == "failed"
+
+    final = queue.get(job["id"])
+    assert final["status"] == "failed"
+    assert final["error"] == "ffmpeg crashed again"
+    assert final["attempts"] == 2
+
+def test_expired_lease_is_reclaimed_and_queue_is_durable(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    job = JobQueue(path=path, lease_seconds=0.01).enqueue("magic_clip", {"clip": "a"})
+    JobQueue(path=path, lease_seconds=0.01).claim("magic_clip")  # worker dies holding the lease
+    time.sleep(0.02)
+
+    # Another process picks it up
+    reclaimed = JobQueue(path=path).claim("magic_clip")
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["attempts"] == 2
+    assert reclaimed["payload"] == {"clip": "a"}
+
+@pytest.mark.asyncio
+async def test_workers_respect_concurrency_and_retry(queue):
+    running = {"now": 0, "max": 0}
+    calls = {}
+
+    async def render(payload):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        try:
+            await asyncio.sleep(0.02)
+            calls[payload["n"]] = calls.get(payload["n"], 0) + 1
+            if payload["n"] == 0 and calls[0] == 1:
+                raise RuntimeError("transient")
+            if payload["n"] == 1 and calls[1] == 1:
+                raise ExecutorBusy("ffmpeg", retry_after=0)
+            return {"video_url": f"/static/outputs/{payload['n']}.mp4"}
+        finally:
+            running["now"] -= 1
+
+    workers = JobWorkers(queue, {"magic_clip": render}, concurrency={"magic_clip": 2}, poll_interval=0.01)
+    jobs = [queue.enqueue("magic_clip", {"n": n}) for n in range(5)]
+    queue.fail = lambda job_id, error: JobQueue.fail(queue, job_id, error, base_delay=0.0)
+    workers.start()
+    try:
+        for _ in range(200):
+            if all(queue.get(j["id"])["status"] == "done" for j in jobs):
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await workers.stop()
+
+    results = [queue.get(j["id"]) for j in jobs]
+    assert [r["status"] for r in results] == ["done"] * 5
+    assert results[3]["result"] == {"video_url": "/static/outputs/3.mp4"}
+    assert results[0]["attempts"] == 2
+    assert results[1]["attempts"] == 1  # busy doesn't use up an attempt
+    assert running["max"] == 2
+    assert workers.stats()["retried"] == 1
+
+def test_magic_clip_job_request_needs_no_recording():
+    from app.core.models import MagicClipJobRequest
+    body = MagicClipJobRequest(clip_filename="godfather_demo.mp4", clip_text="An offer", priority=3)
+    assert "audio_data" not in body.model_dump()
@@ -0,0 +1,86 @@
+import pytest
+import time
+from unittest.mock import AsyncMock
+from app.core.cache import LRUCache, SQLiteCache
+from app.services.llm import LLMCache, LLMService, normalize_text
+
+CORRECTION = {"corrected": "Can I get a coffee?", "explanation": "Fine", "diff": []}
+
+@pytest.fixture
+def service():
+    service = LLMService(api_key="test-key", cache=LLMCache(LRUCache(maxsize=100, ttl=60)))
+    service._request_correction = AsyncMock(return_value=CORRECTION)
+    service._request_translation = AsyncMock(return_value="I'd like a latte.")
+    return service
+
+def test_normalize_text():
+    assert normalize_text("  Can I get a COFFEE? ") == "can i get a coffee"
+    assert normalize_text("我要一杯拿铁，加燕麦奶。") == "我要一杯拿铁 加燕麦奶"
+
+@pytest.mark.asyncio
+async def test_trivially_different_inputs_share_cache(service):
+    await service.correct_grammar("can i get a coffee", "Cafe")
+    result = await service.correct_grammar("Can I get a coffee?", "cafe")
+
+    assert result == CORRECTION
+    service._request_correction.assert_called_once()
+    assert service.cache.stats()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_context_and_mode_are_part_of_key(service):
+    await service.correct_grammar("can i get a coffee", "Cafe")
+    await service.correct_grammar("can i get a coffee", "Airport")
+    await service.translate_text("can i get a coffee")
+
+    assert service._request_correction.call_count == 2
+    service._request_translation.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_fallback_is_not_cached(service):
+    service._request_correction = AsyncMock(side_effect=RuntimeError("no key"))
+
+    first = await service.correct_grammar("hello")
+    second = await service.correct_grammar("hello")
+
+    assert first["explanation"] == "Service unavailable"
+    assert second["explanation"] == "Service unavailable"
+    assert service._request_correction.call_count == 2
+
+@pytest.mark.asyncio
+async def test_stream_correction_uses_cached_result(service):
+    await service.correct_grammar("can i get a coffee")
+    service._stream_chat = AsyncMock()
+
+    deltas = [d async for d in service.stream_correction("Can I get a coffee")]
+
+    assert deltas == ["Can I get a coffee?"]
+    service._stream_chat.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = LLMService(api_key="test-key", cache=LLMCache(SQLiteCache(path, table="llm_cache")))
+    first._request_translation = AsyncMock(return_value="I'd like a latte.")
+    await first.translate_text("我要一杯拿铁")
+
+    second = LLMService(api_key="test-key", cache=LLMCache(SQLiteCache(path, table="llm_cache")))
+    second._request_translation = AsyncMock()
+    assert await second.translate_text("我要一杯拿铁。") == "I'd like a latte."
+    second._request_translation.assert_not_called()
+
+def test_sqlite_cache_ttl_and_lru(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), maxsize=2, ttl=60)
+    cache.set("a", {"v": 1})
+    assert cache.get("a") == {"v": 1}
+
+    cache.ttl = -1
+    cache.set("expired", 1)
+    assert cache.get("expired") is None
+
+    cache.ttl = None
+    for key in ["b", "c", "d"]:
+        cache.set(key, 1)
+        time.sleep(0.001)
+    cache._evict(time.time())
+    assert len(cache) == 2
+    assert cache.get("d") == 1
@@ -0,0 +1,79 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock
+from app.core import metrics
+from app.core.cache import LRUCache
+from app.core.metrics import Histogram, MetricsRegistry, RequestMetricsMiddleware, Tracer, bind_mode, stage
+from app.services.llm import LLMCache, LLMService
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "Test latency", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 2.0):
+        latency.observe(value, stage="tts")
+    registry.counter("test_total", "Test counter", ["service"]).inc(service='open"ai')
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{stage="tts",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="tts",le="1"} 3' in lines
+    assert 'test_seconds_bucket{stage="tts",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="tts"} 4' in lines
+    assert 'test_seconds_sum{stage="tts"} 3.05' in lines
+    assert 'test_total{service="open\\"ai"} 1' in lines
+
+@pytest.mark.asyncio
+async def test_stage_records_mode_errors_and_spans(monkeypatch):
+    spans = []
+    monkeypatch.setattr(metrics, "tracer", Tracer(enabled=True, sink=spans.append))
+    monkeypatch.setattr(metrics, "stage_seconds", Histogram("s", "s", ["stage", "mode"]))
+    metrics.request_id_var.set("req-1")
+    bind_mode("shadowing")
+
+    with stage("stt"):
+        with stage("decode"):
+            pass
+    with pytest.raises(RuntimeError):
+        with stage("tts"):
+            raise RuntimeError("upstream down")
+
+    assert metrics.stage_seconds.count(stage="stt", mode="shadowing") == 1
+    assert metrics.stage_errors.value(stage="tts", mode="shadowing") >= 1
+    assert metrics.stage_in_flight.value(stage="tts") == 0
+
+    decode, stt, tts = [json.loads(span) for span in spans]
+    assert decode["parent"] == stt["span"] and stt["parent"] is None
+    assert {decode["trace"], tts["trace"]} == {"req-1"}
+    assert (tts["status"], tts["error"], tts["mode"]) == ("error", "RuntimeError", "shadowing")
+
+def test_middleware_sets_request_id_and_route_labels():
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware)
+    seen = {}
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: str):
+        seen["request_id"] = metrics.request_id_var.get()
+        return {"id": item_id}
+
+    client = TestClient(app)
+    before = metrics.http_seconds.count(method="GET", route="/items/{item_id}", status="200")
+    response = client.get("/items/42", headers={"X-Request-ID": "abc"})
+    assert response.headers["x-request-id"] == "abc" == seen["request_id"]
+    assert client.get("/items/43").headers["x-request-id"]
+    assert metrics.http_seconds.count(method="GET", route="/items/{item_id}", status="200") == before + 2
+    assert client.get("/nowhere").status_code == 404
+    assert metrics.http_seconds.count(method="GET", route="unmatched", status="404") >= 1
+
+@pytest.mark.asyncio
+async def test_llm_fallback_is_counted():
+    service = LLMService(api_key="test-key", cache=LLMCache(LRUCache(maxsize=10)))
+    service._request_correction = AsyncMock(side_effect=RuntimeError("boom"))
+    before = metrics.fallbacks.value(service="llm", reason="correction_unavailable")
+
+    result = await service.correct_grammar("I has a cat")
+    assert result["explanation"] == "Service unavailable"
+    assert metrics.fallbacks.value(service="llm", reason="correction_unavailable") == before + 1
+    assert metrics.upstream_errors.value(service="openai_llm", error="RuntimeError") >= 1
@@ -1,11 +1,20 @@
 import pytest
 import base64
-from app.services.pitch import PitchService
+import io
+import numpy as np
+import soundfile as sf
+from app.services.pitch import PitchService, StreamingPitchTracker
 
 # Mock WAV header and data to create a valid-looking file for Parselmouth
 # This is a minimal valid wav file structure base64 encoded
 MOCK_WAV_B64 = "UklGRhYAAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQAAAAA="
 
+def sine_wav_b64(freq=200.0, seconds=0.5, rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    buffer = io.BytesIO()
+    sf.write(buffer, 0.5 * np.sin(2 * np.pi * freq * t), rate, format="WAV")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
 class TestPitchService:
     def test_extract_pitch_invalid_data(self):
         service = PitchService()
@@ -21,3 +30,66 @@ class TestPitchService:
             assert "File too short" in result["message"] or "Error" in result["message"]
         else:
             assert "data" in result
+
+    def test_extract_pitch_points(self):
+        service = PitchService()
+        result = service.extract_pitch(sine_wav_b64(200.0))
+        assert result["status"] == "success"
+        assert len(result["data"]) > 10
+        assert all(abs(p["f"] - 200.0) < 2 for p in result["data"])
+
+    def test_extract_pitch_compact_formats(self):
+        service = PitchService()
+        audio = sine_wav_b64(200.0)
+        points = service.extract_pitch(audio)["data"]
+
+        arrays = service.extract_pitch(audio, "arrays")["data"]
+        assert arrays["t"] == [p["t"] for p in points]
+        assert arrays["f"] == [p["f"] for p in points]
+
+        packed = service.extract_pitch(audio, "f32")["data"]
+        values = np.frombuffer(base64.b64decode(packed["buffer"]), dtype="<f4")
+        n = packed["frames"]
+        assert n == len(points)
+        np.testing.assert_allclose(values[n:], arrays["f"], rtol=1e-6)
+
+    def test_extract_pitch_unknown_format(self):
+        service = PitchService()
+        result = service.extract_pitch(sine_wav_b64(), "xml")
+        assert result["status"] == "error"
+
+
+class TestStreamingPitchTracker:
+    def test_tracks_sine_in_small_chunks(self):
+        rate = 16000
+        t = np.arange(rate) / rate
+        audio = 0.5 * np.sin(2 * np.pi * 220.0 * t)
+        tracker = StreamingPitchTracker(sample_rate=rate)
+
+        points = []
+        for start in range(0, audio.size, 320):  # 20 ms frames
+            points.extend(tracker.push(audio[start:start + 320]))
+
+        assert len(points) > 90
+        assert all(abs(p["f"] - 220.0) < 1 for p in points)
+        times = [p["t"] for p in points]
+        assert times == sorted(times)
+
+    def test_chunking_does_not_change_result(self):
+        rate = 16000
+        t = np.arange(rate) / rate
+        audio = 0.5 * np.sin(2 * np.pi * (150.0 + 100.0 * t) * t)
+
+        whole = StreamingPitchTracker(sample_rate=rate).push(audio)
+        tracker = StreamingPitchTracker(sample_rate=rate)
+        pieces = []
+        for start in range(0, audio.size, 123):
+            pieces.extend(tracker.push(audio[start:start + 123]))
+        assert pieces == whole
+
+    def test_silence_is_unvoiced_and_memory_is_bounded(self):
+        tracker = StreamingPitchTracker(sample_rate=16000)
+        ring = tracker._ring
+        for _ in range(50):
+            assert tracker.push(np.zeros(16000)) == []
+        assert tracker._ring is ring
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import sys
+import httpx
+import pytest
+from app.core.executor import ExecutorBusy
+from app.core.governor import UpstreamBusy, set_deadline
+from app.core.http import UpstreamClients
+from app.core.policy import CallPolicy, begin_outcomes
+from app.core.cache import LRUCache
+from app.services.llm import LLMCache, LLMService
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "bench"))
+from fake_upstreams import LatencyProfile, create_app
+
+def warmed(policy, backend, seconds=0.01, samples=20):
+    tracker = policy._tracker(backend)
+    tracker.samples.extend([seconds] * samples)
+    tracker.calls = samples
+    return tracker
+
+@pytest.mark.asyncio
+async def test_hedge_after_p95_first_answer_wins(monkeypatch):
+    monkeypatch.setenv("HEDGE_MIN_MS", "0")
+    policy = CallPolicy("llm", timeout=5)
+    tracker = warmed(policy, "gpt-4o")
+    cancelled = asyncio.Event()
+    calls = []
+
+    async def call(backend):
+        calls.append(backend)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5)  # stuck upstream
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        return "fast"
+
+    outcomes = begin_outcomes()
+    assert await policy.run(["gpt-4o"], call) == "fast"
+    assert calls == ["gpt-4o", "gpt-4o"]
+    await asyncio.wait_for(cancelled.wait(), 1)  # the loser is cancelled
+    assert outcomes["llm"]["hedged"] and outcomes["llm"]["backend"] == "gpt-4o"
+    assert tracker.hedges == 1 and tracker.hedge_wins == 1
+
+@pytest.mark.asyncio
+async def test_hedges_are_capped(monkeypatch):
+    monkeypatch.setenv("HEDGE_MIN_MS", "0")
+    monkeypatch.setenv("HEDGE_MAX_RATIO", "0")
+    policy = CallPolicy("llm", timeout=5)
+    warmed(policy, "gpt-4o")
+    calls = []
+
+    async def call(backend):
+        calls.append(backend)
+        await asyncio.sleep(0.05)
+        return "slow"
+
+    assert await policy.run(["gpt-4o"], call) == "slow"
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_failover_in_order_with_outcome_meta():
+    policy = CallPolicy("tts", timeout=5)
+    tried = []
+
+    async def call(backend):
+        tried.append(backend)
+        if backend == "elevenlabs":
+            raise RuntimeError("500")
+        if backend == "spare":
+            raise ExecutorBusy("tts")
+        return b"audio"
+
+    outcomes = begin_outcomes()
+    assert await policy.run(["elevenlabs", "spare", "local"], call) == b"audio"
+    assert tried == ["elevenlabs", "spare", "local"]
+    assert outcomes["tts"]["backend"] == "local"
+    assert [f["backend"] for f in outcomes["tts"]["failed"]] == ["elevenlabs", "spare"]
+
+    # Nothing left to try: a shed wins over other errors (503, not a degraded answer)
+    with pytest.raises(ExecutorBusy):
+        await policy.run(["elevenlabs", "spare"], call)
+
+@pytest.mark.asyncio
+async def test_stage_deadline_is_a_share_of_the_request_budget():
+    policy = CallPolicy("stt", timeout=30)
+    set_deadline(0.2)
+    try:
+        assert policy.stage_timeout() <= 0.2 * 0.3
+
+        async def stuck(backend):
+            await asyncio.sleep(5)
+
+        outcomes = begin_outcomes()
+        with pytest.raises(UpstreamBusy):
+            await policy.run(["openai"], stuck)
+        assert outcomes["stt"]["timed_out"]
+    finally:
+        set_deadline(None)
+    assert policy.stage_timeout() == 30
+
+@pytest.mark.asyncio
+async def test_llm_fails_over_to_next_model_against_fake_upstream(monkeypatch):
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://fake/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("UPSTREAM_MAX_RETRIES", "0")
+    monkeypatch.setenv("LLM_MODELS", "gpt-4o,gpt-4o-mini")
+    profiles = {service: LatencyProfile(0, 0) for service in ("stt", "llm", "tts")}
+    fake = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(profiles, sentences=1)))
+    models = []
+
+    async def handler(request):
+        # The primary model is down; everything else goes to the fake upstream
+        model = json.loads(await request.aread())["model"]
+        models.append(model)
+        if model == "gpt-4o":
+            return httpx.Response(500, json={"error": {"message": "down"}})
+        return await fake.send(request)
+
+    clients = UpstreamClients()
+    clients._http["openai"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service = LLMService(clients=clients, cache=LLMCache(backend=LRUCache()))
+
+    outcomes = begin_outcomes()
+    result = await service.correct_grammar("I am think about quit my job.")
+    assert "thinking about quitting" in result["corrected"]
+    assert models == ["gpt-4o", "gpt-4o-mini"]
+    assert outcomes["llm"]["backend"] == "gpt-4o-mini"
+    assert outcomes["llm"]["failed"] == [{"backend": "gpt-4o", "error": "InternalServerError"}]
+    await clients.aclose()
+    await fake.aclose()
@@ -0,0 +1,76 @@
+import pytest
+import io
+import os
+import numpy as np
+import soundfile as sf
+from unittest.mock import AsyncMock, MagicMock
+from app.core.executor import TaskExecutor
+from app.services.pitch import PitchService
+from app.services.reference import ReferenceBuilder, ReferenceStore
+
+def sine_wav(freq=200.0, seconds=0.5, rate=16000):
+    t = np.arange(int(seconds * rate)) / rate
+    buffer = io.BytesIO()
+    sf.write(buffer, 0.5 * np.sin(2 * np.pi * freq * t), rate, format="WAV")
+    return buffer.getvalue()
+
+@pytest.fixture
+def builder(tmp_path):
+    store = ReferenceStore(directory=str(tmp_path / "reference"))
+    tts = MagicMock()
+    tts.model_id = "model"
+    tts.voice_settings = {}
+    tts.generate_audio = AsyncMock(return_value=sine_wav())
+    video = MagicMock()
+    video.clips_dir = str(tmp_path)
+    with open(tmp_path / "clip.mp4", "wb") as f:
+        f.write(b"fake-video")
+    video.get_clips.return_value = [{"id": "clip", "quote": "Say hello.", "filename": "clip.mp4"}]
+    executor = TaskExecutor()
+    executor.run_subprocess_output = AsyncMock(return_value=(0, sine_wav(150.0), b""))
+    return ReferenceBuilder(store, PitchService(), tts, video, executor=executor)
+
+def test_store_roundtrip_is_memory_mapped(tmp_path):
+    store = ReferenceStore(directory=str(tmp_path))
+    entry = store.put("item", np.array([0.01, 0.02]), np.array([200.0, 210.0]), kind="clip", text="Hi")
+
+    meta, contour = store.get("item")
+    assert meta["etag"] == entry["etag"]
+    assert isinstance(contour, np.memmap)
+    assert contour.shape == (2, 2)
+    np.testing.assert_allclose(contour[1], [200.0, 210.0])
+
+    # Another process (the ingest script) sees the same index
+    assert ReferenceStore(directory=str(tmp_path)).get("item") is not None
+    assert store.get("missing") is None
+
+def test_text_lookup_ignores_case_and_punctuation(tmp_path):
+    store = ReferenceStore(directory=str(tmp_path))
+    item_id = store.item_id_for_text("I'm gonna make him an offer.")
+    store.put(item_id, np.array([0.0]), np.array([180.0]), kind="sentence", text="I'm gonna make him an offer.")
+    assert store.find_text("i'm gonna make him an offer") is not None
+
+@pytest.mark.asyncio
+async def test_build_sentence_skips_unchanged_source(builder):
+    assert await builder.build_sentence("Hello there.") == "built"
+    assert await builder.build_sentence("Hello there.") == "fresh"
+    builder.tts_service.generate_audio.assert_called_once()
+
+    meta, contour = builder.store.find_text("hello there")
+    assert meta["kind"] == "sentence"
+    assert 190 < float(np.median(contour[1])) < 210
+
+@pytest.mark.asyncio
+async def test_build_clips_extracts_audio_track(builder):
+    assert await builder.build_clips() == {"clip": "built"}
+    assert await builder.build_clips() == {"clip": "fresh"}
+    builder.executor.run_subprocess_output.assert_called_once()
+
+    # Touching the clip invalidates its contour
+    path = os.path.join(builder.video_service.clips_dir, "clip.mp4")
+    os.utime(path, ns=(0, 0))
+    assert await builder.build_clips() == {"clip": "built"}
+
+    meta, contour = builder.store.get("clip")
+    assert meta["text"] == "Say hello."
+    assert 140 < float(np.median(contour[1])) < 160
@@ -0,0 +1,85 @@
+import pytest
+import base64
+import numpy as np
+from unittest.mock import AsyncMock
+from app.services.scoring import ScoringService, as_contour
+
+def contour(seconds=4.0, base=150.0, tempo=1.0, shape=None):
+    """Synthetic intonation: rising-falling phrases with pauses, like PitchService output."""
+    t = np.arange(0, seconds * tempo, 0.01)
+    phase = t / tempo
+    semitones = shape(phase) if shape else 3 * np.sin(2 * np.pi * 0.5 * phase)
+    voiced = (phase % 2) < 1.6
+    return t[voiced], base * 2 ** (semitones[voiced] / 12)
+
+def brute_force_dtw(a, b):
+    D = np.full((len(a) + 1, len(b) + 1), np.inf)
+    D[0, 0] = 0
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            D[i, j] = abs(a[i - 1] - b[j - 1]) + min(D[i - 1, j], D[i, j - 1], D[i - 1, j - 1])
+    return D[-1, -1]
+
+def test_identical_contour_scores_full_marks():
+    reference = contour()
+    result = ScoringService().score(reference, reference)
+    assert result["status"] == "success"
+    assert result["data"]["overall"] == 100
+    assert len(result["data"]["segments"]) == 2
+
+def test_voice_height_and_small_tempo_change_are_tolerated():
+    scoring = ScoringService()
+    result = scoring.score(contour(), contour(base=240.0, tempo=1.15))["data"]
+    assert result["pitch"] >= 95
+    assert result["rhythm"] < 100
+    assert result["tempo_ratio"] == pytest.approx(1.15, abs=0.05)
+
+def test_flat_intonation_scores_lower():
+    scoring = ScoringService()
+    monotone = scoring.score(contour(), contour(shape=lambda p: 0 * p))["data"]
+    native = scoring.score(contour(), contour(base=200.0))["data"]
+    assert monotone["pitch"] < native["pitch"] - 20
+
+def test_banded_dtw_matches_exact_dtw_when_band_is_wide():
+    rng = np.random.default_rng(0)
+    scoring = ScoringService(band=10)
+    reference = rng.normal(size=30)
+    attempts = [rng.normal(size=n) for n in (22, 30, 37)]
+    for attempt, path in zip(attempts, scoring._align(reference, attempts)):
+        cost = np.abs(reference[path[:, 0]] - attempt[path[:, 1]]).sum()
+        assert cost == pytest.approx(brute_force_dtw(reference, attempt))
+
+def test_batch_matches_individual_scores_and_reports_bad_attempts():
+    scoring = ScoringService()
+    reference = contour()
+    attempts = [contour(base=200.0), contour(tempo=1.3), [{"t": 0.1, "f": 100.0}], contour(tempo=0.8)]
+    batch = scoring.score_batch(reference, attempts)
+    assert batch[2]["status"] == "error"
+    for attempt, result in zip(attempts, batch):
+        if result["status"] == "success":
+            assert result == scoring.score(reference, attempt)
+
+def test_accepts_every_pitch_format():
+    t, f = contour()
+    points = [{"t": a, "f": b} for a, b in zip(t.tolist(), f.tolist())]
+    arrays = {"t": t.tolist(), "f": f.tolist()}
+    packed = {"frames": t.size, "buffer": base64.b64encode(np.concatenate([t, f]).astype("<f4").tobytes()).decode()}
+    for data in (points, arrays, packed):
+        times, frequencies = as_contour(data)
+        np.testing.assert_allclose(frequencies, f, rtol=1e-6)
+    with pytest.raises(ValueError):
+        as_contour([{"time": 1}])
+
+@pytest.mark.asyncio
+async def test_process_audio_scores_against_tts_contour(processor):
+    processor.stt_service.transcribe = AsyncMock(return_value="Hello world")
+    processor.llm_service.correct_grammar = AsyncMock(return_value={"corrected": "Hello world.", "diff": []})
+    processor.tts_service.generate_audio = AsyncMock(return_value=b"fake_mp3_bytes")
+    native = contour()
+    processor.pitch_service.extract_contour = lambda audio: native
+    processor.reference_store.find_text = lambda text: None
+
+    result = await processor.process_audio(b"user-audio", "free_talk", score=True)
+
+    assert result["score"]["overall"] == 100
+    assert len(result["pitch_data"]) == native[0].size
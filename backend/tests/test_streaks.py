@@ -0,0 +1,129 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import StaticPool
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models.user import User
+from app.services import streaks
+from app.services.streaks import StreakUpdater, apply_activity
+
+@pytest_asyncio.fixture
+async def db():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engine) as session:
+        session.add(User(id=1, username="alice", hashed_password="x"))
+        session.add(User(id=2, username="bob", hashed_password="x", streak_count=4,
+                         last_active_date=datetime.now() - timedelta(days=3), daily_process_count=5))
+        await session.commit()
+    yield engine
+    await engine.dispose()
+
+async def load(engine, user_id):
+    async with AsyncSession(engine) as session:
+        return await session.get(User, user_id)
+
+def test_apply_activity_batch_matches_one_by_one():
+    day = datetime(2024, 5, 1, 9)
+    one_by_one = User(username="a", hashed_password="x", streak_count=2, last_active_date=day - timedelta(days=1))
+    batched = User(username="b", hashed_password="x", streak_count=2, last_active_date=day - timedelta(days=1))
+    for i in range(5):
+        apply_activity(one_by_one, day + timedelta(minutes=i))
+    apply_activity(batched, day + timedelta(minutes=4), count=5)
+
+    for user in (one_by_one, batched):
+        assert (user.streak_count, user.daily_process_count) == (3, 5)
+
+@pytest.mark.asyncio
+async def test_flush_coalesces_activity_into_one_write(db):
+    updater = StreakUpdater(interval=60, db_engine=db)
+    for _ in range(3):
+        updater.record(1)
+    updater.record(2)
+
+    assert (await load(db, 1)).daily_process_count == 0  # nothing written yet
+    await updater.flush()
+
+    alice, bob = await load(db, 1), await load(db, 2)
+    assert (alice.daily_process_count, alice.streak_count) == (3, 1)
+    assert (bob.daily_process_count, bob.streak_count) == (1, 0)  # 3-day gap breaks the streak
+    assert updater.stats() == {"pending_users": 0, "recorded": 4, "flushes": 1, "rows_written": 2}
+
+@pytest.mark.asyncio
+async def test_view_includes_pending_and_stop_flushes(db):
+    updater = StreakUpdater(interval=60, db_engine=db)
+    updater.start()
+    updater.record(1)
+    updater.record(1)
+    updater.record(1)
+
+    shown = updater.view(await load(db, 1))
+    assert (shown.daily_process_count, shown.streak_count) == (3, 1)
+
+    await updater.stop()
+    assert (await load(db, 1)).streak_count == 1
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_activity(db):
+    updater = StreakUpdater(interval=60, db_engine=db)
+    updater.record(1)
+    await db.dispose()
+    async with db.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await updater.flush()
+    assert updater.pending[1]
+    assert updater.flushes == 0
+
+@pytest.mark.asyncio
+async def test_stop_during_flush_loses_nothing(db, monkeypatch):
+    writing = asyncio.Event()
+    real_begin_write = streaks.begin_write
+
+    async def slow_begin_write(session):
+        writing.set()
+        await asyncio.sleep(0.05)
+        await real_begin_write(session)
+    monkeypatch.setattr(streaks, "begin_write", slow_begin_write)
+
+    updater = StreakUpdater(interval=0.01, db_engine=db)
+    updater.start()
+    updater.record(1)
+    await writing.wait()
+    updater.record(1)  # arrives while the first batch is being written
+    await updater.stop()
+
+    assert (await load(db, 1)).daily_process_count == 2
+    assert updater.pending == {}
+
+@pytest.mark.asyncio
+async def test_cancelled_flush_keeps_activity(db, monkeypatch):
+    async def cancelled(session):
+        raise asyncio.CancelledError()
+    monkeypatch.setattr(streaks, "begin_write", cancelled)
+    updater = StreakUpdater(interval=60, db_engine=db)
+    updater.record(1)
+    with pytest.raises(asyncio.CancelledError):
+        await updater.flush()
+    assert updater.pending[1]
+
+@pytest.mark.asyncio
+async def test_failed_process_does_not_count_towards_streak(monkeypatch):
+    from types import SimpleNamespace
+    from unittest.mock import AsyncMock
+    from fastapi import HTTPException
+    from app import main
+    from app.core.models import ProcessingRequest
+
+    monkeypatch.setattr(main.processor, "process_audio", AsyncMock(return_value={"error": "STT failed"}))
+    monkeypatch.setattr(main.processor.voice_registry, "get_voice_id", AsyncMock(return_value=None))
+    monkeypatch.setattr(main, "streaks", StreakUpdater(interval=60))
+    request = ProcessingRequest(user_id="1", audio_data="", mode="shadowing")
+
+    with pytest.raises(HTTPException) as exc:
+        await main.process_voice(request, SimpleNamespace(id=1))
+    assert exc.value.status_code == 500
+    assert main.streaks.pending == {}
@@ -0,0 +1,93 @@
+import asyncio
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.core.executor import ExecutorBusy
+from app.core.metrics import bind_mode, upstream_errors
+from app.services import stt
+from app.services.stt import LocalWhisperBackend, SpeechToTextService, parse_mode_map
+
+def fake_backend(name, text, ready=True):
+    backend = MagicMock()
+    backend.name = name
+    backend.ready = ready
+    backend.transcribe = AsyncMock(return_value=text)
+    return backend
+
+def test_parse_mode_map():
+    assert parse_mode_map("shadowing=local, panic = openai,,bad") == {"shadowing": "local", "panic": "openai"}
+    assert parse_mode_map("") == {}
+
+@pytest.mark.asyncio
+async def test_backend_selected_per_mode(monkeypatch):
+    monkeypatch.setenv("STT_BACKEND", "openai")
+    monkeypatch.setenv("STT_BACKEND_BY_MODE", "shadowing=local")
+    openai, local = fake_backend("openai", "hosted"), fake_backend("local", "on-box")
+    service = SpeechToTextService(backends={"openai": openai, "local": local})
+
+    bind_mode("shadowing")
+    assert await service.transcribe(b"audio") == "on-box"
+    local.transcribe.assert_awaited_once_with(b"audio", "shadowing")
+
+    bind_mode("panic")
+    assert await service.transcribe(b"audio") == "hosted"
+    openai.transcribe.assert_awaited_once_with(b"audio", "panic")
+
+@pytest.mark.asyncio
+async def test_local_failure_falls_back_to_openai(monkeypatch):
+    monkeypatch.setenv("STT_BACKEND", "local")
+    openai, local = fake_backend("openai", "hosted"), fake_backend("local", "on-box")
+    local.transcribe.side_effect = RuntimeError("model crashed")
+    service = SpeechToTextService(backends={"openai": openai, "local": local})
+    bind_mode("shadowing")
+    before = upstream_errors.value(service="local_stt", error="RuntimeError")
+    assert await service.transcribe(b"audio") == "hosted"
+    # Counted against the backend that failed
+    assert upstream_errors.value(service="local_stt", error="RuntimeError") == before + 1
+
+    # Not loaded (e.g. faster-whisper missing): never tried
+    unloaded = fake_backend("local", "on-box", ready=False)
+    service = SpeechToTextService(backends={"openai": openai, "local": unloaded})
+    assert await service.transcribe(b"audio") == "hosted"
+    unloaded.transcribe.assert_not_awaited()
+
+    # Saturated local pool: the hosted API has capacity
+    local.transcribe.side_effect = ExecutorBusy("stt")
+    service = SpeechToTextService(backends={"openai": openai, "local": local})
+    assert await service.transcribe(b"audio") == "hosted"
+
+    # Every backend shedding is a 503, not an empty transcript
+    openai.transcribe.side_effect = ExecutorBusy("openai_stt")
+    with pytest.raises(ExecutorBusy):
+        await service.transcribe(b"audio")
+
+@pytest.mark.asyncio
+async def test_local_backend_batches_short_utterances(monkeypatch):
+    monkeypatch.setenv("LOCAL_STT_LANGUAGES", "shadowing=en")
+    monkeypatch.setenv("LOCAL_STT_BATCH_WAIT_MS", "50")
+    monkeypatch.setenv("LOCAL_STT_BATCH_MAX_SECONDS", "10")
+    # Audio length in seconds is encoded in the fake bytes
+    monkeypatch.setattr(stt, "decode_pcm", lambda data: np.zeros(int(data) * stt.SAMPLE_RATE, dtype=np.float32))
+    backend = LocalWhisperBackend(model=object())
+    batches = []
+
+    def transcribe_batch(audios, language):
+        batches.append((len(audios), language))
+        return [f"{len(audio) // stt.SAMPLE_RATE}s" for audio in audios]
+
+    backend._transcribe_batch = transcribe_batch
+    backend._transcribe_one = lambda audio, language: f"long {language}"
+
+    results = await asyncio.gather(*[backend.transcribe(str(seconds).encode(), "shadowing") for seconds in (2, 3, 4)])
+    assert results == ["2s", "3s", "4s"]
+    assert batches == [(3, "en")]
+
+    # Too long to batch, or no known language: transcribed alone with language detection
+    assert await backend.transcribe(b"20", "shadowing") == "long en"
+    assert await backend.transcribe(b"2", "panic") == "long None"
+
+    backend.queue_limit = 0
+    with pytest.raises(ExecutorBusy):
+        await backend.transcribe(b"2", "shadowing")
+    assert backend.stats()["rejected"] == 1
+    await backend.shutdown()
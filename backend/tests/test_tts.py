@@ -0,0 +1,197 @@
+import pytest
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock
+from app.services.tts import TextToSpeechService, TTSCache
+
+@pytest.fixture
+def service(tmp_path):
+    cache = TTSCache(directory=str(tmp_path / "tts"), memory_items=2, disk_bytes=1024)
+    service = TextToSpeechService(api_key="test-key", cache=cache)
+    service._request_audio = AsyncMock(return_value=b"fake_mp3_bytes")
+    return service
+
+class TestTTSCache:
+    def test_key_ignores_whitespace_but_not_voice(self):
+        settings = {"stability": 0.5}
+        key = TTSCache.make_key("Hello  world.", "voice_a", "model", settings)
+        assert key == TTSCache.make_key(" Hello world. ", "voice_a", "model", settings)
+        assert key != TTSCache.make_key("Hello world.", "voice_b", "model", settings)
+        assert key != TTSCache.make_key("hello world", "voice_a", "model", settings)
+
+    @pytest.mark.asyncio
+    async def test_disk_entries_are_not_labelled_mp3(self, tmp_path):
+        directory = tmp_path / "tts"
+        directory.mkdir()
+        (directory / "legacy.mp3").write_bytes(b"ID3 old entry")
+        cache = TTSCache(directory=str(directory))
+        await cache.set("wav", b"RIFF....WAVE")
+
+        assert sorted(os.listdir(directory)) == ["legacy.bin", "wav.bin"]
+        assert await cache.get("legacy") == b"ID3 old entry"
+
+    @pytest.mark.asyncio
+    async def test_repeat_phrase_hits_cache(self, service):
+        first = await service.generate_audio("Hello world.", "voice_a")
+        second = await service.generate_audio("Hello world.", "voice_a")
+
+        assert first == second == b"fake_mp3_bytes"
+        service._request_audio.assert_called_once()
+        assert service.cache.memory.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_disk_tier_survives_memory_eviction(self, service):
+        await service.generate_audio("one", "voice_a")
+        await service.generate_audio("two", "voice_a")
+        await service.generate_audio("three", "voice_a")  # evicts "one" from memory
+
+        await service.generate_audio("one", "voice_a")
+
+        assert service._request_audio.call_count == 3
+        assert service.cache.disk.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_misses_share_one_upstream_call(self, service):
+        async def slow_fetch(text, voice_id, backend=None):
+            await asyncio.sleep(0.01)
+            return b"fake_mp3_bytes"
+        service._request_audio = AsyncMock(side_effect=slow_fetch)
+
+        results = await asyncio.gather(*[service.generate_audio("Coffee, please.", "voice_a") for _ in range(5)])
+
+        assert all(r == b"fake_mp3_bytes" for r in results)
+        service._request_audio.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_upstream_call_is_cancelled_when_every_caller_leaves(self, service):
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+        async def slow_fetch(text, voice_id, backend=None):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+        service._request_audio = AsyncMock(side_effect=slow_fetch)
+
+        waiters = [asyncio.create_task(service.generate_audio("Hello", "voice_a")) for _ in range(2)]
+        await started.wait()
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()  # one caller still waits
+
+        waiters[1].cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+
+        # A new caller starts a fresh call instead of joining the cancelled one
+        service._request_audio = AsyncMock(return_value=b"fake_mp3_bytes")
+        assert await service.generate_audio("Hello", "voice_a") == b"fake_mp3_bytes"
+
+    @pytest.mark.asyncio
+    async def test_failures_are_not_cached(self, service):
+        service._request_audio = AsyncMock(return_value=b"")
+        await service.generate_audio("Hello", "voice_a")
+        await service.generate_audio("Hello", "voice_a")
+        assert service._request_audio.call_count == 2
+
+    def test_disk_tier_is_size_bounded(self, tmp_path):
+        cache = TTSCache(directory=str(tmp_path / "tts"), disk_bytes=100)
+        for i in range(5):
+            cache.disk.set(f"key{i}", b"x" * 40)
+        assert cache.disk.stats()["bytes"] <= 100
+        assert cache.disk.get("key0") is None
+        assert cache.disk.get("key4") == b"x" * 40
+
+class TestStreaming:
+    @pytest.mark.asyncio
+    async def test_elevenlabs_streaming_endpoint(self, tmp_path):
+        import httpx
+        from app.core.http import UpstreamClients
+
+        requests = []
+        def handler(request):
+            requests.append(request)
+            if len(requests) == 1:
+                return httpx.Response(503, json={"detail": "busy"})
+            return httpx.Response(200, content=b"frame1frame2")
+
+        clients = UpstreamClients()
+        clients._http["elevenlabs"] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        cache = TTSCache(directory=str(tmp_path / "tts"))
+        service = TextToSpeechService(api_key="test-key", cache=cache, clients=clients)
+
+        chunks = [chunk async for chunk in service.stream_audio("Hello.", "voice_a")]
+        assert b"".join(chunks) == b"frame1frame2"
+        assert requests[-1].url.path.endswith("/text-to-speech/voice_a/stream")
+        assert requests[-1].url.params["output_format"] == "mp3_44100_128"
+        assert len(requests) == 2  # retried before the first byte
+
+        # Completed streams are cached and replayed as one chunk
+        assert [chunk async for chunk in service.stream_audio("Hello.", "voice_a")] == [b"frame1frame2"]
+        assert await service.generate_audio("Hello.", "voice_a") == b"frame1frame2"
+        assert len(requests) == 2
+        await clients.aclose()
+
+    @pytest.mark.asyncio
+    async def test_local_backend_per_mode_with_wav_stream(self, tmp_path, monkeypatch):
+        import io
+        import numpy as np
+        import soundfile as sf
+        from app.core.audio import wav_header
+        from app.core.metrics import bind_mode
+
+        monkeypatch.setenv("TTS_BACKEND_BY_MODE", "shadowing=local")
+        local = MagicMock(name="local", model_id="xtts_v2", voice_settings={}, ready=True)
+        local.name = "local"
+        async def pcm_stream(text, voice_id):
+            yield wav_header(24000)
+            for _ in range(3):
+                yield np.zeros(2400, dtype="<i2").tobytes()
+        local.stream = pcm_stream
+        remote = MagicMock(model_id="eleven", voice_settings={}, ready=True)
+        remote.name = "elevenlabs"
+        service = TextToSpeechService(
+            cache=TTSCache(directory=str(tmp_path / "tts")),
+            backends={"elevenlabs": remote, "local": local}
+        )
+
+        bind_mode("shadowing")
+        audio = await service.generate_audio("Hello.", "voice_a")
+        # Sizes are filled in once the stream is complete
+        assert sf.info(io.BytesIO(audio)).duration == pytest.approx(0.3)
+
+        local.ready = False
+        assert service.backend() is remote
+        bind_mode("panic")
+        local.ready = True
+        assert service.backend() is remote
+
+    @pytest.mark.asyncio
+    async def test_failed_stream_is_not_cached(self, service):
+        async def broken(text, voice_id):
+            yield b"partial"
+            raise RuntimeError("connection reset")
+        service.backends["elevenlabs"].stream = broken
+
+        assert [chunk async for chunk in service.stream_audio("Hello", "voice_a")] == [b"partial"]
+        assert await service.cache.get(TTSCache.make_key("Hello", "voice_a", service.model_id, service.voice_settings)) is None
+
+    @pytest.mark.asyncio
+    async def test_fails_over_before_the_first_chunk(self, tmp_path):
+        async def down(text, voice_id):
+            raise RuntimeError("503")
+            yield b""
+        async def spare_stream(text, voice_id):
+            yield b"spare"
+        primary = MagicMock(model_id="eleven", voice_settings={}, ready=True, stream=down)
+        primary.name = "elevenlabs"
+        spare = MagicMock(model_id="xtts", voice_settings={}, ready=True, stream=spare_stream)
+        spare.name = "local"
+        service = TextToSpeechService(
+            cache=TTSCache(directory=str(tmp_path / "tts")),
+            backends={"elevenlabs": primary, "local": spare}
+        )
+
+        assert await service.generate_audio("Hello.", "voice_a") == b"spare"
+        assert [chunk async for chunk in service.stream_audio("Bye.", "voice_a")] == [b"spare"]
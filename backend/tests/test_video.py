@@ -0,0 +1,122 @@
+import pytest
+import asyncio
+import os
+import time
+from unittest.mock import AsyncMock
+from app.services.video import VideoService
+
+@pytest.fixture
+def service(tmp_path):
+    service = VideoService(static_dir=str(tmp_path / "static"), templates_dir=str(tmp_path / "templates"))
+    with open(os.path.join(service.clips_dir, "godfather_demo.mp4"), "wb") as f:
+        f.write(b"fake-video")
+
+    async def fake_ffmpeg(name, cmd, input=None, timeout=None):
+        await asyncio.sleep(0.01)
+        with open(cmd[-1], "wb") as f:
+            f.write(b"rendered")
+        return 0, b""
+
+    service.executor = AsyncMock()
+    service.executor.run_subprocess = AsyncMock(side_effect=fake_ffmpeg)
+    return service
+
+@pytest.mark.asyncio
+async def test_repeat_render_returns_existing_file(service):
+    first = await service.swap_audio("godfather_demo.mp4", b"tts-audio")
+    second = await service.swap_audio("godfather_demo.mp4", b"tts-audio")
+
+    assert first == second
+    service.executor.run_subprocess.assert_called_once()
+    assert service.stats()["render_hits"] == 1
+    assert os.listdir(service.outputs_dir) == [os.path.basename(first)]
+
+@pytest.mark.asyncio
+async def test_different_audio_renders_new_file(service):
+    first = await service.swap_audio("godfather_demo.mp4", b"tts-audio-1")
+    second = await service.swap_audio("godfather_demo.mp4", b"tts-audio-2")
+    assert first != second
+    assert service.executor.run_subprocess.call_count == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_renders_run_ffmpeg_once(service):
+    results = await asyncio.gather(*[service.swap_audio("godfather_demo.mp4", b"tts-audio") for _ in range(3)])
+    assert len(set(results)) == 1
+    service.executor.run_subprocess.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_render_uses_prepared_template(service):
+    service._probe_duration = AsyncMock(return_value=5.0)
+    await service.prepare_templates()
+    template = service.templates["godfather_demo.mp4"]
+    assert template["duration"] == 5.0
+
+    await service.swap_audio("godfather_demo.mp4", b"tts-audio")
+
+    render_cmd = service.executor.run_subprocess.call_args.args[1]
+    assert render_cmd[render_cmd.index("-i") + 1] == template["path"]
+
+@pytest.mark.asyncio
+async def test_unknown_clip_is_rejected(service):
+    with pytest.raises(FileNotFoundError):
+        await service.swap_audio("../../etc/passwd", b"tts-audio")
+
+def test_evict_outputs_by_age_and_size(service):
+    def make(name, size, age):
+        path = os.path.join(service.outputs_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    make("magic_old.mp4", 10, 10 * 24 * 3600)
+    make("magic_a.mp4", 60, 300)
+    make("magic_b.mp4", 60, 200)
+    make("magic_c.mp4", 60, 100)
+    service.outputs_max_age = 3 * 24 * 3600
+    service.outputs_max_bytes = 130
+
+    service.evict_outputs()
+
+    assert sorted(os.listdir(service.outputs_dir)) == ["magic_b.mp4", "magic_c.mp4"]
+
+@pytest.mark.asyncio
+async def test_failed_template_write_leaves_no_file(service):
+    async def killed(name, cmd, input=None, timeout=None):
+        with open(cmd[-1], "wb") as f:
+            f.write(b"partial")
+        return 1, b"killed"
+    service.executor.run_subprocess = AsyncMock(side_effect=killed)
+
+    await service.prepare_templates()
+
+    # No partial file that would look fresher than the clip
+    assert os.listdir(service.templates_dir) == [".lock"]
+    assert "godfather_demo.mp4" not in service.templates
+
+@pytest.mark.asyncio
+async def test_probe_runs_in_ffmpeg_pool_with_timeout(service):
+    service.executor.run_subprocess_output = AsyncMock(return_value=(0, b"12.5\n", b""))
+    assert await service._probe_duration("template.mp4") == 12.5
+    name, cmd = service.executor.run_subprocess_output.call_args.args
+    assert (name, cmd[0]) == ("ffprobe", "ffprobe")
+
+    async def hung(*args, **kwargs):
+        await asyncio.sleep(10)
+    service.executor.run_subprocess_output = AsyncMock(side_effect=hung)
+    service.probe_timeout = 0.05
+    assert await service._probe_duration("template.mp4") is None
+
+@pytest.mark.asyncio
+async def test_outputs_are_evicted_on_a_timer_not_per_render(service, monkeypatch):
+    scans = []
+    monkeypatch.setattr(service, "evict_outputs", lambda: scans.append(1))
+    await service.swap_audio("godfather_demo.mp4", b"tts-audio-1")
+    await service.swap_audio("godfather_demo.mp4", b"tts-audio-2")
+    assert scans == []
+
+    service.evict_interval = 0.01
+    task = asyncio.create_task(service.run_eviction())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    assert len(scans) >= 2
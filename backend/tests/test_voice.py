@@ -0,0 +1,83 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy.pool import StaticPool
+from app.models.user import User
+from app.models.voice import VoiceProfile
+from app.services.voice import DEFAULT_VOICE_ID, VoiceRegistry
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(username="alice", hashed_password="x"))
+        session.commit()
+    return engine
+
+@pytest.fixture
+def registry(db):
+    tts_service = MagicMock()
+    tts_service.clone_voice = AsyncMock(return_value="cloned_voice_123")
+    return VoiceRegistry(tts_service, db_engine=db)
+
+@pytest.mark.asyncio
+async def test_default_voice_until_enrolled(registry):
+    assert await registry.get_voice_id(1) == DEFAULT_VOICE_ID
+    assert await registry.get_voice_id(None) == DEFAULT_VOICE_ID
+
+@pytest.mark.asyncio
+async def test_enrollment_registers_clone_and_updates_cache(registry, db):
+    samples = [("a.wav", b"fake-audio-1"), ("b.wav", b"fake-audio-2")]
+    with Session(db) as session:
+        profile = registry.start_enrollment(session, 1, samples)
+        assert profile.status == "pending"
+        assert profile.sample_count == 2
+
+    await registry.get_voice_id(1)  # caches the default voice
+    await registry.enroll(1, "echonative-alice", samples)
+
+    registry.tts_service.clone_voice.assert_called_once_with("echonative-alice", samples)
+    assert await registry.get_voice_id(1) == "cloned_voice_123"
+    with Session(db) as session:
+        profile = session.get(VoiceProfile, 1)
+        assert profile.status == "ready"
+        assert profile.provider_voice_id == "cloned_voice_123"
+
+@pytest.mark.asyncio
+async def test_hot_path_reads_cache_not_db(registry, db):
+    with Session(db) as session:
+        session.add(VoiceProfile(user_id=1, provider_voice_id="stored_voice", status="ready"))
+        session.commit()
+
+    registry._load_voice_id = MagicMock(wraps=registry._load_voice_id)
+    assert await registry.get_voice_id(1) == "stored_voice"
+    assert await registry.get_voice_id(1) == "stored_voice"
+    registry._load_voice_id.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_failed_enrollment_is_recorded(registry, db):
+    registry.tts_service.clone_voice = AsyncMock(side_effect=RuntimeError("quota exceeded"))
+    with Session(db) as session:
+        registry.start_enrollment(session, 1, [("a.wav", b"x")])
+
+    await registry.enroll(1, "echonative-alice", [("a.wav", b"x")])
+
+    with Session(db) as session:
+        profile = session.get(VoiceProfile, 1)
+        assert profile.status == "failed"
+        assert "quota" in profile.error
+    assert await registry.get_voice_id(1) == DEFAULT_VOICE_ID
+
+@pytest.mark.asyncio
+async def test_other_workers_see_a_new_clone_once_their_entry_expires(registry, db):
+    other_worker = VoiceRegistry(MagicMock(), db_engine=db, ttl=0.05)
+    assert await other_worker.get_voice_id(1) == DEFAULT_VOICE_ID
+
+    with Session(db) as session:
+        registry.start_enrollment(session, 1, [("a.wav", b"x")])
+    await registry.enroll(1, "echonative-alice", [("a.wav", b"x")])
+
+    await asyncio.sleep(0.1)
+    assert await other_worker.get_voice_id(1) == "cloned_voice_123"
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core.cache import DiskCache, SQLiteCache
+from app.core.database import enable_sqlite_wal, engine_options
+from app.core.governor import Governor
+from app.core.workers import file_lock, per_worker
+from app.models.user import User
+from app.services.pitch import PitchCache
+from app.services.streaks import StreakUpdater
+
+def test_box_wide_limits_are_split_between_workers(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("LLM_RPS", "8")
+    monkeypatch.setenv("LLM_BURST", "10")
+    monkeypatch.setenv("LLM_CONCURRENCY", "6")
+    assert per_worker(10) == 3 and per_worker(2) == 1 and per_worker(0) == 0
+
+    governor = Governor.from_env("llm")
+    assert (governor.bucket.rate, governor.bucket.burst, governor.concurrency) == (2, 3, 2)
+
+@pytest.mark.asyncio
+async def test_concurrent_flushes_from_two_workers_add_up(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'app.db'}"
+    # One engine per worker process, same database file
+    engines = []
+    for _ in range(2):
+        engine = create_async_engine(url, **engine_options(url))
+        enable_sqlite_wal(engine.sync_engine)
+        engines.append(engine)
+    async with engines[0].begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with AsyncSession(engines[0]) as session:
+        session.add(User(id=1, username="alice", hashed_password="x"))
+        await session.commit()
+
+    updaters = [StreakUpdater(interval=60, db_engine=engine) for engine in engines]
+    for _ in range(5):
+        for updater in updaters:
+            updater.record(1)
+        await asyncio.gather(*(updater.flush() for updater in updaters))
+
+    async with AsyncSession(engines[1]) as session:
+        user = await session.get(User, 1)
+    assert (user.daily_process_count, user.streak_count) == (10, 1)
+    for engine in engines:
+        await engine.dispose()
+
+def test_sqlite_cache_is_shared_and_reopened_after_fork(tmp_path):
+    path = str(tmp_path / "cache.db")
+    first, second = SQLiteCache(path), SQLiteCache(path)
+    first.set("k", {"v": 1})
+    assert second.get("k") == {"v": 1}
+
+    # As seen by a forked child: the inherited connection is replaced, not reused
+    inherited = first._conn
+    first._pid = -1
+    assert first._conn is not inherited
+    assert first.get("k") == {"v": 1}
+
+def test_disk_cache_hit_survives_eviction_by_another_worker(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), max_bytes=1024)
+    cache.set("k", b"audio")
+
+    def evicted(path):
+        raise FileNotFoundError(path)
+    # Another worker deletes the file between our read and the touch
+    monkeypatch.setattr("app.core.cache.os.utime", evicted)
+    assert cache.get("k") == b"audio"
+
+@pytest.mark.asyncio
+async def test_pitch_cache_shared_between_workers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    key = PitchCache.make_key(b"audio", "points")
+    assert key != PitchCache.make_key(b"audio", "f32")
+    calls = []
+
+    async def extract():
+        calls.append(1)
+        return {"status": "success", "data": [{"time": 0.1, "frequency": 220.0}]}
+
+    worker_a = PitchCache(SQLiteCache(path, table="pitch_cache"))
+    worker_b = PitchCache(SQLiteCache(path, table="pitch_cache"))
+    first = await worker_a.get_or_fetch(key, extract)
+    assert await worker_b.get_or_fetch(key, extract) == first
+    assert len(calls) == 1
+
+@pytest.mark.asyncio
+async def test_file_lock_serializes(tmp_path):
+    path = str(tmp_path / "ingest.lock")
+    inside = 0
+    peak = 0
+
+    async def ingest():
+        nonlocal inside, peak
+        async with file_lock(path):
+            inside += 1
+            peak = max(peak, inside)
+            await asyncio.sleep(0.02)
+            inside -= 1
+
+    await asyncio.gather(*(ingest() for _ in range(3)))
+    assert peak == 1 and os.path.exists(path)
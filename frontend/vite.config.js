@@ -10,6 +10,15 @@ export default defineConfig({
         target: 'http://127.0.0.1:8000',
         changeOrigin: true,
         rewrite: (path) => path.replace(/^\/api/, '')
+      },
+      // Signed audio URLs (audio_url) and rendered clips (video_url) are root-relative backend paths
+      '/artifacts': {
+        target: 'http://127.0.0.1:8000',
+        changeOrigin: true
+      },
+      '/static': {
+        target: 'http://127.0.0.1:8000',
+        changeOrigin: true
       }
     }
   }